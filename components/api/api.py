@@ -1,32 +1,36 @@
+import asyncio
 import base64
 import io
+import json
 import os
 import time
 import datetime
 import uvicorn
 import ipaddress
+import uuid
 import requests
 import gradio as gr
 from threading import Lock
 from io import BytesIO
-from fastapi import APIRouter, Depends, FastAPI, Request, Response
+from fastapi import APIRouter, Depends, FastAPI, Request, Response, WebSocket, WebSocketDisconnect
 from fastapi.security import HTTPBasic, HTTPBasicCredentials
 from fastapi.exceptions import HTTPException
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.encoders import jsonable_encoder
+from pydantic import BaseModel
+from starlette.concurrency import run_in_threadpool
 from secrets import compare_digest
 
 import components.shared as shared
-from components.sd import sd_samplers, sd_hijack, sd_models
+from components.sd import sd_samplers, sd_hijack, sd_hijack_autotune, sd_models
 from components.api import models
-from components import shared_items, script_callbacks,generation_parameters_copypaste,restart,deepbooru,images,scripts
+from components import shared_items, script_callbacks,generation_parameters_copypaste,restart,deepbooru,images,scripts,upscaler,pnginfo_index,job_queue,progress_stream,job_context,shared_state
 from utils import errors,devices
 from scripts import postprocessing
 from components.shared import opts
 from components.processing import StableDiffusionProcessingTxt2Img, StableDiffusionProcessingImg2Img, process_images
 from components.textual_inversion.textual_inversion import create_embedding, train_embedding
 from components.hypernetworks.hypernetwork import create_hypernetwork, train_hypernetwork
-from components.hypernetworks import ui
 from PIL import PngImagePlugin, Image
 from components.sd_models_config import find_checkpoint_config_near_filename
 from components.realesrgan_model import get_realesrgan_models
@@ -51,6 +55,11 @@ def validate_sampler_name(name):
     return name
 
 
+def validate_return_paths(req):
+    if req.return_paths and not req.save_images:
+        raise HTTPException(status_code=422, detail="return_paths requires save_images, as paths are only known for saved images")
+
+
 def setUpscalers(req: dict):
     reqDict = vars(req)
     reqDict['extras_upscaler_1'] = reqDict.pop('upscaler_1', None)
@@ -78,6 +87,9 @@ def verify_url(url):
 
 
 def decode_base64_to_image(encoding):
+    if isinstance(encoding, Image.Image):
+        return encoding
+
     if encoding.startswith("http://") or encoding.startswith("https://"):
         if not opts.api_enable_requests:
             raise HTTPException(status_code=500, detail="Requests not allowed")
@@ -102,10 +114,10 @@ def decode_base64_to_image(encoding):
         raise HTTPException(status_code=500, detail="Invalid encoded image") from e
 
 
-def encode_pil_to_base64(image):
+def encode_pil_to_bytes(image):
+    """encodes image in the format from settings; returns bytes and their media type"""
+
     with io.BytesIO() as output_bytes:
-        if isinstance(image, str):
-            return image
         if opts.samples_format.lower() == 'png':
             use_metadata = False
             metadata = PngImagePlugin.PngInfo()
@@ -132,9 +144,77 @@ def encode_pil_to_base64(image):
 
         bytes_data = output_bytes.getvalue()
 
+    media_type = {"png": "image/png", "jpg": "image/jpeg", "jpeg": "image/jpeg", "webp": "image/webp"}[opts.samples_format.lower()]
+
+    return bytes_data, media_type
+
+
+def encode_pil_to_base64(image):
+    if isinstance(image, str):
+        return image
+
+    bytes_data, _ = encode_pil_to_bytes(image)
+
     return base64.b64encode(bytes_data)
 
 
+def multipart_response(response: BaseModel, images):
+    """
+    Returns a multipart/mixed response: the first part is the JSON response without images, followed by one part
+    per image with the encoded image as is.
+    """
+
+    boundary = uuid.uuid4().hex
+    parts = [(b"application/json", response.json().encode("utf8"))]
+    for image in images:
+        bytes_data, media_type = encode_pil_to_bytes(image)
+        parts.append((media_type.encode("utf8"), bytes_data))
+
+    body = io.BytesIO()
+    for i, (content_type, data) in enumerate(parts):
+        body.write(b"--" + boundary.encode("utf8") + b"\r\n")
+        body.write(b"Content-Type: " + content_type + b"\r\n")
+        if i > 0:
+            body.write(f"Content-Disposition: attachment; name=\"image\"; filename=\"{i - 1:05}\"\r\n".encode("utf8"))
+        body.write(b"Content-Length: " + str(len(data)).encode("utf8") + b"\r\n\r\n")
+        body.write(data)
+        body.write(b"\r\n")
+    body.write(b"--" + boundary.encode("utf8") + b"--\r\n")
+
+    return Response(content=body.getvalue(), media_type=f"multipart/mixed; boundary={boundary}")
+
+
+def images_response(request: Request, response: BaseModel, images, send_images=True, return_paths=False):
+    """
+    Fills images of a generation response according to what the client asked for:
+     - Accept: multipart/mixed - JSON and images as separate binary parts;
+     - Accept: image/* - the first image as the response body, with infotext in X-Infotext header;
+     - return_paths - paths to already saved files instead of images (requests with return_paths must also have save_images);
+     - otherwise, base64-encoded images in JSON, as before.
+    """
+
+    if not send_images:
+        response.images = []
+        return response
+
+    if return_paths:
+        response.images = [getattr(image, "already_saved_as", None) or "" for image in images]
+        return response
+
+    accept = request.headers.get("accept", "") if request is not None else ""
+    if "multipart/mixed" in accept:
+        response.images = []
+        return multipart_response(response, images)
+
+    if accept.startswith("image/") and images:
+        bytes_data, media_type = encode_pil_to_bytes(images[0])
+        infotext = images[0].info.get("parameters", "") if isinstance(images[0].info, dict) else ""
+        return Response(content=bytes_data, media_type=media_type, headers={"X-Infotext": base64.b64encode(infotext.encode("utf8")).decode("ascii")})
+
+    response.images = list(map(encode_pil_to_base64, images))
+    return response
+
+
 def api_middleware(app: FastAPI):
     rich_available = False
     try:
@@ -213,10 +293,23 @@ class Api:
         api_middleware(self.app)
         self.add_api_route("/sdapi/v1/txt2img", self.text2imgapi, methods=["POST"], response_model=models.TextToImageResponse)
         self.add_api_route("/sdapi/v1/img2img", self.img2imgapi, methods=["POST"], response_model=models.ImageToImageResponse)
+        self.add_api_route("/sdapi/v1/img2img-multipart", self.img2imgapi_multipart, methods=["POST"], response_model=models.ImageToImageResponse)
+        self.add_api_route("/sdapi/v1/jobs/txt2img", self.submit_txt2img, methods=["POST"], response_model=models.JobItem)
+        self.add_api_route("/sdapi/v1/jobs/img2img", self.submit_img2img, methods=["POST"], response_model=models.JobItem)
+        self.add_api_route("/sdapi/v1/jobs/extra-single-image", self.submit_extras_single_image, methods=["POST"], response_model=models.JobItem)
+        self.add_api_route("/sdapi/v1/jobs", self.get_jobs, methods=["GET"], response_model=list[models.JobItem])
+        self.add_api_route("/sdapi/v1/job-queue-metrics", self.get_job_queue_metrics, methods=["GET"], response_model=models.JobQueueMetrics)
+        self.add_api_route("/sdapi/v1/jobs/{id_job}", self.get_job, methods=["GET"], response_model=models.JobItem)
+        self.add_api_route("/sdapi/v1/jobs/{id_job}/result", self.get_job_result, methods=["GET"])
+        self.add_api_route("/sdapi/v1/jobs/{id_job}", self.cancel_job, methods=["DELETE"], response_model=models.JobItem)
         self.add_api_route("/sdapi/v1/extra-single-image", self.extras_single_image_api, methods=["POST"], response_model=models.ExtrasSingleImageResponse)
         self.add_api_route("/sdapi/v1/extra-batch-images", self.extras_batch_images_api, methods=["POST"], response_model=models.ExtrasBatchImagesResponse)
         self.add_api_route("/sdapi/v1/png-info", self.pnginfoapi, methods=["POST"], response_model=models.PNGInfoResponse)
+        self.add_api_route("/sdapi/v1/png-info-index", self.pnginfo_index, methods=["POST"], response_model=models.PNGInfoIndexResponse)
+        self.add_api_route("/sdapi/v1/png-info-search", self.pnginfo_search, methods=["GET"], response_model=list[models.PNGInfoSearchItem])
         self.add_api_route("/sdapi/v1/progress", self.progressapi, methods=["GET"], response_model=models.ProgressResponse)
+        self.add_api_route("/sdapi/v1/progress/stream", self.progress_stream, methods=["GET"])
+        self.app.add_api_websocket_route("/sdapi/v1/progress/ws", self.progress_websocket)
         self.add_api_route("/sdapi/v1/interrogate", self.interrogateapi, methods=["POST"])
         self.add_api_route("/sdapi/v1/interrupt", self.interruptapi, methods=["POST"])
         self.add_api_route("/sdapi/v1/skip", self.skip, methods=["POST"])
@@ -240,8 +333,12 @@ class Api:
         self.add_api_route("/sdapi/v1/train/embedding", self.train_embedding, methods=["POST"], response_model=models.TrainResponse)
         self.add_api_route("/sdapi/v1/train/hypernetwork", self.train_hypernetwork, methods=["POST"], response_model=models.TrainResponse)
         self.add_api_route("/sdapi/v1/memory", self.get_memory, methods=["GET"], response_model=models.MemoryResponse)
+        self.add_api_route("/sdapi/v1/sub-quad-chunking", self.get_sub_quad_chunking, methods=["GET"], response_model=list[models.SubQuadChunkingItem])
+        self.add_api_route("/sdapi/v1/attention-autotune", self.attention_autotune, methods=["POST"], response_model=list[models.AttentionAutotuneItem])
         self.add_api_route("/sdapi/v1/unload-checkpoint", self.unloadapi, methods=["POST"])
         self.add_api_route("/sdapi/v1/reload-checkpoint", self.reloadapi, methods=["POST"])
+        self.add_api_route("/sdapi/v1/upscaler-models", self.get_loaded_upscaler_models, methods=["GET"], response_model=list[models.LoadedUpscalerModelItem])
+        self.add_api_route("/sdapi/v1/unload-upscalers", self.unload_upscalers, methods=["POST"])
         self.add_api_route("/sdapi/v1/scripts", self.get_scripts_list, methods=["GET"], response_model=models.ScriptsList)
         self.add_api_route("/sdapi/v1/script-info", self.get_script_info, methods=["GET"], response_model=list[models.ScriptInfo])
         self.add_api_route("/sdapi/v1/extensions", self.get_extensions_list, methods=["GET"], response_model=list[models.ExtensionItem])
@@ -266,6 +363,23 @@ class Api:
 
         raise HTTPException(status_code=401, detail="Incorrect username or password", headers={"WWW-Authenticate": "Basic"})
 
+    def websocket_auth(self, websocket: WebSocket):
+        """HTTPBasic doesn't work with websockets, so the Authorization header is checked here"""
+
+        if not shared.cmd_opts.api_auth:
+            return True
+
+        scheme, _, value = websocket.headers.get("authorization", "").partition(" ")
+        if scheme.lower() != "basic":
+            return False
+
+        try:
+            username, _, password = base64.b64decode(value).decode("utf-8").partition(":")
+        except (ValueError, UnicodeDecodeError):
+            return False
+
+        return username in self.credentials and compare_digest(password, self.credentials[username])
+
     def get_selectable_script(self, script_name, script_runner):
         if script_name is None or script_name == "":
             return None, None
@@ -296,6 +410,9 @@ class Api:
         return script_runner.scripts[script_idx]
 
     def init_default_script_args(self, script_runner):
+        if script_runner.api_defaults is not None:
+            return list(script_runner.api_defaults)
+
         #find max idx from the scripts in runner and generate a none array to init script_args
         last_arg_index = 1
         for script in script_runner.scripts:
@@ -338,11 +455,13 @@ class Api:
                         script_args[alwayson_script.args_from + idx] = request.alwayson_scripts[alwayson_script_name]["args"][idx]
         return script_args
 
-    def text2imgapi(self, txt2imgreq: models.StableDiffusionTxt2ImgProcessingAPI):
+    def text2imgapi(self, txt2imgreq: models.StableDiffusionTxt2ImgProcessingAPI, request: Request = None):
+        validate_return_paths(txt2imgreq)
+
         script_runner = scripts.scripts_txt2img
         if not script_runner.scripts:
             script_runner.initialize_scripts(False)
-            ui.create_ui()
+            script_runner.setup_api()
         if not self.default_script_arg_txt2img:
             self.default_script_arg_txt2img = self.init_default_script_args(script_runner)
         selectable_scripts, selectable_script_idx = self.get_selectable_script(txt2imgreq.script_name, script_runner)
@@ -363,9 +482,10 @@ class Api:
         script_args = self.init_script_args(txt2imgreq, self.default_script_arg_txt2img, selectable_scripts, selectable_script_idx, script_runner)
 
         send_images = args.pop('send_images', True)
+        return_paths = args.pop('return_paths', False)
         args.pop('save_images', None)
 
-        with self.queue_lock:
+        with self.queue_lock.job(job_queue.queue.thread_job()):
             with closing(StableDiffusionProcessingTxt2Img(sd_model=shared.sd_model, **args)) as p:
                 p.is_api = True
                 p.scripts = script_runner
@@ -384,15 +504,17 @@ class Api:
                     shared.state.end()
                     shared.total_tqdm.clear()
 
-        b64images = list(map(encode_pil_to_base64, processed.images)) if send_images else []
+        response = models.TextToImageResponse(images=[], parameters=vars(txt2imgreq), info=processed.js())
 
-        return models.TextToImageResponse(images=b64images, parameters=vars(txt2imgreq), info=processed.js())
+        return images_response(request, response, processed.images, send_images=send_images, return_paths=return_paths)
 
-    def img2imgapi(self, img2imgreq: models.StableDiffusionImg2ImgProcessingAPI):
+    def img2imgapi(self, img2imgreq: models.StableDiffusionImg2ImgProcessingAPI, request: Request = None):
         init_images = img2imgreq.init_images
         if init_images is None:
             raise HTTPException(status_code=404, detail="Init image not found")
 
+        validate_return_paths(img2imgreq)
+
         mask = img2imgreq.mask
         if mask:
             mask = decode_base64_to_image(mask)
@@ -400,7 +522,7 @@ class Api:
         script_runner = scripts.scripts_img2img
         if not script_runner.scripts:
             script_runner.initialize_scripts(True)
-            ui.create_ui()
+            script_runner.setup_api()
         if not self.default_script_arg_img2img:
             self.default_script_arg_img2img = self.init_default_script_args(script_runner)
         selectable_scripts, selectable_script_idx = self.get_selectable_script(img2imgreq.script_name, script_runner)
@@ -423,9 +545,10 @@ class Api:
         script_args = self.init_script_args(img2imgreq, self.default_script_arg_img2img, selectable_scripts, selectable_script_idx, script_runner)
 
         send_images = args.pop('send_images', True)
+        return_paths = args.pop('return_paths', False)
         args.pop('save_images', None)
 
-        with self.queue_lock:
+        with self.queue_lock.job(job_queue.queue.thread_job()):
             with closing(StableDiffusionProcessingImg2Img(sd_model=shared.sd_model, **args)) as p:
                 p.init_images = [decode_base64_to_image(x) for x in init_images]
                 p.is_api = True
@@ -445,13 +568,100 @@ class Api:
                     shared.state.end()
                     shared.total_tqdm.clear()
 
-        b64images = list(map(encode_pil_to_base64, processed.images)) if send_images else []
-
         if not img2imgreq.include_init_images:
             img2imgreq.init_images = None
             img2imgreq.mask = None
 
-        return models.ImageToImageResponse(images=b64images, parameters=vars(img2imgreq), info=processed.js())
+        response = models.ImageToImageResponse(images=[], parameters=vars(img2imgreq), info=processed.js())
+
+        return images_response(request, response, processed.images, send_images=send_images, return_paths=return_paths)
+
+    async def img2imgapi_multipart(self, request: Request):
+        """
+        Same as img2imgapi, but takes a multipart/form-data request: the "payload" field holds the usual JSON request,
+        and init images and the mask are uploaded as files in "init_images" and "mask" fields.
+        """
+
+        form = await request.form()
+
+        img2imgreq = models.StableDiffusionImg2ImgProcessingAPI.parse_raw(form.get("payload") or "{}")
+        img2imgreq.include_init_images = False
+
+        init_images = [Image.open(BytesIO(await file.read())) for file in form.getlist("init_images")]
+        if init_images:
+            img2imgreq.init_images = init_images
+
+        mask = form.get("mask")
+        if mask is not None and not isinstance(mask, str):
+            img2imgreq.mask = Image.open(BytesIO(await mask.read()))
+
+        return await run_in_threadpool(self.img2imgapi, img2imgreq, request)
+
+    def job_item(self, job):
+        queued = job_queue.queue.queued()
+        return models.JobItem(**job.dict(), queue_position=queued.index(job.id) if job.id in queued else None)
+
+    def submit_job(self, func, priority, request, kind, req=None):
+        client = request.headers.get("x-client-id") or (request.client.host if request.client else None)
+
+        affinity = None
+        if req is not None:
+            override_settings = getattr(req, "override_settings", None) or {}
+            affinity = (override_settings.get("sd_model_checkpoint"), override_settings.get("sd_vae"), getattr(req, "refiner_checkpoint", None))
+
+        try:
+            job = job_queue.queue.submit(func, priority=priority, client=client, kind=kind, affinity=affinity)
+        except job_queue.QueueFull as e:
+            raise HTTPException(status_code=429, detail=str(e)) from e
+
+        return self.job_item(job)
+
+    def submit_txt2img(self, txt2imgreq: models.StableDiffusionTxt2ImgProcessingAPI, request: Request, priority: int = 0):
+        validate_return_paths(txt2imgreq)
+        return self.submit_job(lambda: self.text2imgapi(txt2imgreq), priority, request, "txt2img", txt2imgreq)
+
+    def submit_img2img(self, img2imgreq: models.StableDiffusionImg2ImgProcessingAPI, request: Request, priority: int = 0):
+        validate_return_paths(img2imgreq)
+        return self.submit_job(lambda: self.img2imgapi(img2imgreq), priority, request, "img2img", img2imgreq)
+
+    def submit_extras_single_image(self, req: models.ExtrasSingleImageRequest, request: Request, priority: int = 0):
+        return self.submit_job(lambda: self.extras_single_image_api(req), priority, request, "extras")
+
+    def get_jobs(self):
+        return [self.job_item(job) for job in job_queue.queue.list()]
+
+    def get_job_queue_metrics(self):
+        return models.JobQueueMetrics(**job_queue.queue.metrics())
+
+    def get_job(self, id_job: str):
+        job = job_queue.queue.get(id_job)
+        if job is None:
+            raise HTTPException(status_code=404, detail="Job not found")
+
+        return self.job_item(job)
+
+    def get_job_result(self, id_job: str):
+        job = job_queue.queue.get(id_job)
+        if job is None:
+            raise HTTPException(status_code=404, detail="Job not found")
+        if job.active:
+            raise HTTPException(status_code=409, detail=f"Job is {job.status}")
+        if job.status == "failed":
+            raise HTTPException(status_code=500, detail=job.error)
+        if job.result is None:
+            raise HTTPException(status_code=410, detail="Job result is no longer available")
+
+        return job.result
+
+    def cancel_job(self, id_job: str):
+        job = job_queue.queue.get(id_job)
+        if job is None:
+            raise HTTPException(status_code=404, detail="Job not found")
+
+        if not job_queue.queue.cancel(id_job) and job.active:
+            raise HTTPException(status_code=409, detail="Queued UI tasks can't be cancelled; they run when gradio gets to them")
+
+        return self.job_item(job)
 
     def extras_single_image_api(self, req: models.ExtrasSingleImageRequest):
         reqDict = setUpscalers(req)
@@ -488,33 +698,99 @@ class Api:
 
         return models.PNGInfoResponse(info=geninfo, items=items, parameters=params)
 
+    def pnginfo_index(self, req: models.PNGInfoIndexRequest):
+        if req.directories and shared.cmd_opts.hide_ui_dir_config:
+            raise HTTPException(status_code=403, detail="Indexing custom directories is disabled by --hide-ui-dir-config")
+
+        return models.PNGInfoIndexResponse(**pnginfo_index.index_directories(req.directories))
+
+    def pnginfo_search(self, req: models.PNGInfoSearchRequest = Depends()):
+        return pnginfo_index.search(text=req.text, seed=req.seed, model=req.model, sampler=req.sampler, limit=req.limit, offset=req.offset)
+
     def progressapi(self, req: models.ProgressRequest = Depends()):
         # copy from check_progress_call of ui.py
 
-        if shared.state.job_count == 0:
-            return models.ProgressResponse(progress=0, eta_relative=0, state=shared.state.dict(), textinfo=shared.state.textinfo)
+        if req.id_task is None:
+            state = job_context.reported_state(shared.state)
+        else:
+            state = job_context.state_for(req.id_task)
+            if state is None:
+                # a job that isn't running yet or anymore reports no progress, rather than that of another job
+                state = shared.state if job_queue.queue.current == req.id_task else shared_state.State()
+
+        if state.job_count == 0:
+            return models.ProgressResponse(progress=0, eta_relative=0, state=state.dict(), textinfo=state.textinfo)
 
         # avoid dividing zero
         progress = 0.01
 
-        if shared.state.job_count > 0:
-            progress += shared.state.job_no / shared.state.job_count
-        if shared.state.sampling_steps > 0:
-            progress += 1 / shared.state.job_count * shared.state.sampling_step / shared.state.sampling_steps
+        if state.job_count > 0:
+            progress += state.job_no / state.job_count
+        if state.sampling_steps > 0:
+            progress += 1 / state.job_count * state.sampling_step / state.sampling_steps
 
-        time_since_start = time.time() - shared.state.time_start
+        time_since_start = time.time() - state.time_start
         eta = (time_since_start/progress)
         eta_relative = eta-time_since_start
 
         progress = min(progress, 1)
 
-        shared.state.set_current_image()
+        state.set_current_image()
 
         current_image = None
-        if shared.state.current_image and not req.skip_current_image:
-            current_image = encode_pil_to_base64(shared.state.current_image)
+        image = state.current_image
+        if image and not req.skip_current_image:
+            current_image = progress_stream.previews.cached((id(state), state.id_live_preview), "api", lambda: encode_pil_to_base64(image))
+
+        return models.ProgressResponse(progress=progress, eta_relative=eta_relative, state=state.dict(), current_image=current_image, textinfo=state.textinfo)
+
+    async def progress_stream(self, request: Request, req: models.ProgressStreamRequest = Depends()):
+        """Server-Sent Events stream of progress and live preview updates; an event is sent only when something changes"""
+
+        subscriber = progress_stream.Subscriber(asyncio.get_running_loop(), req.format, req.size, req.live_preview)
+
+        async def events():
+            progress_stream.broadcaster.subscribe(subscriber)
+            try:
+                async for event in subscriber.events():
+                    if await request.is_disconnected():
+                        break
 
-        return models.ProgressResponse(progress=progress, eta_relative=eta_relative, state=shared.state.dict(), current_image=current_image, textinfo=shared.state.textinfo)
+                    if event is None:
+                        yield ": keep-alive\n\n"
+                        continue
+
+                    yield f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+            finally:
+                progress_stream.broadcaster.unsubscribe(subscriber)
+
+        return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+    async def progress_websocket(self, websocket: WebSocket):
+        """WebSocket stream of progress and live preview updates; takes the same query parameters as the SSE stream"""
+
+        if not self.websocket_auth(websocket):
+            await websocket.close(code=1008)
+            return
+
+        params = websocket.query_params
+        try:
+            size = int(params.get("size", 0))
+        except ValueError:
+            size = 0
+
+        live_preview = params.get("live_preview", "true").lower() not in ("false", "0")
+        subscriber = progress_stream.Subscriber(asyncio.get_running_loop(), params.get("format"), size, live_preview)
+
+        await websocket.accept()
+        progress_stream.broadcaster.subscribe(subscriber)
+        try:
+            async for event in subscriber.events():
+                await websocket.send_json(event if event is not None else {"type": "ping"})
+        except WebSocketDisconnect:
+            pass
+        finally:
+            progress_stream.broadcaster.unsubscribe(subscriber)
 
     def interrogateapi(self, interrogatereq: models.InterrogateRequest):
         image_b64 = interrogatereq.image
@@ -550,6 +826,14 @@ class Api:
 
         return {}
 
+    def get_loaded_upscaler_models(self):
+        return [{"path": path, "device": device, "size": size} for path, device, size in upscaler.models_cache.loaded()]
+
+    def unload_upscalers(self):
+        upscaler.models_cache.unload()
+
+        return {}
+
     def skip(self):
         shared.state.skip()
 
@@ -757,13 +1041,44 @@ class Api:
             cuda = {'error': f'{err}'}
         return models.MemoryResponse(ram=ram, cuda=cuda)
 
+    def get_sub_quad_chunking(self):
+        from components.sd import sd_hijack_optimizations
+
+        return [
+            models.SubQuadChunkingItem(
+                device=device,
+                batch_x_heads=batch_x_heads,
+                q_tokens=q_tokens,
+                k_tokens=k_tokens,
+                v_channels=v_channels,
+                bytes_per_token=bytes_per_token,
+                **chunking._asdict(),
+            )
+            for (device, batch_x_heads, q_tokens, k_tokens, v_channels, bytes_per_token, _), chunking in list(sd_hijack_optimizations.sub_quad_chunking_cache.items())
+        ]
+
+    def attention_autotune(self, req: models.AttentionAutotuneRequest):
+        res = []
+        with self.queue_lock:
+            for width, height in req.resolutions or sd_hijack_autotune.common_resolutions:
+                entry = sd_hijack_autotune.tune(shared.sd_model, width, height, force=req.force) or {}
+                res.append(models.AttentionAutotuneItem(
+                    width=width,
+                    height=height,
+                    key=sd_hijack_autotune.cache_key(shared.sd_model, width, height),
+                    winner=entry.get("winner"),
+                    timings=entry.get("timings", {}),
+                ))
+
+        return res
+
     def get_extensions_list(self):
         from components import extensions
         extensions.list_extensions()
+        extensions.read_info_from_repos()
         ext_list = []
         for ext in extensions.extensions:
             ext: extensions.Extension
-            ext.read_info_from_repo()
             if ext.remote is not None:
                 ext_list.append({
                     "name": ext.name,
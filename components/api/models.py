@@ -106,6 +106,7 @@ StableDiffusionTxt2ImgProcessingAPI = PydanticModelGenerator(
         {"key": "script_args", "type": list, "default": []},
         {"key": "send_images", "type": bool, "default": True},
         {"key": "save_images", "type": bool, "default": False},
+        {"key": "return_paths", "type": bool, "default": False},
         {"key": "alwayson_scripts", "type": dict, "default": {}},
     ]
 ).generate_model()
@@ -123,6 +124,7 @@ StableDiffusionImg2ImgProcessingAPI = PydanticModelGenerator(
         {"key": "script_args", "type": list, "default": []},
         {"key": "send_images", "type": bool, "default": True},
         {"key": "save_images", "type": bool, "default": False},
+        {"key": "return_paths", "type": bool, "default": False},
         {"key": "alwayson_scripts", "type": dict, "default": {}},
     ]
 ).generate_model()
@@ -179,8 +181,42 @@ class PNGInfoResponse(BaseModel):
     items: dict = Field(title="Items", description="A dictionary containing all the other fields the image had")
     parameters: dict = Field(title="Parameters", description="A dictionary with parsed generation info fields")
 
+class PNGInfoIndexRequest(BaseModel):
+    directories: Optional[list[str]] = Field(default=None, title="Directories", description="Directories to index; all output directories if not specified")
+
+class PNGInfoIndexResponse(BaseModel):
+    added: int = Field(title="Added")
+    updated: int = Field(title="Updated")
+    removed: int = Field(title="Removed")
+    unchanged: int = Field(title="Unchanged")
+
+class PNGInfoSearchRequest(BaseModel):
+    text: Optional[str] = Field(default=None, title="Text", description="Text to look for in the prompt")
+    seed: Optional[int] = Field(default=None, title="Seed")
+    model: Optional[str] = Field(default=None, title="Model", description="Model name or hash")
+    sampler: Optional[str] = Field(default=None, title="Sampler")
+    limit: int = Field(default=100, title="Limit", description="Maximum number of results")
+    offset: int = Field(default=0, title="Offset", description="Number of results to skip")
+
+class PNGInfoSearchItem(BaseModel):
+    path: str = Field(title="Path")
+    mtime: float = Field(title="Modification time")
+    size: int = Field(title="File size")
+    parameters: Optional[str] = Field(title="Parameters", description="Generation parameters text")
+    prompt: Optional[str] = Field(title="Prompt")
+    negative_prompt: Optional[str] = Field(title="Negative prompt")
+    seed: Optional[int] = Field(title="Seed")
+    model: Optional[str] = Field(title="Model")
+    model_hash: Optional[str] = Field(title="Model hash")
+    sampler: Optional[str] = Field(title="Sampler")
+    steps: Optional[int] = Field(title="Steps")
+    cfg_scale: Optional[float] = Field(title="CFG scale")
+    width: Optional[int] = Field(title="Width")
+    height: Optional[int] = Field(title="Height")
+
 class ProgressRequest(BaseModel):
     skip_current_image: bool = Field(default=False, title="Skip current image", description="Skip current image serialization")
+    id_task: Optional[str] = Field(default=None, title="Job id", description="Id of a job from /sdapi/v1/jobs to report progress of; progress of whatever is running if not set")
 
 class ProgressResponse(BaseModel):
     progress: float = Field(title="Progress", description="The progress with a range of 0 to 1")
@@ -189,6 +225,11 @@ class ProgressResponse(BaseModel):
     current_image: str = Field(default=None, title="Current image", description="The current image in base64 format. opts.show_progress_every_n_steps is required for this to work.")
     textinfo: str = Field(default=None, title="Info text", description="Info text used by WebUI.")
 
+class ProgressStreamRequest(BaseModel):
+    live_preview: bool = Field(default=True, title="Include live preview", description="Send live preview images along with progress")
+    format: Optional[str] = Field(default=None, title="Live preview format", description="jpeg, png or webp; the format from settings is used if not set")
+    size: int = Field(default=0, title="Live preview size", description="Live previews are downscaled to fit into a square of this size; 0 = original size")
+
 class InterrogateRequest(BaseModel):
     image: str = Field(default="", title="Image", description="Image to work on, must be a Base64 string containing the image's data.")
     model: str = Field(default="clip", title="Model", description="The interrogate model used.")
@@ -287,6 +328,56 @@ class MemoryResponse(BaseModel):
     ram: dict = Field(title="RAM", description="System memory stats")
     cuda: dict = Field(title="CUDA", description="nVidia CUDA memory stats")
 
+class SubQuadChunkingItem(BaseModel):
+    device: str = Field(title="Device", description="Type of device the attention was calculated on")
+    batch_x_heads: int = Field(title="Batch x heads")
+    q_tokens: int = Field(title="Query tokens")
+    k_tokens: int = Field(title="Key tokens")
+    v_channels: int = Field(title="Value channels per head")
+    bytes_per_token: int = Field(title="Bytes per element")
+    budget_bytes: int = Field(title="Memory budget", description="Memory budget in bytes the chunk sizes were picked for")
+    q_chunk_size: int = Field(title="Query chunk size")
+    kv_chunk_size: int = Field(title="Key/value chunk size")
+    peak_bytes: int = Field(title="Estimated peak memory", description="Estimated peak memory in bytes used by attention with chosen chunk sizes")
+
+class AttentionAutotuneRequest(BaseModel):
+    resolutions: Optional[list[tuple[int, int]]] = Field(default=None, title="Resolutions", description="List of [width, height] pairs to benchmark; common resolutions are used if not specified")
+    force: bool = Field(default=False, title="Force", description="Run the benchmark even if there are saved results for the resolution")
+
+class AttentionAutotuneItem(BaseModel):
+    width: int = Field(title="Width")
+    height: int = Field(title="Height")
+    key: str = Field(title="Key", description="Device, model type and shape bucket the result is saved for")
+    winner: Optional[str] = Field(title="Winner", description="Fastest cross attention optimization")
+    timings: dict[str, float] = Field(title="Timings", description="Time in seconds spent in cross attention layers for one UNet call, per optimization")
+
+class LoadedUpscalerModelItem(BaseModel):
+    path: str = Field(title="Path", description="Path or URL the model was loaded from")
+    device: str = Field(title="Device")
+    size: int = Field(title="Size", description="Memory used by the model's weights, in bytes")
+
+
+class JobItem(BaseModel):
+    id: str = Field(title="ID", description="Job ID; use it to query status and result")
+    kind: Optional[str] = Field(title="Kind", description="What the job does, e.g. txt2img")
+    status: str = Field(title="Status", description="One of queued, running, done, failed, cancelled")
+    priority: int = Field(title="Priority")
+    client: Optional[str] = Field(title="Client")
+    created: float = Field(title="Created", description="Time the job was submitted, as unix timestamp")
+    started: Optional[float] = Field(title="Started")
+    finished: Optional[float] = Field(title="Finished")
+    error: Optional[str] = Field(title="Error", description="Error message for failed jobs")
+    queue_position: Optional[int] = Field(default=None, title="Queue position", description="Number of jobs that will run before this one, for queued jobs")
+
+class JobQueueMetrics(BaseModel):
+    jobs: int = Field(title="Jobs", description="Number of queued API jobs that have been started")
+    swaps: int = Field(title="Swaps", description="Number of started jobs that needed a different checkpoint or VAE than the loaded one")
+    swaps_avoided: int = Field(title="Swaps avoided", description="Number of times a job using the loaded checkpoint was run ahead of an older job that needed a different one")
+    checkpoint_loads: int = Field(title="Checkpoint loads", description="Number of times checkpoint weights were loaded, by any caller")
+    checkpoint_load_time: float = Field(title="Checkpoint load time", description="Total time spent loading checkpoint weights, in seconds")
+    average_checkpoint_load_time: float = Field(title="Average checkpoint load time")
+    time_saved: float = Field(title="Time saved", description="Estimated time saved by avoided swaps, in seconds")
+
 
 class ScriptsList(BaseModel):
     txt2img: list = Field(default=None, title="Txt2img", description="Titles of scripts (txt2img)")
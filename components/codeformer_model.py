@@ -27,14 +27,6 @@ def setup_model(dirname):
         return
 
     try:
-        from torchvision.transforms.functional import normalize
-        from components.codeformer.codeformer_arch import CodeFormer
-        from basicsr.utils import img2tensor, tensor2img
-        from facelib.utils.face_restoration_helper import FaceRestoreHelper
-        from facelib.detection.retinaface import retinaface
-
-        net_class = CodeFormer
-
         class FaceRestorerCodeFormer(components.face_restoration.FaceRestoration):
             def name(self):
                 return "CodeFormer"
@@ -49,13 +41,18 @@ def setup_model(dirname):
                 if self.net is not None and self.face_helper is not None:
                     self.net.to(devices.device_codeformer)
                     return self.net, self.face_helper
+
+                # imported here rather than at startup because facelib and the network take a while to import
+                from components.codeformer.codeformer_arch import CodeFormer
+                from facelib.utils.face_restoration_helper import FaceRestoreHelper
+                from facelib.detection.retinaface import retinaface
                 model_paths = modelloader.load_models(model_path, model_url, self.cmd_dir, download_name='codeformer-v0.1.0.pth', ext_filter=['.pth'])
                 if len(model_paths) != 0:
                     ckpt_path = model_paths[0]
                 else:
                     print("Unable to load codeformer model.")
                     return None, None
-                net = net_class(dim_embd=512, codebook_size=1024, n_head=8, n_layers=9, connect_list=['32', '64', '128', '256']).to(devices.device_codeformer)
+                net = CodeFormer(dim_embd=512, codebook_size=1024, n_head=8, n_layers=9, connect_list=['32', '64', '128', '256']).to(devices.device_codeformer)
                 checkpoint = torch.load(ckpt_path)['params_ema']
                 net.load_state_dict(checkpoint)
                 net.eval()
@@ -75,53 +72,38 @@ def setup_model(dirname):
                 self.face_helper.face_parse.to(device)
 
             def restore(self, np_image, w=None):
-                np_image = np_image[:, :, ::-1]
+                return self.restore_batch([np_image], w=w)[0]
 
-                original_resolution = np_image.shape[0:2]
+            def restore_batch(self, np_images, w=None):
+                np_images = [np_image[:, :, ::-1] for np_image in np_images]
 
                 self.create_models()
                 if self.net is None or self.face_helper is None:
-                    return np_image
+                    return np_images
 
                 self.send_model_to(devices.device_codeformer)
 
-                self.face_helper.clean_all()
-                self.face_helper.read_image(np_image)
-                self.face_helper.get_face_landmarks_5(only_center_face=False, resize=640, eye_dist_threshold=5)
-                self.face_helper.align_warp_face()
-
-                for cropped_face in self.face_helper.cropped_faces:
-                    cropped_face_t = img2tensor(cropped_face / 255., bgr2rgb=True, float32=True)
-                    normalize(cropped_face_t, (0.5, 0.5, 0.5), (0.5, 0.5, 0.5), inplace=True)
-                    cropped_face_t = cropped_face_t.unsqueeze(0).to(devices.device_codeformer)
-
-                    try:
-                        with torch.no_grad():
-                            output = self.net(cropped_face_t, w=w if w is not None else shared.opts.code_former_weight, adain=True)[0]
-                            restored_face = tensor2img(output, rgb2bgr=True, min_max=(-1, 1))
-                        del output
-                        devices.torch_gc()
-                    except Exception:
-                        errors.report('Failed inference for CodeFormer', exc_info=True)
-                        restored_face = tensor2img(cropped_face_t, rgb2bgr=True, min_max=(-1, 1))
+                weight = w if w is not None else shared.opts.code_former_weight
 
-                    restored_face = restored_face.astype('uint8')
-                    self.face_helper.add_restored_face(restored_face)
+                def net(faces):
+                    return self.net(faces, w=weight, adain=True)[0]
 
-                self.face_helper.get_inverse_affine(None)
+                restored_imgs = components.face_restoration.restore_with_face_helper(self.face_helper, np_images, net, devices.device_codeformer, resize=640)
 
-                restored_img = self.face_helper.paste_faces_to_input_image()
-                restored_img = restored_img[:, :, ::-1]
+                res = []
+                for np_image, restored_img in zip(np_images, restored_imgs):
+                    restored_img = restored_img[:, :, ::-1]
 
-                if original_resolution != restored_img.shape[0:2]:
-                    restored_img = cv2.resize(restored_img, (0, 0), fx=original_resolution[1]/restored_img.shape[1], fy=original_resolution[0]/restored_img.shape[0], interpolation=cv2.INTER_LINEAR)
+                    original_resolution = np_image.shape[0:2]
+                    if original_resolution != restored_img.shape[0:2]:
+                        restored_img = cv2.resize(restored_img, (0, 0), fx=original_resolution[1]/restored_img.shape[1], fy=original_resolution[0]/restored_img.shape[0], interpolation=cv2.INTER_LINEAR)
 
-                self.face_helper.clean_all()
+                    res.append(restored_img)
 
                 if shared.opts.face_restoration_unload:
                     self.send_model_to(devices.cpu)
 
-                return restored_img
+                return res
 
         global codeformer
         codeformer = FaceRestorerCodeFormer(dirname)
@@ -1,14 +1,12 @@
 import sys
 
-import numpy as np
 import torch
-from PIL import Image
 
 import components.esrgan_model_arch as arch
-from components import modelloader, images
+from components import modelloader, upscaler_utils
 from utils import devices
 from components.shared import opts
-from components.upscaler import Upscaler, UpscalerData
+from components.upscaler import Upscaler, UpscalerData, models_cache
 
 
 def mod2normal(state_dict):
@@ -143,11 +141,10 @@ class UpscalerESRGAN(Upscaler):
 
     def do_upscale(self, img, selected_model):
         try:
-            model = self.load_model(selected_model)
+            model = models_cache.get(selected_model, devices.device_esrgan, lambda: self.load_model(selected_model).to(devices.device_esrgan))
         except Exception as e:
             print(f"Unable to load ESRGAN model {selected_model}: {e}", file=sys.stderr)
             return img
-        model.to(devices.device_esrgan)
         img = esrgan_upscale(model, img)
         return img
 
@@ -192,39 +189,8 @@ class UpscalerESRGAN(Upscaler):
 
 
 def upscale_without_tiling(model, img):
-    img = np.array(img)
-    img = img[:, :, ::-1]
-    img = np.ascontiguousarray(np.transpose(img, (2, 0, 1))) / 255
-    img = torch.from_numpy(img).float()
-    img = img.unsqueeze(0).to(devices.device_esrgan)
-    with torch.no_grad():
-        output = model(img)
-    output = output.squeeze().float().cpu().clamp_(0, 1).numpy()
-    output = 255. * np.moveaxis(output, 0, 2)
-    output = output.astype(np.uint8)
-    output = output[:, :, ::-1]
-    return Image.fromarray(output, 'RGB')
+    return upscaler_utils.upscale_without_tiling(model, img, devices.device_esrgan)
 
 
 def esrgan_upscale(model, img):
-    if opts.ESRGAN_tile == 0:
-        return upscale_without_tiling(model, img)
-
-    grid = images.split_grid(img, opts.ESRGAN_tile, opts.ESRGAN_tile, opts.ESRGAN_tile_overlap)
-    newtiles = []
-    scale_factor = 1
-
-    for y, h, row in grid.tiles:
-        newrow = []
-        for tiledata in row:
-            x, w, tile = tiledata
-
-            output = upscale_without_tiling(model, tile)
-            scale_factor = output.width // tile.width
-
-            newrow.append([x * scale_factor, w * scale_factor, output])
-        newtiles.append([y * scale_factor, h * scale_factor, newrow])
-
-    newgrid = images.Grid(newtiles, grid.tile_w * scale_factor, grid.tile_h * scale_factor, grid.image_w * scale_factor, grid.image_h * scale_factor, grid.overlap * scale_factor)
-    output = images.combine_grid(newgrid)
-    return output
+    return upscaler_utils.upscale_with_model(model, img, opts.ESRGAN_tile, opts.ESRGAN_tile_overlap, devices.device_esrgan)
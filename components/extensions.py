@@ -4,9 +4,10 @@ import configparser
 import os
 import threading
 import re
+from concurrent.futures import ThreadPoolExecutor
 
 from components import shared, scripts
-from utils import errors,cache
+from utils import errors, cache, git_metadata
 from components.gitpython_hack import Repo
 from components.paths_internal import extensions_dir, extensions_builtin_dir, script_path  # noqa: F401
 
@@ -67,7 +68,6 @@ class ExtensionMetadata:
 
 
 class Extension:
-    lock = threading.Lock()
     cached_fields = ['remote', 'commit_date', 'branch', 'commit_hash', 'version']
     metadata: ExtensionMetadata
 
@@ -84,6 +84,7 @@ class Extension:
         self.branch = None
         self.remote = None
         self.have_info_from_repo = False
+        self.lock = threading.Lock()
         self.metadata = metadata if metadata else ExtensionMetadata(self.path, name.lower())
         self.canonical_name = metadata.canonical_name
 
@@ -107,14 +108,23 @@ class Extension:
 
                 return self.to_dict()
 
-        try:
-            d = cache.cached_data_for_file('extensions-git', self.name, os.path.join(self.path, ".git"), read_from_repo)
-            self.from_dict(d)
-        except FileNotFoundError:
-            pass
+        key = git_metadata.state_key(self.path)
+        if key is not None:
+            d = cache.cached_data_for_key('extensions-git', self.name, key, read_from_repo)
+            if d is not None:
+                self.from_dict(d)
+
         self.status = 'unknown' if self.status == '' else self.status
 
     def do_read_info_from_repo(self):
+        info = git_metadata.read_info(self.path)
+        if info is not None:
+            for field, value in info.items():
+                setattr(self, field, value)
+            self.version = self.commit_hash[:8]
+            self.have_info_from_repo = True
+            return
+
         repo = None
         try:
             if os.path.exists(os.path.join(self.path, ".git")):
@@ -235,4 +245,13 @@ def list_extensions():
                 continue
 
 
+def read_info_from_repos(extensions_list=None):
+    """reads git information for extensions (by default, all of them) using a pool of threads"""
+
+    extensions_list = extensions if extensions_list is None else extensions_list
+
+    with ThreadPoolExecutor(max_workers=min(16, (os.cpu_count() or 1) * 4), thread_name_prefix="extensions-git") as executor:
+        list(executor.map(lambda x: x.read_info_from_repo(), extensions_list))
+
+
 extensions: list[Extension] = []
@@ -1,4 +1,11 @@
+import numpy as np
+import torch
+
 from components import shared
+from utils import devices, errors
+
+face_helper_state = ('input_img', 'is_gray', 'all_landmarks_5', 'det_faces', 'affine_matrices', 'cropped_faces')
+"""fields of facexlib/facelib FaceRestoreHelper that describe faces found on one image"""
 
 
 class FaceRestoration:
@@ -8,12 +15,104 @@ class FaceRestoration:
     def restore(self, np_image):
         return np_image
 
+    def restore_batch(self, np_images):
+        """restores faces on several images; restorers that can do so run all faces through the network together"""
 
-def restore_faces(np_image):
+        return [self.restore(np_image) for np_image in np_images]
+
+
+def faces_to_tensor(faces, device):
+    """converts a list of BGR uint8 face crops into a RGB tensor in -1..1 range, same as img2tensor + normalize from basicsr"""
+
+    arr = np.ascontiguousarray(np.stack(faces)[:, :, :, ::-1].transpose(0, 3, 1, 2), dtype=np.float32) / 255.
+    return (torch.from_numpy(arr).to(device) - 0.5) / 0.5
+
+
+def tensor_to_faces(tensor):
+    """reverse of faces_to_tensor, same as tensor2img from basicsr with min_max=(-1, 1)"""
+
+    arr = (tensor.float().clamp(-1, 1) + 1) / 2
+    arr = (arr.cpu().numpy() * 255.).round().astype(np.uint8)
+    return list(np.ascontiguousarray(arr.transpose(0, 2, 3, 1)[:, :, :, ::-1]))
+
+
+def restore_face_batches(faces, net, device):
+    """
+    Runs net on BGR uint8 face crops, up to opts.face_restoration_batch_size faces in one forward pass.
+    net takes a batch tensor and returns a batch tensor. If a batch fails, its faces are returned unchanged.
+    """
+
+    batch_size = max(1, int(shared.opts.face_restoration_batch_size))
+
+    restored = []
+    for i in range(0, len(faces), batch_size):
+        batch = faces[i:i + batch_size]
+        try:
+            with torch.no_grad():
+                output = net(faces_to_tensor(batch, device))
+            restored += tensor_to_faces(output)
+        except Exception:
+            errors.report('Failed inference for face restoration', exc_info=True)
+            restored += batch
+
+    devices.torch_gc()
+
+    return restored
+
+
+def restore_with_face_helper(face_helper, np_images, net, device, **detect_args):
+    """
+    Detects and aligns faces on all BGR images with face_helper, restores all found faces together with
+    restore_face_batches, and pastes them back. Returns a list of BGR images.
+    """
+
+    found = []
+    for np_image in np_images:
+        face_helper.clean_all()
+        face_helper.read_image(np_image)
+        face_helper.get_face_landmarks_5(only_center_face=False, eye_dist_threshold=5, **detect_args)
+        face_helper.align_warp_face()
+
+        found.append({name: getattr(face_helper, name) for name in face_helper_state if hasattr(face_helper, name)})
+
+    restored = iter(restore_face_batches([face for state in found for face in state['cropped_faces']], net, device))
+
+    res = []
+    for state in found:
+        face_helper.clean_all()
+        for name, value in state.items():
+            setattr(face_helper, name, value)
+
+        for _ in state['cropped_faces']:
+            face_helper.add_restored_face(next(restored))
+
+        face_helper.get_inverse_affine(None)
+        res.append(face_helper.paste_faces_to_input_image())
+
+    face_helper.clean_all()
+
+    return res
+
+
+def get_face_restorer():
     face_restorers = [x for x in shared.face_restorers if x.name() == shared.opts.face_restoration_model or shared.opts.face_restoration_model is None]
     if len(face_restorers) == 0:
-        return np_image
+        return None
+
+    return face_restorers[0]
 
-    face_restorer = face_restorers[0]
+
+def restore_faces(np_image):
+    face_restorer = get_face_restorer()
+    if face_restorer is None:
+        return np_image
 
     return face_restorer.restore(np_image)
+
+
+def restore_faces_batch(np_images):
+    face_restorer = get_face_restorer()
+    if face_restorer is None:
+        return np_images
+
+    return face_restorer.restore_batch(np_images)
@@ -1,8 +1,6 @@
+import importlib.util
 import os
 
-import facexlib
-import gfpgan
-
 import components.face_restoration
 from components import paths, shared, modelloader
 from utils import devices, errors
@@ -14,6 +12,7 @@ model_file_path = None
 model_url = "https://github.com/TencentARC/GFPGAN/releases/download/v1.3.0/GFPGANv1.4.pth"
 have_gfpgan = False
 loaded_gfpgan_model = None
+facexlib_path = None
 
 
 def gfpgann():
@@ -24,9 +23,11 @@ def gfpgann():
         loaded_gfpgan_model.gfpgan.to(devices.device_gfpgan)
         return loaded_gfpgan_model
 
-    if gfpgan_constructor is None:
+    if load_gfpgan() is None:
         return None
 
+    import facexlib.detection.retinaface
+
     models = modelloader.load_models(model_path, model_url, user_path, ext_filter=['.pth'])
 
     if len(models) == 1 and models[0].startswith("http"):
@@ -58,61 +59,85 @@ def send_model_to(model, device):
 
 
 def gfpgan_fix_faces(np_image):
+    return gfpgan_fix_faces_batch([np_image])[0]
+
+
+def gfpgan_fix_faces_batch(np_images):
     model = gfpgann()
     if model is None:
-        return np_image
+        return np_images
 
     send_model_to(model, devices.device_gfpgan)
 
-    np_image_bgr = np_image[:, :, ::-1]
-    cropped_faces, restored_faces, gfpgan_output_bgr = model.enhance(np_image_bgr, has_aligned=False, only_center_face=False, paste_back=True)
-    np_image = gfpgan_output_bgr[:, :, ::-1]
+    def net(faces):
+        return model.gfpgan(faces, return_rgb=False, weight=0.5)[0]
 
-    model.face_helper.clean_all()
+    np_images_bgr = [np_image[:, :, ::-1] for np_image in np_images]
+    gfpgan_outputs_bgr = components.face_restoration.restore_with_face_helper(model.face_helper, np_images_bgr, net, devices.device_gfpgan)
+    np_images = [gfpgan_output_bgr[:, :, ::-1] for gfpgan_output_bgr in gfpgan_outputs_bgr]
 
     if shared.opts.face_restoration_unload:
         send_model_to(model, devices.cpu)
 
-    return np_image
+    return np_images
 
 
 gfpgan_constructor = None
 
 
+def load_gfpgan():
+    """imports gfpgan and facexlib and makes them download models into webui's directories; returns GFPGANer class"""
+
+    global gfpgan_constructor
+
+    if gfpgan_constructor is not None or not have_gfpgan:
+        return gfpgan_constructor
+
+    import facexlib
+    import gfpgan
+    from gfpgan import GFPGANer
+    from facexlib import detection, parsing  # noqa: F401
+
+    load_file_from_url_orig = gfpgan.utils.load_file_from_url
+    facex_load_file_from_url_orig = facexlib.detection.load_file_from_url
+    facex_load_file_from_url_orig2 = facexlib.parsing.load_file_from_url
+
+    def my_load_file_from_url(**kwargs):
+        return load_file_from_url_orig(**dict(kwargs, model_dir=model_file_path))
+
+    def facex_load_file_from_url(**kwargs):
+        return facex_load_file_from_url_orig(**dict(kwargs, save_dir=facexlib_path, model_dir=None))
+
+    def facex_load_file_from_url2(**kwargs):
+        return facex_load_file_from_url_orig2(**dict(kwargs, save_dir=facexlib_path, model_dir=None))
+
+    gfpgan.utils.load_file_from_url = my_load_file_from_url
+    facexlib.detection.load_file_from_url = facex_load_file_from_url
+    facexlib.parsing.load_file_from_url = facex_load_file_from_url2
+    gfpgan_constructor = GFPGANer
+
+    return gfpgan_constructor
+
+
 def setup_model(dirname):
     try:
         os.makedirs(model_path, exist_ok=True)
-        from gfpgan import GFPGANer
-        from facexlib import detection, parsing  # noqa: F401
         global user_path
         global have_gfpgan
-        global gfpgan_constructor
-        global model_file_path
+        global facexlib_path
+
+        # the libraries are only imported on first use, by load_gfpgan()
+        missing = [name for name in ("gfpgan", "facexlib") if importlib.util.find_spec(name) is None]
+        if missing:
+            raise ImportError(f"missing modules: {', '.join(missing)}")
 
         facexlib_path = model_path
 
         if dirname is not None:
             facexlib_path = dirname
 
-        load_file_from_url_orig = gfpgan.utils.load_file_from_url
-        facex_load_file_from_url_orig = facexlib.detection.load_file_from_url
-        facex_load_file_from_url_orig2 = facexlib.parsing.load_file_from_url
-
-        def my_load_file_from_url(**kwargs):
-            return load_file_from_url_orig(**dict(kwargs, model_dir=model_file_path))
-
-        def facex_load_file_from_url(**kwargs):
-            return facex_load_file_from_url_orig(**dict(kwargs, save_dir=facexlib_path, model_dir=None))
-
-        def facex_load_file_from_url2(**kwargs):
-            return facex_load_file_from_url_orig2(**dict(kwargs, save_dir=facexlib_path, model_dir=None))
-
-        gfpgan.utils.load_file_from_url = my_load_file_from_url
-        facexlib.detection.load_file_from_url = facex_load_file_from_url
-        facexlib.parsing.load_file_from_url = facex_load_file_from_url2
         user_path = dirname
         have_gfpgan = True
-        gfpgan_constructor = GFPGANer
 
         class FaceRestorerGFPGAN(components.face_restoration.FaceRestoration):
             def name(self):
@@ -121,6 +146,9 @@ def setup_model(dirname):
             def restore(self, np_image):
                 return gfpgan_fix_faces(np_image)
 
+            def restore_batch(self, np_images):
+                return gfpgan_fix_faces_batch(np_images)
+
         shared.face_restorers.append(FaceRestorerGFPGAN())
     except Exception:
         errors.report("Error setting up GFPGAN", exc_info=True)
@@ -0,0 +1,155 @@
+"""
+Reading of text metadata from PNG, JPEG and WebP files without decoding pixels or using PIL.
+
+read_metadata returns the same keys PIL puts into Image.info for the fields webui cares about: text chunks of PNG files
+by their keyword, "exif" with raw EXIF data, and "comment" for JPEG comments.
+"""
+
+import io
+import struct
+import zlib
+
+png_signature = b'\x89PNG\r\n\x1a\n'
+max_chunk_size = 64 * 1024 * 1024
+"""text and EXIF chunks larger than this are skipped"""
+
+
+class ImageMetadata:
+    def __init__(self, info, width=None, height=None):
+        self.info = info
+        self.width = width
+        self.height = height
+
+
+def read_png(file):
+    info = {}
+    width = height = None
+
+    while True:
+        header = file.read(8)
+        if len(header) < 8:
+            break
+
+        length, chunk_type = struct.unpack('>I4s', header)
+        if chunk_type == b'IEND':
+            break
+
+        if chunk_type not in (b'IHDR', b'tEXt', b'zTXt', b'iTXt', b'eXIf') or length > max_chunk_size:
+            file.seek(length + 4, io.SEEK_CUR)
+            continue
+
+        data = file.read(length)
+        file.seek(4, io.SEEK_CUR)
+
+        try:
+            if chunk_type == b'IHDR':
+                width, height = struct.unpack('>II', data[:8])
+            elif chunk_type == b'tEXt':
+                key, value = data.split(b'\0', 1)
+                info[key.decode('latin-1')] = value.decode('latin-1')
+            elif chunk_type == b'zTXt':
+                key, value = data.split(b'\0', 1)
+                info[key.decode('latin-1')] = zlib.decompress(value[1:]).decode('latin-1')
+            elif chunk_type == b'iTXt':
+                key, rest = data.split(b'\0', 1)
+                compressed, rest = rest[0], rest[2:]
+                _, _, value = rest.split(b'\0', 2)
+                if compressed:
+                    value = zlib.decompress(value)
+                info[key.decode('latin-1')] = value.decode('utf8', errors='ignore')
+            elif chunk_type == b'eXIf':
+                info['exif'] = b'Exif\x00\x00' + data
+        except (ValueError, IndexError, zlib.error, struct.error):
+            pass
+
+    return ImageMetadata(info, width, height)
+
+
+def read_jpeg(file):
+    info = {}
+    width = height = None
+
+    while True:
+        marker = file.read(2)
+        if len(marker) < 2 or marker[0] != 0xFF:
+            break
+
+        code = marker[1]
+        if code == 0xD8 or 0xD0 <= code <= 0xD7 or code == 0x01:
+            continue
+        if code in (0xD9, 0xDA):
+            # end of image or start of compressed data; no metadata after that
+            break
+
+        length_data = file.read(2)
+        if len(length_data) < 2:
+            break
+        length = struct.unpack('>H', length_data)[0] - 2
+
+        if code == 0xE1 or code == 0xFE or (0xC0 <= code <= 0xCF and code not in (0xC4, 0xC8, 0xCC)):
+            data = file.read(length)
+            if code == 0xE1 and data.startswith(b'Exif\x00\x00') and 'exif' not in info:
+                info['exif'] = data
+            elif code == 0xFE:
+                info['comment'] = data
+            elif 0xC0 <= code <= 0xCF and len(data) >= 5:
+                height, width = struct.unpack('>HH', data[1:5])
+        else:
+            file.seek(length, io.SEEK_CUR)
+
+    return ImageMetadata(info, width, height)
+
+
+def read_webp(file):
+    info = {}
+    width = height = None
+
+    riff_header = file.read(12)
+    if len(riff_header) < 12 or riff_header[8:12] != b'WEBP':
+        return ImageMetadata(info)
+
+    while True:
+        header = file.read(8)
+        if len(header) < 8:
+            break
+
+        chunk_type, length = struct.unpack('<4sI', header)
+        padded = length + (length & 1)
+
+        if chunk_type == b'VP8X' and length >= 10:
+            data = file.read(padded)
+            width = int.from_bytes(data[4:7], 'little') + 1
+            height = int.from_bytes(data[7:10], 'little') + 1
+        elif chunk_type == b'EXIF' and length <= max_chunk_size:
+            info['exif'] = file.read(padded)[:length]
+        else:
+            file.seek(padded, io.SEEK_CUR)
+
+    return ImageMetadata(info, width, height)
+
+
+def read_metadata(filename_or_file):
+    """
+    Returns ImageMetadata for a PNG, JPEG or WebP file given as a filename or a binary file object.
+    Pixel data is skipped over, not read. Returns None for other file formats.
+    """
+
+    if isinstance(filename_or_file, (str, bytes)) or hasattr(filename_or_file, '__fspath__'):
+        with open(filename_or_file, 'rb') as file:
+            return read_metadata(file)
+
+    file = filename_or_file
+    start = file.read(12)
+    file.seek(-len(start), io.SEEK_CUR)
+
+    if start.startswith(png_signature):
+        file.seek(len(png_signature), io.SEEK_CUR)
+        return read_png(file)
+
+    if start.startswith(b'\xff\xd8'):
+        return read_jpeg(file)
+
+    if start.startswith(b'RIFF') and start[8:12] == b'WEBP':
+        return read_webp(file)
+
+    return None
@@ -7,6 +7,7 @@ import io
 import math
 import os
 from collections import namedtuple
+from contextlib import contextmanager
 import re
 
 import numpy as np
@@ -16,8 +17,9 @@ from PIL import Image, ImageFont, ImageDraw, ImageColor, PngImagePlugin
 import string
 import json
 import hashlib
+import threading
 
-from components import shared, script_callbacks
+from components import shared, script_callbacks, image_metadata
 from components.sd import sd_samplers
 from components.paths_internal import roboto_ttf_file
 from components.shared import opts
@@ -103,7 +105,24 @@ def split_grid(image, tile_w=512, tile_h=512, overlap=64):
     return grid
 
 
-def combine_grid(grid):
+def blend_overlap(dst, src, mask):
+    """blends uint8 array src over dst in place using weights from mask, rounding exactly like PIL's Image.paste with an L mask"""
+
+    h, w = dst.shape[:2]
+    tmp = dst.astype(np.uint32) * (255 - mask[:h, :w]) + src[:h, :w].astype(np.uint32) * mask[:h, :w] + 128
+    dst[...] = ((tmp >> 8) + tmp) >> 8
+
+
+def paste_array(dst, src):
+    dst[...] = src[:dst.shape[0], :dst.shape[1]]
+
+
+def combine_grid_pil(grid):
+    """
+    Puts tiles of the grid together by pasting every tile into a row image and every row into the output image with PIL,
+    using gradient masks; used by combine_grid when tiles are larger than the image, and as the reference for its result.
+    """
+
     def make_mask_image(r):
         r = r * 255 / grid.overlap
         r = r.astype(np.uint8)
@@ -116,6 +135,9 @@ def combine_grid(grid):
     for y, h, row in grid.tiles:
         combined_row = Image.new("RGB", (grid.image_w, h))
         for x, w, tile in row:
+            if not isinstance(tile, Image.Image):
+                tile = Image.fromarray(tile, 'RGB')
+
             if x == 0:
                 combined_row.paste(tile, (0, 0))
                 continue
@@ -133,6 +155,68 @@ def combine_grid(grid):
     return combined_image
 
 
+def combine_grid(grid):
+    """
+    Puts tiles of the grid (PIL images or uint8 HxWx3 arrays) together into one image, blending overlapping parts of
+    neighbouring tiles with linear ramps. Tiles are written straight into one numpy array, and only the strips where rows
+    overlap are buffered. The result is identical to combine_grid_pil.
+    """
+
+    # when a tile is larger than the image, split_grid places it at a negative offset, which numpy slicing would
+    # count from the other end of the array; PIL handles such tiles by clipping them
+    if any(y < 0 or any(x < 0 for x, _, _ in row) for y, _, row in grid.tiles):
+        return combine_grid_pil(grid)
+
+    overlap = grid.overlap
+    ramp = (np.arange(overlap, dtype=np.float32) * 255 / max(overlap, 1)).astype(np.uint8).astype(np.uint32)
+    mask_w = np.broadcast_to(ramp.reshape((1, overlap, 1)), (grid.tile_h, overlap, 1))
+    mask_h = np.broadcast_to(ramp.reshape((overlap, 1, 1)), (overlap, grid.image_w, 1))
+
+    def tile_array(tile):
+        if isinstance(tile, Image.Image):
+            return np.asarray(tile if tile.mode == "RGB" else tile.convert("RGB"))
+
+        return tile
+
+    def covers_row(row):
+        """True if each tile after the first one only blends with pixels already written by earlier tiles of the row"""
+
+        covered = 0
+        for x, w, _ in row:
+            if x > 0 and x + overlap > covered:
+                return False
+            covered = max(covered, x + w)
+
+        return covered >= grid.image_w
+
+    combined = np.zeros((grid.image_h, grid.image_w, 3), dtype=np.uint8)
+    for y, h, row in grid.tiles:
+        # lines [0, top) of the row are blended with the previous row, so they go into a separate buffer;
+        # lines [top, h) are written directly into the output
+        top = 0 if y == 0 else min(overlap, h)
+        parts = [(np.zeros((top, grid.image_w, 3), dtype=np.uint8), 0), (combined[y + top:y + h], top)]
+
+        if not covers_row(row):
+            parts[1][0][...] = 0
+
+        for x, w, tile in row:
+            tile = tile_array(tile)
+
+            for part, line in parts:
+                lines = tile[line:line + part.shape[0]]
+                if x == 0:
+                    paste_array(part[:, :lines.shape[1]], lines)
+                    continue
+
+                blend_overlap(part[:, x:x + overlap], lines[:, :overlap], mask_w[line:])
+                paste_array(part[:, x + overlap:x + w], lines[:, overlap:w])
+
+        if top > 0:
+            blend_overlap(combined[y:y + top], parts[0][0], mask_h)
+
+    return Image.fromarray(combined, 'RGB')
+
+
 class GridAnnotation:
     def __init__(self, text='', is_active=True):
         self.text = text
@@ -499,9 +583,10 @@ class FilenameGenerator:
         return res
 
 
-def get_next_sequence_number(path, basename):
+def scan_sequence_number(path, basename):
     """
-    Determines and returns the next sequence number to use when saving an image in the specified directory.
+    Determines and returns the next sequence number to use when saving an image in the specified directory by looking
+    at all files in it.
 
     The sequence starts at 0.
     """
@@ -521,6 +606,89 @@ def get_next_sequence_number(path, basename):
     return result + 1
 
 
+class SequenceNumbers:
+    """
+    Sequence numbers for saved images, per directory and basename. A directory is listed once, when a number is first
+    requested for it, and later numbers are handed out from memory. Each number is given out only once, so threads saving
+    into the same directory get different numbers.
+
+    After this process writes into a directory, its modification time is remembered; if it differs next time, the
+    directory was changed by someone else, and it is listed again. While threads of this process are writing into the
+    directory, a different modification time may be theirs, so it isn't listed; a file someone else has added meanwhile is
+    skipped by the existence check in save_image. Numbers found by listing a directory again never go below numbers
+    already handed out, so a number reserved by a thread that hasn't written its file yet isn't given out twice.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.dirs = {}
+        self.writers = {}
+        """path -> number of threads of this process currently writing into it"""
+
+    @staticmethod
+    def mtime(path):
+        try:
+            return os.stat(path).st_mtime_ns
+        except OSError:
+            return None
+
+    def next(self, path, basename):
+        with self.lock:
+            mtime, counters, scanned = self.dirs.get(path, (None, {}, set()))
+            if mtime is None or (not self.writers.get(path) and mtime != self.mtime(path)):
+                scanned = set()
+                self.dirs[path] = (self.mtime(path), counters, scanned)
+
+            if basename not in scanned:
+                counters[basename] = max(scan_sequence_number(path, basename), counters.get(basename, 0))
+                scanned.add(basename)
+
+            number = counters[basename]
+            counters[basename] = number + 1
+
+            return number
+
+    def used(self, path, basename, number):
+        """should be called when a number larger than the one returned by next() was used because files with smaller numbers exist"""
+
+        with self.lock:
+            if path in self.dirs:
+                counters = self.dirs[path][1]
+                counters[basename] = max(counters.get(basename, 0), number + 1)
+
+    @contextmanager
+    def writing(self, path):
+        """files written into path by this process must be written inside this context"""
+
+        with self.lock:
+            self.writers[path] = self.writers.get(path, 0) + 1
+
+        try:
+            yield
+        finally:
+            with self.lock:
+                self.writers[path] -= 1
+                if not self.writers[path]:
+                    del self.writers[path]
+
+                if path in self.dirs:
+                    self.dirs[path] = (self.mtime(path), *self.dirs[path][1:])
+
+
+sequence_numbers = SequenceNumbers()
+
+
+def get_next_sequence_number(path, basename):
+    """
+    Determines and returns the next sequence number to use when saving an image in the specified directory.
+    Every call returns a new number.
+
+    The sequence starts at 0.
+    """
+
+    return sequence_numbers.next(path, basename)
+
+
 def save_image_with_geninfo(image, geninfo, filename, extension=None, existing_pnginfo=None, pnginfo_section_name='parameters'):
     """
     Saves image to filename, including geninfo as text information for generation info.
@@ -640,6 +808,8 @@ def save_image(image, path, basename, seed=None, prompt=None, extension='png', i
                 fn = f"{basecount + i:05}" if basename == '' else f"{basename}-{basecount + i:04}"
                 fullfn = os.path.join(path, f"{fn}{file_decoration}.{extension}")
                 if not os.path.exists(fullfn):
+                    if i > 0:
+                        sequence_numbers.used(path, basename, basecount + i)
                     break
         else:
             fullfn = os.path.join(path, f"{file_decoration}.{extension}")
@@ -679,36 +849,37 @@ def save_image(image, path, basename, seed=None, prompt=None, extension='png', i
         fullfn_without_extension = fullfn_without_extension[:max_name_len - max(4, len(extension))]
         params.filename = fullfn_without_extension + extension
         fullfn = params.filename
-    _atomically_save_image(image, fullfn_without_extension, extension)
+    with sequence_numbers.writing(path):
+        _atomically_save_image(image, fullfn_without_extension, extension)
 
-    image.already_saved_as = fullfn
+        image.already_saved_as = fullfn
 
-    oversize = image.width > opts.target_side_length or image.height > opts.target_side_length
-    if opts.export_for_4chan and (oversize or os.stat(fullfn).st_size > opts.img_downscale_threshold * 1024 * 1024):
-        ratio = image.width / image.height
-        resize_to = None
-        if oversize and ratio > 1:
-            resize_to = round(opts.target_side_length), round(image.height * opts.target_side_length / image.width)
-        elif oversize:
-            resize_to = round(image.width * opts.target_side_length / image.height), round(opts.target_side_length)
+        oversize = image.width > opts.target_side_length or image.height > opts.target_side_length
+        if opts.export_for_4chan and (oversize or os.stat(fullfn).st_size > opts.img_downscale_threshold * 1024 * 1024):
+            ratio = image.width / image.height
+            resize_to = None
+            if oversize and ratio > 1:
+                resize_to = round(opts.target_side_length), round(image.height * opts.target_side_length / image.width)
+            elif oversize:
+                resize_to = round(image.width * opts.target_side_length / image.height), round(opts.target_side_length)
 
-        if resize_to is not None:
+            if resize_to is not None:
+                try:
+                    # Resizing image with LANCZOS could throw an exception if e.g. image mode is I;16
+                    image = image.resize(resize_to, LANCZOS)
+                except Exception:
+                    image = image.resize(resize_to)
             try:
-                # Resizing image with LANCZOS could throw an exception if e.g. image mode is I;16
-                image = image.resize(resize_to, LANCZOS)
-            except Exception:
-                image = image.resize(resize_to)
-        try:
-            _atomically_save_image(image, fullfn_without_extension, ".jpg")
-        except Exception as e:
-            errors.display(e, "saving image as downscaled JPG")
-
-    if opts.save_txt and info is not None:
-        txt_fullfn = f"{fullfn_without_extension}.txt"
-        with open(txt_fullfn, "w", encoding="utf8") as file:
-            file.write(f"{info}\n")
-    else:
-        txt_fullfn = None
+                _atomically_save_image(image, fullfn_without_extension, ".jpg")
+            except Exception as e:
+                errors.display(e, "saving image as downscaled JPG")
+
+        if opts.save_txt and info is not None:
+            txt_fullfn = f"{fullfn_without_extension}.txt"
+            with open(txt_fullfn, "w", encoding="utf8") as file:
+                file.write(f"{info}\n")
+        else:
+            txt_fullfn = None
 
     script_callbacks.image_saved_callback(params)
 
@@ -723,7 +894,25 @@ IGNORED_INFO_KEYS = {
 
 
 def read_info_from_image(image: Image.Image) -> tuple[str | None, dict]:
-    items = (image.info or {}).copy()
+    return read_info_from_items(image.info, image.width, image.height)
+
+
+def read_info_from_file(filename) -> tuple[str | None, dict]:
+    """
+    Same as read_info_from_image, but only reads metadata chunks of the file instead of opening it as an image.
+    Falls back to PIL for formats other than PNG, JPEG and WebP.
+    """
+
+    metadata = image_metadata.read_metadata(filename)
+    if metadata is None:
+        with Image.open(filename) as image:
+            return read_info_from_image(image)
+
+    return read_info_from_items(metadata.info, metadata.width, metadata.height)
+
+
+def read_info_from_items(info, width, height) -> tuple[str | None, dict]:
+    items = (info or {}).copy()
 
     geninfo = items.pop('parameters', None)
 
@@ -756,7 +945,7 @@ def read_info_from_image(image: Image.Image) -> tuple[str | None, dict]:
 
             geninfo = f"""{items["Description"]}
 Negative prompt: {json_info["uc"]}
-Steps: {json_info["steps"]}, Sampler: {sampler}, CFG scale: {json_info["scale"]}, Seed: {json_info["seed"]}, Size: {image.width}x{image.height}, Clip skip: 2, ENSD: 31337"""
+Steps: {json_info["steps"]}, Sampler: {sampler}, CFG scale: {json_info["scale"]}, Seed: {json_info["seed"]}, Size: {width}x{height}, Clip skip: 2, ENSD: 31337"""
         except Exception:
             errors.report("Error parsing NovelAI image generation parameters", exc_info=True)
 
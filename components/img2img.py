@@ -1,4 +1,8 @@
+import collections
+import hashlib
+import json
 import os
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import closing
 from pathlib import Path
 
@@ -9,7 +13,7 @@ import gradio as gr
 from components import images as imgutil
 from components.generation_parameters_copypaste import create_override_settings_dict, parse_generation_parameters
 from components.processing import Processed, StableDiffusionProcessingImg2Img, process_images
-from components.shared import opts, state
+from components.shared import opts
 from components.sd.sd_models import get_closet_checkpoint_match
 import components.shared as shared
 import components.processing as processing
@@ -17,23 +21,149 @@ from ui.ui import plaintext_to_html
 import components.scripts
 
 
+class BatchManifest:
+    """
+    Record of inputs of an img2img batch that have been fully processed, kept as a JSON-lines file in the output directory.
+    An input counts as done if its absolute path, its size, its modification time and the fingerprint of the batch's
+    parameters all match, so that batches with other prompts or settings, or from another input directory, that save into
+    the same directory don't skip it.
+    """
+
+    filename = "img2img-batch-manifest.jsonl"
+
+    def __init__(self, output_dir, parameters):
+        self.path = os.path.join(output_dir, self.filename)
+        self.parameters = parameters
+        self.done = set()
+
+        if os.path.isfile(self.path):
+            with open(self.path, encoding="utf8") as file:
+                for line in file:
+                    try:
+                        entry = json.loads(line)
+                        self.done.add((entry["input"], entry["size"], entry["mtime"], entry["parameters"]))
+                    except Exception:
+                        pass
+
+    def key(self, image_path):
+        stat = os.stat(image_path)
+        return os.path.abspath(image_path), stat.st_size, stat.st_mtime, self.parameters
+
+    def is_done(self, image_path):
+        try:
+            return self.key(image_path) in self.done
+        except OSError:
+            return False
+
+    def mark_done(self, image_path):
+        path, size, mtime, parameters = self.key(image_path)
+        self.done.add((path, size, mtime, parameters))
+
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path, "a", encoding="utf8") as file:
+            file.write(json.dumps({"input": path, "size": size, "mtime": mtime, "parameters": parameters}) + "\n")
+
+
+def batch_parameters_fingerprint(p, args, **batch_options):
+    """hash of prompts, generation parameters, settings overrides and batch options of an img2img batch, for BatchManifest"""
+
+    parameters = {
+        "prompt": p.prompt,
+        "negative_prompt": p.negative_prompt,
+        "styles": p.styles,
+        "seed": p.seed,
+        "subseed": p.subseed,
+        "subseed_strength": p.subseed_strength,
+        "cfg_scale": p.cfg_scale,
+        "steps": p.steps,
+        "sampler_name": p.sampler_name,
+        "denoising_strength": p.denoising_strength,
+        "width": p.width,
+        "height": p.height,
+        "resize_mode": p.resize_mode,
+        "n_iter": p.n_iter,
+        "batch_size": p.batch_size,
+        "sd_model_checkpoint": shared.opts.sd_model_checkpoint,
+        "override_settings": p.override_settings,
+        "script_args": [x for x in args if isinstance(x, (str, int, float, bool, type(None)))],
+        **batch_options,
+    }
+
+    return hashlib.sha256(json.dumps(parameters, sort_keys=True, default=str).encode("utf8")).hexdigest()[:16]
+
+
+def load_batch_item(image, masks, png_info_dir, use_png_info, png_info_props):
+    """Opens the image, its mask and reads parameters from PNG info for one batch input; runs in a prefetch thread."""
+
+    try:
+        img = Image.open(image)
+        img.load()
+        # Use the EXIF orientation of photos taken by smartphones.
+        img = ImageOps.exif_transpose(img)
+    except UnidentifiedImageError as e:
+        print(e)
+        return None
+
+    mask_image = None
+    if masks is not None:
+        mask_image_path = masks if isinstance(masks, str) else masks.get(Path(image).stem)
+        if mask_image_path is None:
+            print(f"Warning: mask is not found for {image}. Skipping it.")
+            return None
+
+        mask_image = Image.open(mask_image_path)
+        mask_image.load()
+
+    parsed_parameters = None
+    if use_png_info:
+        try:
+            if png_info_dir:
+                geninfo, _ = imgutil.read_info_from_file(os.path.join(png_info_dir, os.path.basename(image)))
+            else:
+                geninfo, _ = imgutil.read_info_from_image(img)
+            parsed_parameters = parse_generation_parameters(geninfo)
+            parsed_parameters = {k: v for k, v in parsed_parameters.items() if k in (png_info_props or {})}
+        except Exception:
+            parsed_parameters = {}
+
+    return image, img, mask_image, parsed_parameters
+
+
 def process_batch(p, input_dir, output_dir, inpaint_mask_dir, args, to_scale=False, scale_by=1.0, use_png_info=False, png_info_props=None, png_info_dir=None):
     output_dir = output_dir.strip()
+    parameters = batch_parameters_fingerprint(p, args, input_dir=os.path.abspath(input_dir), inpaint_mask_dir=inpaint_mask_dir, to_scale=to_scale, scale_by=scale_by, use_png_info=use_png_info, png_info_props=png_info_props, png_info_dir=png_info_dir)
     processing.fix_seed(p)
 
     images = list(shared.walk_files(input_dir, allowed_extensions=(".png", ".jpg", ".jpeg", ".webp", ".tif", ".tiff")))
 
-    is_inpaint_batch = False
+    masks = None
     if inpaint_mask_dir:
         inpaint_masks = shared.listfiles(inpaint_mask_dir)
-        is_inpaint_batch = bool(inpaint_masks)
 
-        if is_inpaint_batch:
+        if inpaint_masks:
             print(f"\nInpaint batch is enabled. {len(inpaint_masks)} masks found.")
 
+            # masks are matched to images by filename without extension; with only one mask, it's used for all images
+            if len(inpaint_masks) == 1:
+                masks = inpaint_masks[0]
+            else:
+                masks = {}
+                for mask in inpaint_masks:
+                    masks.setdefault(Path(mask).stem, mask)
+
+    manifest = None
+    if shared.opts.img2img_batch_resume:
+        manifest = BatchManifest(output_dir or p.outpath_samples, parameters)
+        done = [image for image in images if manifest.is_done(image)]
+        if done:
+            print(f"Skipping {len(done)} images already processed according to {manifest.path}.")
+            done = set(done)
+            images = [image for image in images if image not in done]
+
     print(f"Will process {len(images)} images, creating {p.n_iter * p.batch_size} new images for each.")
 
-    state.job_count = len(images) * p.n_iter
+    shared.state.job_count = len(images) * p.n_iter
+    shared.state.batch_files_total = len(images)
 
     # extract "default" params to use in case getting png info fails
     prompt = p.prompt
@@ -46,102 +176,98 @@ def process_batch(p, input_dir, output_dir, inpaint_mask_dir, args, to_scale=Fal
     sd_model_checkpoint_override = get_closet_checkpoint_match(override_settings.get("sd_model_checkpoint", None))
     batch_results = None
     discard_further_results = False
-    for i, image in enumerate(images):
-        state.job = f"{i+1} out of {len(images)}"
-        if state.skipped:
-            state.skipped = False
-
-        if state.interrupted:
-            break
-
-        try:
-            img = Image.open(image)
-        except UnidentifiedImageError as e:
-            print(e)
-            continue
-        # Use the EXIF orientation of photos taken by smartphones.
-        img = ImageOps.exif_transpose(img)
-
-        if to_scale:
-            p.width = int(img.width * scale_by)
-            p.height = int(img.height * scale_by)
-
-        p.init_images = [img] * p.batch_size
-
-        image_path = Path(image)
-        if is_inpaint_batch:
-            # try to find corresponding mask for an image using simple filename matching
-            if len(inpaint_masks) == 1:
-                mask_image_path = inpaint_masks[0]
-            else:
-                # try to find corresponding mask for an image using simple filename matching
-                mask_image_dir = Path(inpaint_mask_dir)
-                masks_found = list(mask_image_dir.glob(f"{image_path.stem}.*"))
-
-                if len(masks_found) == 0:
-                    print(f"Warning: mask is not found for {image_path} in {mask_image_dir}. Skipping it.")
-                    continue
-
-                # it should contain only 1 matching mask
-                # otherwise user has many masks with the same name but different extensions
-                mask_image_path = masks_found[0]
-
-            mask_image = Image.open(mask_image_path)
-            p.image_mask = mask_image
-
-        if use_png_info:
-            try:
-                info_img = img
-                if png_info_dir:
-                    info_img_path = os.path.join(png_info_dir, os.path.basename(image))
-                    info_img = Image.open(info_img_path)
-                geninfo, _ = imgutil.read_info_from_image(info_img)
-                parsed_parameters = parse_generation_parameters(geninfo)
-                parsed_parameters = {k: v for k, v in parsed_parameters.items() if k in (png_info_props or {})}
-            except Exception:
-                parsed_parameters = {}
-
-            p.prompt = prompt + (" " + parsed_parameters["Prompt"] if "Prompt" in parsed_parameters else "")
-            p.negative_prompt = negative_prompt + (" " + parsed_parameters["Negative prompt"] if "Negative prompt" in parsed_parameters else "")
-            p.seed = int(parsed_parameters.get("Seed", seed))
-            p.cfg_scale = float(parsed_parameters.get("CFG scale", cfg_scale))
-            p.sampler_name = parsed_parameters.get("Sampler", sampler_name)
-            p.steps = int(parsed_parameters.get("Steps", steps))
-
-            model_info = get_closet_checkpoint_match(parsed_parameters.get("Model hash", None))
-            if model_info is not None:
-                p.override_settings['sd_model_checkpoint'] = model_info.name
-            elif sd_model_checkpoint_override:
-                p.override_settings['sd_model_checkpoint'] = sd_model_checkpoint_override
-            else:
-                p.override_settings.pop("sd_model_checkpoint", None)
-
-        if output_dir:
-            p.outpath_samples = output_dir
-            p.override_settings['save_to_dirs'] = False
-            p.override_settings['save_images_replace_action'] = "Add number suffix"
-            if p.n_iter > 1 or p.batch_size > 1:
-                p.override_settings['samples_filename_pattern'] = f'{image_path.stem}-[generation_number]'
-            else:
-                p.override_settings['samples_filename_pattern'] = f'{image_path.stem}'
-
-        proc = modules.scripts.scripts_img2img.run(p, *args)
-
-        if proc is None:
-            p.override_settings.pop('save_images_replace_action', None)
-            proc = process_images(p)
-
-        if not discard_further_results and proc:
-            if batch_results:
-                batch_results.images.extend(proc.images)
-                batch_results.infotexts.extend(proc.infotexts)
-            else:
-                batch_results = proc
 
-            if 0 <= shared.opts.img2img_batch_show_results_limit < len(batch_results.images):
-                discard_further_results = True
-                batch_results.images = batch_results.images[:int(shared.opts.img2img_batch_show_results_limit)]
-                batch_results.infotexts = batch_results.infotexts[:int(shared.opts.img2img_batch_show_results_limit)]
+    prefetch_count = max(1, int(shared.opts.img2img_batch_prefetch))
+    with ThreadPoolExecutor(max_workers=prefetch_count, thread_name_prefix="img2img-batch") as executor:
+        pending = collections.deque()
+        queue = iter(images)
+
+        def fill():
+            for image in queue:
+                pending.append(executor.submit(load_batch_item, image, masks, png_info_dir, use_png_info, png_info_props))
+                if len(pending) >= prefetch_count:
+                    break
+
+        fill()
+        i = 0
+        while pending:
+            loaded = pending.popleft().result()
+            fill()
+
+            i += 1
+            shared.state.job = f"{i} out of {len(images)}"
+            if shared.state.skipped:
+                shared.state.skipped = False
+
+            if shared.state.interrupted:
+                break
+
+            if loaded is None:
+                shared.state.batch_files_done += 1
+                continue
+
+            image, img, mask_image, parsed_parameters = loaded
+            shared.state.batch_file = image
+
+            if to_scale:
+                p.width = int(img.width * scale_by)
+                p.height = int(img.height * scale_by)
+
+            p.init_images = [img] * p.batch_size
+
+            image_path = Path(image)
+            if mask_image is not None:
+                p.image_mask = mask_image
+
+            if parsed_parameters is not None:
+                p.prompt = prompt + (" " + parsed_parameters["Prompt"] if "Prompt" in parsed_parameters else "")
+                p.negative_prompt = negative_prompt + (" " + parsed_parameters["Negative prompt"] if "Negative prompt" in parsed_parameters else "")
+                p.seed = int(parsed_parameters.get("Seed", seed))
+                p.cfg_scale = float(parsed_parameters.get("CFG scale", cfg_scale))
+                p.sampler_name = parsed_parameters.get("Sampler", sampler_name)
+                p.steps = int(parsed_parameters.get("Steps", steps))
+
+                model_info = get_closet_checkpoint_match(parsed_parameters.get("Model hash", None))
+                if model_info is not None:
+                    p.override_settings['sd_model_checkpoint'] = model_info.name
+                elif sd_model_checkpoint_override:
+                    p.override_settings['sd_model_checkpoint'] = sd_model_checkpoint_override
+                else:
+                    p.override_settings.pop("sd_model_checkpoint", None)
+
+            if output_dir:
+                p.outpath_samples = output_dir
+                p.override_settings['save_to_dirs'] = False
+                p.override_settings['save_images_replace_action'] = "Add number suffix"
+                if p.n_iter > 1 or p.batch_size > 1:
+                    p.override_settings['samples_filename_pattern'] = f'{image_path.stem}-[generation_number]'
+                else:
+                    p.override_settings['samples_filename_pattern'] = f'{image_path.stem}'
+
+            proc = components.scripts.scripts_img2img.run(p, *args)
+
+            if proc is None:
+                p.override_settings.pop('save_images_replace_action', None)
+                proc = process_images(p)
+
+            shared.state.batch_files_done += 1
+            if manifest is not None and not shared.state.interrupted and not shared.state.skipped:
+                manifest.mark_done(image)
+
+            if not discard_further_results and proc:
+                if batch_results:
+                    batch_results.images.extend(proc.images)
+                    batch_results.infotexts.extend(proc.infotexts)
+                else:
+                    batch_results = proc
+
+                if 0 <= shared.opts.img2img_batch_show_results_limit < len(batch_results.images):
+                    discard_further_results = True
+                    batch_results.images = batch_results.images[:int(shared.opts.img2img_batch_show_results_limit)]
+                    batch_results.infotexts = batch_results.infotexts[:int(shared.opts.img2img_batch_show_results_limit)]
+
+        for future in pending:
+            future.cancel()
 
     return batch_results
 
@@ -1,3 +1,4 @@
+import importlib.util
 import sys
 
 # this will break any attempt to import xformers which will prevent stability diffusion repo from trying to use it
@@ -14,3 +15,52 @@ except ImportError:
         sys.modules["torchvision.transforms.functional_tensor"] = functional
     except ImportError:
         pass  # shrug...
+
+
+lazy_modules = [
+    "components.interrogate",
+    "components.deepbooru",
+    "components.deepbooru_model",
+    "components.xlmr",
+    "components.xlmr_m18",
+    "components.textual_inversion.dataset",
+    "components.textual_inversion.autocrop",
+]
+"""feature modules that are only imported when something from them is used for the first time"""
+
+
+def lazy_import(name):
+    """
+    Puts a module into sys.modules without running it; the module is executed when one of its attributes is accessed.
+    Returns the module. If the module is already imported or can't be found, it's imported normally.
+    """
+
+    if name in sys.modules:
+        return sys.modules[name]
+
+    spec = importlib.util.find_spec(name)
+    if spec is None or spec.loader is None:
+        return importlib.import_module(name)
+
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+
+    parent, _, child = name.rpartition('.')
+    if parent:
+        setattr(sys.modules[parent], child, module)
+
+    return module
+
+
+def is_loaded(module):
+    """returns False for a module from lazy_import() that hasn't been executed yet; does not cause it to be executed"""
+
+    return type(module).__name__ != "_LazyModule"
+
+
+def setup_lazy_imports():
+    for name in lazy_modules:
+        lazy_import(name)
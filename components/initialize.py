@@ -1,6 +1,7 @@
 import importlib
 import logging
 import sys
+import time
 import warnings
 from threading import Thread
 
@@ -18,11 +19,14 @@ def imports():
     warnings.filterwarnings(action="ignore", category=DeprecationWarning, module="pytorch_lightning")
     warnings.filterwarnings(action="ignore", category=UserWarning, module="torchvision")
 
-    import gradio  # noqa: F401
-    startup_timer.record("import gradio")
+    from components.shared_cmd_options import cmd_opts
+    if not cmd_opts.nowebui:
+        import gradio  # noqa: F401
+        startup_timer.record("import gradio")
 
     from utils import  timer, errors  # noqa: F401
     from components import paths, import_hook
+    import_hook.setup_lazy_imports()
     startup_timer.record("setup paths")
 
     import ldm.modules.encoders.modules  # noqa: F401
@@ -35,8 +39,11 @@ def imports():
     shared_init.initialize()
     startup_timer.record("initialize shared")
 
-    from components import processing, gradio_extensons # noqa: F401
-    from ui import ui
+    from components import processing  # noqa: F401
+    if not cmd_opts.nowebui:
+        # API-only mode never builds UI, so neither UI modules nor gradio patches are needed
+        from components import gradio_extensons  # noqa: F401
+        from ui import ui  # noqa: F401
     startup_timer.record("other imports")
 
 
@@ -56,83 +63,113 @@ def initialize():
     initialize_util.configure_sigint_handler()
     initialize_util.configure_opts_onchange()
 
+    from components.shared_cmd_options import cmd_opts
     from components import modelloader
-    modelloader.cleanup_models()
-
     from components.sd import sd_models
-    sd_models.setup_model()
-    startup_timer.record("setup SD model")
 
-    from components.shared_cmd_options import cmd_opts
+    graph = create_task_graph()
+    graph.add("cleanup models", modelloader.cleanup_models)
+    graph.add("setup SD model", sd_models.setup_model, deps=["cleanup models"])
 
-    from components import codeformer_model
-    warnings.filterwarnings(action="ignore", category=UserWarning, module="torchvision.transforms.functional_tensor")
-    codeformer_model.setup_model(cmd_opts.codeformer_models_path)
-    startup_timer.record("setup codeformer")
+    def setup_codeformer():
+        from components import codeformer_model
+        warnings.filterwarnings(action="ignore", category=UserWarning, module="torchvision.transforms.functional_tensor")
+        codeformer_model.setup_model(cmd_opts.codeformer_models_path)
 
-    from components import gfpgan_model
-    gfpgan_model.setup_model(cmd_opts.gfpgan_models_path)
-    startup_timer.record("setup gfpgan")
+    def setup_gfpgan():
+        from components import gfpgan_model
+        gfpgan_model.setup_model(cmd_opts.gfpgan_models_path)
 
-    initialize_rest(reload_script_modules=False)
+    graph.add("setup codeformer", setup_codeformer, deps=["cleanup models"])
+    # both add to shared.face_restorers, which must keep the same order on every start
+    graph.add("setup gfpgan", setup_gfpgan, deps=["setup codeformer"])
+
+    add_rest_tasks(graph, reload_script_modules=False, deps=["setup SD model"])
+    graph.run()
+
+
+def create_task_graph():
+    """
+    Returns a graph for startup steps. Independent steps run concurrently on a thread pool; --startup-workers sets the size
+    of the pool, and --startup-workers 1 runs steps one after another.
+    """
+
+    from components.shared_cmd_options import cmd_opts
+    from utils.task_graph import TaskGraph
+
+    return TaskGraph("initialize", timer=startup_timer, workers=cmd_opts.startup_workers)
 
 
 def initialize_rest(*, reload_script_modules=False):
     """
     Called both from initialize() and when reloading the webui.
     """
+
+    graph = create_task_graph()
+    add_rest_tasks(graph, reload_script_modules=reload_script_modules)
+    graph.run()
+
+
+def add_rest_tasks(graph, *, reload_script_modules=False, deps=()):
+    """
+    Adds to graph steps that are done both at startup and when reloading the webui. deps are tasks that must finish before
+    model list and scripts are loaded.
+    """
     from components.shared_cmd_options import cmd_opts
 
     from components.sd import sd_samplers
-    sd_samplers.set_samplers()
-    startup_timer.record("set samplers")
+    graph.add("set samplers", sd_samplers.set_samplers)
 
     from components import extensions
-    extensions.list_extensions()
-    startup_timer.record("list extensions")
+    graph.add("list extensions", extensions.list_extensions)
 
     from components import initialize_util
-    initialize_util.restore_config_state_file()
-    startup_timer.record("restore config state file")
+    graph.add("restore config state file", initialize_util.restore_config_state_file, deps=["list extensions"])
 
     from components import shared, upscaler, scripts
     if cmd_opts.ui_debug_mode:
-        shared.sd_upscalers = upscaler.UpscalerLanczos().scalers
-        scripts.load_scripts()
+        def load_ui_debug_mode():
+            shared.sd_upscalers = upscaler.UpscalerLanczos().scalers
+            scripts.load_scripts()
+
+        graph.add("load scripts", load_ui_debug_mode, deps=["set samplers", "restore config state file", *deps])
         return
 
     from components.sd import sd_models
-    sd_models.list_models()
+    graph.add("list models", sd_models.list_models, deps=list(deps))
 
-    with startup_timer.subcategory("load scripts"):
+    def load_scripts():
         scripts.load_scripts()
 
-    if reload_script_modules:
-        for module in [module for name, module in sys.modules.items() if name.startswith("modules.ui")]:
-            importlib.reload(module)
-        startup_timer.record("reload script modules")
+        if reload_script_modules:
+            start = time.time()
+            for module in [module for name, module in sys.modules.items() if name.startswith("modules.ui")]:
+                importlib.reload(module)
+            startup_timer.add_time_to_record(f"{startup_timer.base_category}reload script modules", time.time() - start)
+
+    # scripts are loaded after everything they might look at during import: samplers, models and extension settings
+    graph.add("load scripts", load_scripts, deps=["set samplers", "restore config state file", "list models"])
 
     from components import modelloader
-    modelloader.load_upscalers()
-    startup_timer.record("load upscalers")
+    graph.add("load upscalers", modelloader.load_upscalers, deps=["load scripts"])
 
     from components.sd import sd_vae
-    sd_vae.refresh_vae_list()
-    startup_timer.record("refresh VAE")
+    graph.add("refresh VAE", sd_vae.refresh_vae_list, deps=["list models"])
 
     from components.textual_inversion import textual_inversion
-    textual_inversion.list_textual_inversion_templates()
-    startup_timer.record("refresh textual inversion templates")
+    graph.add("refresh textual inversion templates", textual_inversion.list_textual_inversion_templates)
 
     from components import script_callbacks
     from components.sd import sd_hijack_optimizations, sd_hijack
-    script_callbacks.on_list_optimizers(sd_hijack_optimizations.list_optimizers)
-    sd_hijack.list_optimizers()
-    startup_timer.record("scripts list_optimizers")
+
+    def list_optimizers():
+        script_callbacks.on_list_optimizers(sd_hijack_optimizations.list_optimizers)
+        sd_hijack.list_optimizers()
+
+    graph.add("scripts list_optimizers", list_optimizers, deps=["load scripts"])
 
     from components.sd import sd_unet
-    sd_unet.list_unets()
-    startup_timer.record("scripts list_unets")
+    graph.add("scripts list_unets", sd_unet.list_unets, deps=["load scripts"])
 
     def load_model():
         """
@@ -149,18 +186,24 @@ def initialize_rest(*, reload_script_modules=False):
 
         from utils import devices
         devices.first_time_calculation()
-    if not shared.cmd_opts.skip_load_model_at_start:
-        Thread(target=load_model).start()
+
+    def start_loading_model():
+        if not shared.cmd_opts.skip_load_model_at_start:
+            Thread(target=load_model).start()
+
+    graph.add("start loading model", start_loading_model, deps=["scripts list_optimizers", "scripts list_unets", "refresh VAE", "load upscalers"])
 
     from components import shared_items
-    shared_items.reload_hypernetworks()
-    startup_timer.record("reload hypernetworks")
+    graph.add("reload hypernetworks", shared_items.reload_hypernetworks)
+
+    def initialize_extra_networks():
+        if not cmd_opts.nowebui:
+            from ui import ui_extra_networks
+            ui_extra_networks.initialize()
+            ui_extra_networks.register_default_pages()
 
-    from ui import ui_extra_networks
-    ui_extra_networks.initialize()
-    ui_extra_networks.register_default_pages()
+        from components import extra_networks
+        extra_networks.initialize()
+        extra_networks.register_default_extra_networks()
 
-    from components import extra_networks
-    extra_networks.initialize()
-    extra_networks.register_default_extra_networks()
-    startup_timer.record("initialize extra networks")
+    graph.add("initialize extra networks", initialize_extra_networks, deps=["load scripts", "reload hypernetworks"])
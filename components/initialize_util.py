@@ -3,6 +3,7 @@ import os
 import signal
 import sys
 import re
+import time
 
 from utils.timer import startup_timer
 
@@ -78,10 +79,11 @@ def restore_config_state_file():
 
     if os.path.isfile(config_state_file):
         print(f"*** About to restore extension state from file: {config_state_file}")
+        start = time.time()
         with open(config_state_file, "r", encoding="utf-8") as f:
             config_state = json.load(f)
             config_states.restore_extension_config(config_state)
-        startup_timer.record("restore extension config")
+        startup_timer.add_time_to_record(f"{startup_timer.base_category}restore extension config", time.time() - start)
     elif config_state_file:
         print(f"!!! Config state backup not found: {config_state_file}")
 
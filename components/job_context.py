@@ -0,0 +1,108 @@
+"""
+Per-job values for generation jobs that run at the same time on different threads (see QueueLock.job in utils/call_queue.py).
+
+While a thread runs such a job, shared.state and attributes declared with job_local (comments, extra_generation_params and
+fixes of model_hijack) refer to values that belong to the job; on other threads they are ordinary global values.
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+
+local = threading.local()
+lock = threading.Lock()
+contexts = {}
+"""thread id -> JobContext of the job running on that thread"""
+
+
+class JobContext:
+    def __init__(self, state, id_task=None, slot=None):
+        self.state = state
+        self.id_task = id_task
+        self.slot = slot
+        """index of the concurrency slot the job holds, or None if the job currently runs exclusively"""
+        self.started = time.time()
+        self.values = {}
+
+
+def current():
+    """returns JobContext of the job running on this thread, or None"""
+
+    return getattr(local, "context", None)
+
+
+@contextmanager
+def job(state, id_task=None, slot=None):
+    context = JobContext(state, id_task=id_task, slot=slot)
+    ident = threading.get_ident()
+
+    local.context = context
+    with lock:
+        contexts[ident] = context
+
+    try:
+        yield context
+    finally:
+        local.context = None
+        with lock:
+            contexts.pop(ident, None)
+
+
+def running():
+    with lock:
+        return list(contexts.values())
+
+
+def state_for(id_task):
+    """returns State of the running job with id id_task, or None"""
+
+    for context in running():
+        if context.id_task == id_task:
+            return context.state
+
+    return None
+
+
+def reported_state(state):
+    """
+    For progress reporting that isn't tied to a task id: returns state if a job is using it, or otherwise the state of the
+    oldest concurrently running job, if there is one.
+    """
+
+    if state.job_count != 0:
+        return state
+
+    contexts_list = running()
+    if not contexts_list:
+        return state
+
+    return min(contexts_list, key=lambda x: x.started).state
+
+
+def job_local(name, default=None):
+    """
+    Returns a property that keeps a separate value for every running job. Outside of jobs, the value is stored in the
+    {name}_val attribute of the object. default is a function that makes the initial value of the property for a job.
+    """
+
+    attr = f"{name}_val"
+
+    def get_value(self):
+        context = current()
+        if context is None:
+            return getattr(self, attr, None)
+
+        key = (id(self), name)
+        if key not in context.values:
+            context.values[key] = default() if default is not None else None
+
+        return context.values[key]
+
+    def set_value(self, value):
+        context = current()
+        if context is None:
+            setattr(self, attr, value)
+        else:
+            context.values[(id(self), name)] = value
+
+    return property(get_value, set_value)
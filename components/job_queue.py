@@ -0,0 +1,335 @@
+import itertools
+import threading
+import time
+import uuid
+
+from components import shared, job_context
+from utils import errors
+
+
+class Job:
+    def __init__(self, id_job, func=None, priority=0, client=None, kind=None, affinity=None, order=0):
+        self.id = id_job
+        self.func = func
+        self.priority = priority
+        self.client = client
+        self.kind = kind
+        self.affinity = affinity
+        """(checkpoint, vae, refiner) the job needs; None for an element means the one from settings"""
+        self.order = order
+
+        self.status = "queued"
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.result = None
+        self.error = None
+
+    @property
+    def active(self):
+        return self.status in ("queued", "running")
+
+    def dict(self):
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "priority": self.priority,
+            "client": self.client,
+            "created": self.created,
+            "started": self.started,
+            "finished": self.finished,
+            "error": self.error,
+        }
+
+
+class QueueFull(Exception):
+    pass
+
+
+class JobQueue:
+    """
+    Registry of generation jobs. Jobs come from two places:
+     - UI tasks, which run on gradio's threads; the queue only keeps track of their status and results;
+     - jobs submitted through the API with a function to run; those are run highest priority first on worker threads
+       owned by the queue: one thread, or as many as there may be concurrent jobs (see QueueLock in utils/call_queue.py).
+
+    To reduce checkpoint swaps, a queued job that needs the checkpoint and VAE that are currently loaded may be run before
+    older jobs of the same priority; once any queued job has been waiting for longer than opts.job_queue_affinity_max_wait
+    seconds, jobs run in plain priority/age order. Jobs without affinity, like extras, run with any checkpoint.
+
+    Finished jobs are kept according to settings: results are dropped after opts.job_queue_keep_results newer jobs finish
+    or opts.job_queue_result_ttl minutes pass; the job record itself stays a while longer so that its status can be queried.
+    Results of UI tasks, which gradio has already returned to the browser, are only kept for the last keep_ui_results.
+    """
+
+    keep_records = 256
+    keep_ui_results = 2
+    """same as the number of results the progress code kept before the queue existed"""
+
+    def __init__(self):
+        self.lock = threading.Condition()
+        self.jobs = {}
+        self.counter = itertools.count()
+        self.current = None
+        self.workers = []
+        self.local = threading.local()
+        self.stats = {"jobs": 0, "swaps": 0, "swaps_avoided": 0}
+
+    def get(self, id_job):
+        with self.lock:
+            return self.jobs.get(id_job)
+
+    def list(self):
+        with self.lock:
+            self.prune()
+            return list(self.jobs.values())
+
+    def queued(self):
+        """ids of queued jobs, in the order they will run"""
+
+        with self.lock:
+            return [job.id for job in self.queued_jobs()]
+
+    def queued_jobs(self, runnable=False):
+        """queued jobs in the order they will run; with runnable=True, only jobs the queue runs itself, not tracked UI tasks"""
+
+        queued = [job for job in self.jobs.values() if job.status == "queued" and (not runnable or job.func is not None)]
+        return sorted(queued, key=lambda job: (-job.priority, job.order))
+
+    def track(self, id_job, kind="ui"):
+        """registers a job that is run by someone else, e.g. by gradio"""
+
+        with self.lock:
+            self.jobs[id_job] = Job(id_job, kind=kind)
+            self.prune()
+
+    def thread_job(self):
+        """returns id of the job the queue is running on this thread, or None"""
+
+        return getattr(self.local, "id_job", None)
+
+    def submit(self, func, priority=0, client=None, kind=None, affinity=None):
+        """queues func to be run on a worker thread; returns the Job"""
+
+        from utils.call_queue import concurrent_jobs
+
+        with self.lock:
+            limit = shared.opts.job_queue_max_per_client
+            if client is not None and limit > 0 and sum(1 for job in self.jobs.values() if job.client == client and job.active) >= limit:
+                raise QueueFull(f"client {client} already has {limit} unfinished jobs")
+
+            job = Job(f"job({uuid.uuid4().hex})", func, priority=priority, client=client, kind=kind, affinity=affinity, order=next(self.counter))
+            self.jobs[job.id] = job
+
+            if len(self.workers) < concurrent_jobs():
+                worker = threading.Thread(target=self.work, daemon=True, name=f"job-queue-{len(self.workers)}")
+                worker.start()
+                self.workers.append(worker)
+
+            self.lock.notify()
+            self.prune()
+
+        return job
+
+    def cancel(self, id_job):
+        """
+        cancels a queued job, or interrupts it if it's running; returns False if the job has already finished, or if it's
+        a queued UI task, which gradio would run anyway
+        """
+
+        with self.lock:
+            job = self.jobs.get(id_job)
+            if job is None or not job.active:
+                return False
+
+            if job.status == "queued":
+                if job.func is None:
+                    return False
+
+                job.status = "cancelled"
+                job.finished = time.time()
+                return True
+
+        state = job_context.state_for(id_job)
+        if state is not None:
+            state.interrupt()
+        elif self.current == id_job:
+            shared.state.interrupt()
+
+        return True
+
+    def start(self, id_job):
+        """marks a job as running; returns False if it isn't queued anymore, e.g. because it has been cancelled"""
+
+        with self.lock:
+            job = self.jobs.get(id_job)
+            if job is None:
+                job = self.jobs[id_job] = Job(id_job, kind="ui")
+            elif job.status != "queued":
+                return False
+
+            self.set_running(job)
+            return True
+
+    def set_running(self, job):
+        """must be called with self.lock held"""
+
+        job.status = "running"
+        job.started = time.time()
+        self.current = job.id
+
+    def finish(self, id_job, result=None, error=None):
+        with self.lock:
+            job = self.jobs.get(id_job)
+            if job is not None:
+                job.status = "failed" if error is not None else "done"
+                job.finished = time.time()
+                job.error = error
+                if result is not None:
+                    job.result = result
+
+            if self.current == id_job:
+                self.current = None
+
+            self.prune()
+
+    def record_result(self, id_job, result):
+        with self.lock:
+            job = self.jobs.get(id_job)
+            if job is not None:
+                job.result = result
+
+    @staticmethod
+    def checkpoint_title(name):
+        """title of the checkpoint name refers to, so that a short name, an alias and the title of one checkpoint compare equal"""
+
+        from components.sd import sd_models
+
+        checkpoint_info = sd_models.get_closet_checkpoint_match(name)
+        return checkpoint_info.title if checkpoint_info is not None else name
+
+    @staticmethod
+    def resolve_affinity(affinity):
+        checkpoint, vae, refiner = affinity or (None, None, None)
+        return JobQueue.checkpoint_title(checkpoint or shared.opts.sd_model_checkpoint), vae or shared.opts.sd_vae, JobQueue.checkpoint_title(refiner)
+
+    @staticmethod
+    def loaded_affinity():
+        """(title of the loaded checkpoint, filename of the loaded VAE), or None if no checkpoint is loaded"""
+
+        from components.sd import sd_models, sd_vae
+
+        sd_model = sd_models.model_data.sd_model
+        if sd_model is None:
+            return None
+
+        return sd_model.sd_checkpoint_info.title, sd_vae.get_loaded_vae_name()
+
+    @staticmethod
+    def matches_loaded(affinity, loaded):
+        """whether a job with affinity can run without loading another checkpoint or VAE; refiners are loaded for a job only, so they don't count"""
+
+        if affinity is None or loaded is None:
+            return affinity is None
+
+        checkpoint, vae, _ = JobQueue.resolve_affinity(affinity)
+        loaded_checkpoint, loaded_vae = loaded
+        if checkpoint != loaded_checkpoint:
+            return False
+
+        if vae == "Automatic":
+            return True
+
+        return loaded_vae == (None if vae == "None" else vae)
+
+    def pick(self, queued):
+        """chooses the next job to run out of queued jobs, sorted by priority and age"""
+
+        head = queued[0]
+        max_wait = shared.opts.job_queue_affinity_max_wait
+        if max_wait <= 0:
+            return head
+
+        now = time.time()
+        if any(now - job.created >= max_wait for job in queued):
+            return head
+
+        loaded = self.loaded_affinity()
+        if loaded is None or self.matches_loaded(head.affinity, loaded):
+            return head
+
+        for job in queued:
+            if job.priority < head.priority:
+                break
+
+            # jobs without affinity don't need the loaded checkpoint, so running them first wouldn't avoid a swap
+            if job.affinity is not None and self.matches_loaded(job.affinity, loaded):
+                self.stats["swaps_avoided"] += 1
+                return job
+
+        return head
+
+    def work(self):
+        while True:
+            with self.lock:
+                queued = self.queued_jobs(runnable=True)
+                while not queued:
+                    self.lock.wait()
+                    queued = self.queued_jobs(runnable=True)
+
+                job = self.pick(queued)
+
+                loaded = self.loaded_affinity()
+                if loaded is not None and not self.matches_loaded(job.affinity, loaded):
+                    self.stats["swaps"] += 1
+                self.stats["jobs"] += 1
+
+                # marked as running before the lock is released, so that no other worker picks it and cancel() interrupts it
+                self.set_running(job)
+
+            self.local.id_job = job.id
+            try:
+                result = job.func()
+            except Exception as e:
+                errors.report(f"Error running job {job.id}", exc_info=True)
+                self.finish(job.id, error=f"{type(e).__name__}: {e}")
+            else:
+                self.finish(job.id, result=result)
+            finally:
+                self.local.id_job = None
+
+            job.func = None
+
+    def metrics(self):
+        from components.sd import sd_models
+
+        with self.lock:
+            res = dict(self.stats)
+
+        swaps = sd_models.checkpoint_swaps
+        res["checkpoint_loads"] = swaps["count"]
+        res["checkpoint_load_time"] = swaps["time"]
+        res["average_checkpoint_load_time"] = swaps["time"] / swaps["count"] if swaps["count"] else 0.0
+        res["time_saved"] = res["swaps_avoided"] * res["average_checkpoint_load_time"]
+
+        return res
+
+    def prune(self):
+        finished = sorted((job for job in self.jobs.values() if not job.active), key=lambda job: job.finished or job.created, reverse=True)
+        ttl = shared.opts.job_queue_result_ttl * 60
+        now = time.time()
+
+        ui_results = 0
+        for i, job in enumerate(finished):
+            if job.kind == "ui" and job.result is not None:
+                ui_results += 1
+
+            if i >= shared.opts.job_queue_keep_results or ui_results > self.keep_ui_results or (ttl > 0 and now - (job.finished or job.created) > ttl):
+                job.result = None
+
+            if i >= self.keep_records:
+                del self.jobs[job.id]
+
+
+queue = JobQueue()
@@ -0,0 +1,91 @@
+import threading
+import time
+
+from components import shared
+from utils import errors
+
+
+class PreviewRenderer:
+    """
+    Renders live previews on its own thread so that sampling doesn't wait for the VAE (or its approximation).
+
+    The sampling thread hands over a detached copy of the latent with submit(); there is only one slot for it, and a newer
+    latent replaces one that hasn't been picked up yet, so frames that come while a preview is being rendered are dropped
+    and the next rendered preview is always the latest one. opts.live_preview_max_fps limits how often previews are rendered.
+    """
+
+    def __init__(self):
+        self.lock = threading.Condition()
+        self.pending = None
+        self.generation = 0
+        self.thread = None
+        self.last_render = 0.0
+
+    @staticmethod
+    def enabled():
+        return shared.opts.live_preview_background and shared.parallel_processing_allowed
+
+    def submit(self, latent, sampling_step):
+        snapshot = latent.detach().clone()
+
+        with self.lock:
+            self.pending = (snapshot, sampling_step, self.generation)
+
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, daemon=True, name="live-preview")
+                self.thread.start()
+
+            self.lock.notify()
+
+    def reset(self):
+        """drops pending latents and previews that are being rendered; called when a new job starts"""
+
+        with self.lock:
+            self.pending = None
+            self.generation += 1
+
+    def run(self):
+        while True:
+            with self.lock:
+                while self.pending is None:
+                    self.lock.wait()
+
+                max_fps = shared.opts.live_preview_max_fps
+                wait = self.last_render + 1 / max_fps - time.time() if max_fps > 0 else 0
+
+            if wait > 0:
+                # a newer latent may replace the pending one while we wait
+                time.sleep(wait)
+
+            with self.lock:
+                if self.pending is None:
+                    continue
+
+                latent, sampling_step, generation = self.pending
+                self.pending = None
+
+            self.last_render = time.time()
+            image = self.render(latent)
+
+            with self.lock:
+                if image is not None and generation == self.generation:
+                    shared.state.assign_current_image(image)
+                    shared.state.current_image_sampling_step = sampling_step
+
+    @staticmethod
+    def render(latent):
+        from components.sd import sd_samplers_common
+
+        try:
+            if shared.opts.show_progress_grid:
+                return sd_samplers_common.samples_to_image_grid(latent)
+
+            return sd_samplers_common.sample_to_image(latent)
+        except Exception:
+            # when switching models during generation, VAE would be on CPU, so creating an image will fail.
+            # we silently ignore this error
+            errors.record_exception()
+            return None
+
+
+renderer = PreviewRenderer()
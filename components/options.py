@@ -1,5 +1,7 @@
 import json
+import os
 import sys
+import tempfile
 from dataclasses import dataclass
 
 import gradio as gr
@@ -163,8 +165,18 @@ class Options:
     def save(self, filename):
         assert not cmd_opts.freeze_settings, "saving settings is disabled"
 
-        with open(filename, "w", encoding="utf8") as file:
-            json.dump(self.data, file, indent=4, ensure_ascii=False)
+        # written to a temporary file and moved into place, so that processes saving settings at the same time (workers
+        # in supervisor mode) never leave a mix of their writes, and a reader never sees a partially written file
+        fd, tmp_filename = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(filename)), prefix=os.path.basename(filename), suffix=".tmp")
+        try:
+            with open(fd, "w", encoding="utf8") as file:
+                json.dump(self.data, file, indent=4, ensure_ascii=False)
+
+            os.replace(tmp_filename, filename)
+        except BaseException:
+            if os.path.exists(tmp_filename):
+                os.remove(tmp_filename)
+            raise
 
     def same_type(self, x, y):
         if x is None or y is None:
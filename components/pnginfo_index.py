@@ -0,0 +1,155 @@
+import os
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
+
+from components import images, paths, shared
+from components.generation_parameters_copypaste import parse_generation_parameters
+from utils import errors
+
+db_path = os.path.join(paths.data_path, "pnginfo_index.db")
+image_extensions = (".png", ".jpg", ".jpeg", ".webp")
+lock = threading.Lock()
+
+columns = {
+    "prompt": ("TEXT", "Prompt", str),
+    "negative_prompt": ("TEXT", "Negative prompt", str),
+    "seed": ("INTEGER", "Seed", int),
+    "model": ("TEXT", "Model", str),
+    "model_hash": ("TEXT", "Model hash", str),
+    "sampler": ("TEXT", "Sampler", str),
+    "steps": ("INTEGER", "Steps", int),
+    "cfg_scale": ("REAL", "CFG scale", float),
+    "width": ("INTEGER", "Size-1", int),
+    "height": ("INTEGER", "Size-2", int),
+}
+"""columns of the index filled from parsed generation parameters: name -> (SQL type, infotext key, conversion)"""
+
+
+def connect():
+    conn = sqlite3.connect(db_path, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+
+    column_defs = "".join(f", {name} {sql_type}" for name, (sql_type, _, _) in columns.items())
+    conn.execute(f"CREATE TABLE IF NOT EXISTS images (path TEXT PRIMARY KEY, mtime REAL, size INTEGER, parameters TEXT{column_defs})")
+    conn.execute("CREATE INDEX IF NOT EXISTS images_seed ON images (seed)")
+    conn.execute("CREATE INDEX IF NOT EXISTS images_model ON images (model)")
+
+    return conn
+
+
+def default_directories():
+    dirs = [shared.opts.outdir_samples, shared.opts.outdir_txt2img_samples, shared.opts.outdir_img2img_samples, shared.opts.outdir_extras_samples, shared.opts.outdir_grids, shared.opts.outdir_txt2img_grids, shared.opts.outdir_img2img_grids, shared.opts.outdir_save]
+    return list(dict.fromkeys(os.path.abspath(x) for x in dirs if x and os.path.isdir(x)))
+
+
+def scan_directory(path):
+    """Yields (filename, mtime, size) for image files in path and its subdirectories."""
+
+    try:
+        entries = list(os.scandir(path))
+    except OSError:
+        return
+
+    for entry in entries:
+        try:
+            if entry.is_dir(follow_symlinks=False):
+                yield from scan_directory(entry.path)
+            elif entry.name.lower().endswith(image_extensions):
+                stat = entry.stat()
+                yield entry.path, stat.st_mtime, stat.st_size
+        except OSError:
+            pass
+
+
+def read_entry(filename, mtime, size):
+    """Reads generation parameters from the file and returns a row for the index."""
+
+    try:
+        geninfo, _ = images.read_info_from_file(filename)
+    except Exception:
+        geninfo = None
+
+    row = {"path": filename, "mtime": mtime, "size": size, "parameters": geninfo}
+    params = parse_generation_parameters(geninfo) if geninfo else {}
+
+    for name, (_, key, convert) in columns.items():
+        try:
+            row[name] = convert(params[key]) if key in params else None
+        except (ValueError, TypeError):
+            row[name] = None
+
+    return row
+
+
+def index_directories(directories=None, workers=None):
+    """
+    Adds images from directories (by default, all output directories) to the index. Files that are already indexed and
+    haven't changed are not read again; index entries for files that no longer exist are removed. Metadata is read by
+    a pool of threads; only metadata chunks of files are read, not pixels. Returns counts of added, updated, removed
+    and unchanged entries.
+    """
+
+    directories = [os.path.abspath(x) for x in (directories or default_directories())]
+    workers = workers or min(32, (os.cpu_count() or 1) * 4)
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="pnginfo-index") as executor:
+        found = {}
+        for files in executor.map(lambda path: list(scan_directory(path)), directories):
+            for filename, mtime, size in files:
+                found[filename] = (mtime, size)
+
+        with lock, closing(connect()) as conn, conn:
+            known = {}
+            for directory in directories:
+                pattern = os.path.join(directory, "").replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+                for row in conn.execute("SELECT path, mtime, size FROM images WHERE path LIKE ? ESCAPE '\\'", (pattern,)):
+                    known[row["path"]] = (row["mtime"], row["size"])
+
+            changed = [(filename, mtime, size) for filename, (mtime, size) in found.items() if known.get(filename) != (mtime, size)]
+            removed = [filename for filename in known if filename not in found]
+
+            rows = list(executor.map(lambda x: read_entry(*x), changed))
+
+            names = ["path", "mtime", "size", "parameters", *columns]
+            conn.executemany(f"INSERT OR REPLACE INTO images ({', '.join(names)}) VALUES ({', '.join('?' * len(names))})", [[row[name] for name in names] for row in rows])
+            conn.executemany("DELETE FROM images WHERE path = ?", [(filename,) for filename in removed])
+
+    added = sum(1 for filename, _, _ in changed if filename not in known)
+
+    return {
+        "added": added,
+        "updated": len(changed) - added,
+        "removed": len(removed),
+        "unchanged": len(found) - len(changed),
+    }
+
+
+def search(text=None, seed=None, model=None, sampler=None, limit=100, offset=0):
+    """Returns index entries as dicts, newest first. text is searched for in the positive prompt; other arguments must match exactly."""
+
+    conditions = []
+    args = []
+
+    if text:
+        conditions.append("prompt LIKE ?")
+        args.append(f"%{text}%")
+    if seed is not None:
+        conditions.append("seed = ?")
+        args.append(seed)
+    if model:
+        conditions.append("(model = ? OR model_hash = ?)")
+        args += [model, model]
+    if sampler:
+        conditions.append("sampler = ?")
+        args.append(sampler)
+
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+    try:
+        with lock, closing(connect()) as conn:
+            return [dict(row) for row in conn.execute(f"SELECT * FROM images {where} ORDER BY mtime DESC LIMIT ? OFFSET ?", (*args, limit, offset))]
+    except sqlite3.Error:
+        errors.report("Error searching PNG info index", exc_info=True)
+        return []
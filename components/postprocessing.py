@@ -1,14 +1,89 @@
+import collections
 import os
+from concurrent.futures import ThreadPoolExecutor
 
 from PIL import Image
 
 from components import shared, images, scripts, scripts_postprocessing, generation_parameters_copypaste
 from components.shared import opts
 from ui import ui_common
-from utils import devices
+from utils import devices, errors
+
+
+def load_image(image_placeholder, name):
+    """Opens and decodes an input image and reads its infotext; runs in a prefetch thread. Returns None if the file can't be read."""
+
+    if isinstance(image_placeholder, str):
+        try:
+            image_data = Image.open(image_placeholder)
+            image_data.load()
+        except Exception:
+            return None
+    else:
+        image_data = image_placeholder
+
+    parameters, existing_pnginfo = images.read_info_from_image(image_data)
+    if parameters:
+        existing_pnginfo["parameters"] = parameters
+
+    return image_data, name, existing_pnginfo
+
+
+def prefetch(executor, data_to_process, count):
+    """Yields results of load_image for data_to_process, keeping up to count images loading ahead in executor."""
+
+    pending = collections.deque()
+    data_to_process = iter(data_to_process)
+
+    try:
+        for image_placeholder, name in data_to_process:
+            pending.append(executor.submit(load_image, image_placeholder, name))
+            if len(pending) >= count:
+                yield pending.popleft().result()
+
+        while pending:
+            yield pending.popleft().result()
+    finally:
+        for future in pending:
+            future.cancel()
+
+
+def save_caption(fullfn, caption):
+    caption_filename = os.path.splitext(fullfn)[0] + ".txt"
+    if os.path.isfile(caption_filename):
+        with open(caption_filename, encoding="utf8") as file:
+            existing_caption = file.read().strip()
+    else:
+        existing_caption = ""
+
+    action = shared.opts.postprocessing_existing_caption_action
+    if action == 'Prepend' and existing_caption:
+        caption = f"{existing_caption} {caption}"
+    elif action == 'Append' and existing_caption:
+        caption = f"{caption} {existing_caption}"
+    elif action == 'Keep' and existing_caption:
+        caption = existing_caption
+
+    caption = caption.strip()
+    if caption:
+        with open(caption_filename, "w", encoding="utf8") as file:
+            file.write(caption)
+
+
+def save_postprocessed_image(pp, outpath, basename, infotext, existing_pnginfo, forced_filename, suffix):
+    fullfn, _ = images.save_image(pp.image, path=outpath, basename=basename, extension=opts.samples_format, info=infotext, short_filename=True, no_prompt=True, grid=False, pnginfo_section_name="extras", existing_info=existing_pnginfo, forced_filename=forced_filename, suffix=suffix)
+
+    if pp.caption:
+        save_caption(fullfn, pp.caption)
 
 
 def run_postprocessing(extras_mode, image, image_folder, input_dir, output_dir, show_extras_results, *args, save_output: bool = True):
+    """
+    Runs postprocessing scripts on one or many images. Images are decoded and their infotext is read in a pool of prefetch
+    threads, scripts run on the calling thread, and results are encoded and saved in a background thread, so that
+    disk I/O and PNG coding overlap with upscaling. Queues between stages are bounded by opts.postprocessing_prefetch_images.
+    """
+
     devices.torch_gc()
 
     shared.state.begin(job="extras")
@@ -22,20 +97,27 @@ def run_postprocessing(extras_mode, image, image_folder, input_dir, output_dir,
                     image = img
                     fn = ''
                 else:
-                    image = Image.open(os.path.abspath(img.name))
+                    image = os.path.abspath(img.name)
                     fn = os.path.splitext(img.orig_name)[0]
                 yield image, fn
         elif extras_mode == 2:
-            assert not shared.cmd_opts.hide_ui_dir_config, '--hide-ui-dir-config option must be disabled'
-            assert input_dir, 'input directory not selected'
-
-            image_list = shared.listfiles(input_dir)
             for filename in image_list:
                 yield filename, filename
         else:
             assert image, 'image not selected'
             yield image, None
 
+    if extras_mode == 2:
+        assert not shared.cmd_opts.hide_ui_dir_config, '--hide-ui-dir-config option must be disabled'
+        assert input_dir, 'input directory not selected'
+
+        image_list = shared.listfiles(input_dir)
+        shared.state.job_count = len(image_list)
+    elif extras_mode == 1:
+        shared.state.job_count = len(image_folder)
+    else:
+        shared.state.job_count = 1
+
     if extras_mode == 2 and output_dir != '':
         outpath = output_dir
     else:
@@ -43,87 +125,68 @@ def run_postprocessing(extras_mode, image, image_folder, input_dir, output_dir,
 
     infotext = ''
 
-    data_to_process = list(get_images(extras_mode, image, image_folder, input_dir))
-    shared.state.job_count = len(data_to_process)
-
-    for image_placeholder, name in data_to_process:
-        image_data: Image.Image
+    queue_size = max(1, int(opts.postprocessing_prefetch_images))
+    saves = collections.deque()
 
-        shared.state.nextjob()
-        shared.state.textinfo = name
-        shared.state.skipped = False
-
-        if shared.state.interrupted:
-            break
-
-        if isinstance(image_placeholder, str):
+    def wait_for_saves(count):
+        while len(saves) > count:
             try:
-                image_data = Image.open(image_placeholder)
+                saves.popleft().result()
             except Exception:
-                continue
-        else:
-            image_data = image_placeholder
+                errors.report("Error saving postprocessed image", exc_info=True)
 
-        shared.state.assign_current_image(image_data)
+    # saving is done by a single thread so that sequential filename numbers stay in order
+    with ThreadPoolExecutor(max_workers=queue_size, thread_name_prefix="extras-load") as loader, ThreadPoolExecutor(max_workers=1, thread_name_prefix="extras-save") as saver:
+        for loaded in prefetch(loader, get_images(extras_mode, image, image_folder, input_dir), queue_size):
+            shared.state.nextjob()
+            shared.state.skipped = False
 
-        parameters, existing_pnginfo = images.read_info_from_image(image_data)
-        if parameters:
-            existing_pnginfo["parameters"] = parameters
+            if shared.state.interrupted:
+                break
 
-        initial_pp = scripts_postprocessing.PostprocessedImage(image_data.convert("RGB"))
+            if loaded is None:
+                continue
+
+            image_data, name, existing_pnginfo = loaded
+            shared.state.textinfo = name
 
-        scripts.scripts_postproc.run(initial_pp, args)
+            shared.state.assign_current_image(image_data)
 
-        if shared.state.skipped:
-            continue
+            initial_pp = scripts_postprocessing.PostprocessedImage(image_data.convert("RGB"))
 
-        used_suffixes = {}
-        for pp in [initial_pp, *initial_pp.extra_images]:
-            suffix = pp.get_suffix(used_suffixes)
+            scripts.scripts_postproc.run(initial_pp, args)
 
-            if opts.use_original_name_batch and name is not None:
-                basename = os.path.splitext(os.path.basename(name))[0]
-                forced_filename = basename + suffix
-            else:
-                basename = ''
-                forced_filename = None
+            if shared.state.skipped:
+                continue
 
-            infotext = ", ".join([k if k == v else f'{k}: {generation_parameters_copypaste.quote(v)}' for k, v in pp.info.items() if v is not None])
+            used_suffixes = {}
+            for pp in [initial_pp, *initial_pp.extra_images]:
+                suffix = pp.get_suffix(used_suffixes)
 
-            if opts.enable_pnginfo:
-                pp.image.info = existing_pnginfo
-                pp.image.info["postprocessing"] = infotext
+                if opts.use_original_name_batch and name is not None:
+                    basename = os.path.splitext(os.path.basename(name))[0]
+                    forced_filename = basename + suffix
+                else:
+                    basename = ''
+                    forced_filename = None
 
-            if save_output:
-                fullfn, _ = images.save_image(pp.image, path=outpath, basename=basename, extension=opts.samples_format, info=infotext, short_filename=True, no_prompt=True, grid=False, pnginfo_section_name="extras", existing_info=existing_pnginfo, forced_filename=forced_filename, suffix=suffix)
+                infotext = ", ".join([k if k == v else f'{k}: {generation_parameters_copypaste.quote(v)}' for k, v in pp.info.items() if v is not None])
 
-                if pp.caption:
-                    caption_filename = os.path.splitext(fullfn)[0] + ".txt"
-                    if os.path.isfile(caption_filename):
-                        with open(caption_filename, encoding="utf8") as file:
-                            existing_caption = file.read().strip()
-                    else:
-                        existing_caption = ""
+                # every output gets its own copy, as its save runs in the background while the next output is prepared
+                pnginfo = {**existing_pnginfo, "postprocessing": infotext} if opts.enable_pnginfo else dict(existing_pnginfo)
+                if opts.enable_pnginfo:
+                    pp.image.info = pnginfo
 
-                    action = shared.opts.postprocessing_existing_caption_action
-                    if action == 'Prepend' and existing_caption:
-                        caption = f"{existing_caption} {pp.caption}"
-                    elif action == 'Append' and existing_caption:
-                        caption = f"{pp.caption} {existing_caption}"
-                    elif action == 'Keep' and existing_caption:
-                        caption = existing_caption
-                    else:
-                        caption = pp.caption
+                if save_output:
+                    saves.append(saver.submit(save_postprocessed_image, pp, outpath, basename, infotext, pnginfo, forced_filename, suffix))
+                    wait_for_saves(queue_size)
 
-                    caption = caption.strip()
-                    if caption:
-                        with open(caption_filename, "w", encoding="utf8") as file:
-                            file.write(caption)
+                if extras_mode != 2 or show_extras_results:
+                    outputs.append(pp.image)
 
-            if extras_mode != 2 or show_extras_results:
-                outputs.append(pp.image)
+            image_data.close()
 
-        image_data.close()
+        wait_for_saves(0)
 
     devices.torch_gc()
     shared.state.end()
@@ -1,4 +1,5 @@
 from __future__ import annotations
+import contextlib
 import json
 import logging
 import math
@@ -15,13 +16,13 @@ import cv2
 from skimage import exposure
 from typing import Any
 
-from components.sd import sd_hijack, sd_samplers, sd_vae_approx, sd_samplers_common, sd_unet
-from components import  prompt_parser, masking, generation_parameters_copypaste, extra_networks, scripts, rng
+from components.sd import sd_hijack, sd_samplers, sd_vae_approx, sd_samplers_common, sd_unet, sd_deepcache, sd_hijack_autotune
+from components import  prompt_parser, masking, generation_parameters_copypaste, extra_networks, scripts, rng, job_context
 from utils import devices, lowvram, errors
 from components.rng import slerp # noqa: F401
 from components.sd.sd_hijack import model_hijack
 from components.sd.sd_samplers_common import images_tensor_to_samples, decode_first_stage, approximation_indexes
-from components.shared import opts, cmd_opts, state
+from components.shared import opts, cmd_opts
 import components.shared as shared
 import components.paths as paths
 import components.face_restoration
@@ -231,8 +232,13 @@ class StableDiffusionProcessing:
             self.seed_resize_from_h = 0
             self.seed_resize_from_w = 0
 
-        self.cached_uc = StableDiffusionProcessing.cached_uc
-        self.cached_c = StableDiffusionProcessing.cached_c
+        if job_context.current() is None:
+            self.cached_uc = StableDiffusionProcessing.cached_uc
+            self.cached_c = StableDiffusionProcessing.cached_c
+        else:
+            # concurrent jobs compute conditioning at the same time, so each has a cache of its own
+            self.cached_uc = [None, None]
+            self.cached_c = [None, None]
 
     @property
     def sd_model(self):
@@ -453,10 +459,11 @@ class StableDiffusionProcessing:
         cache = caches[0]
 
         with devices.autocast():
-            cache[1] = function(shared.sd_model, required_prompts, steps, hires_steps, shared.opts.use_old_scheduling)
+            result = function(shared.sd_model, required_prompts, steps, hires_steps, shared.opts.use_old_scheduling)
 
+        cache[1] = result
         cache[0] = cached_params
-        return cache[1]
+        return result
 
     def setup_conds(self):
         prompts = prompt_parser.SdConditioning(self.prompts, width=self.width, height=self.height)
@@ -478,7 +485,7 @@ class StableDiffusionProcessing:
 
     def save_samples(self) -> bool:
         """Returns whether generated images need to be written to disk"""
-        return opts.samples_save and not self.do_not_save_samples and (opts.save_incomplete_images or not state.interrupted and not state.skipped)
+        return opts.samples_save and not self.do_not_save_samples and (opts.save_incomplete_images or not shared.state.interrupted and not shared.state.skipped)
 
 
 class Processed:
@@ -510,7 +517,7 @@ class Processed:
         self.extra_generation_params = p.extra_generation_params
         self.index_of_first_image = index_of_first_image
         self.styles = p.styles
-        self.job_timestamp = state.job_timestamp
+        self.job_timestamp = shared.state.job_timestamp
         self.clip_skip = opts.CLIP_stop_at_last_layers
         self.token_merging_ratio = p.token_merging_ratio
         self.token_merging_ratio_hr = p.token_merging_ratio_hr
@@ -695,6 +702,9 @@ def create_infotext(p, all_prompts, all_seeds, all_subseeds, comments=None, iter
         "RNG": opts.randn_source if opts.randn_source != "GPU" else None,
         "NGMS": None if p.s_min_uncond == 0 else p.s_min_uncond,
         "Tiling": "True" if p.tiling else None,
+        "DeepCache interval": opts.deepcache_interval if sd_deepcache.is_enabled() else None,
+        "DeepCache depth": opts.deepcache_depth if sd_deepcache.is_enabled() else None,
+        "DeepCache warmup": opts.deepcache_warmup if sd_deepcache.is_enabled() and opts.deepcache_warmup > 0 else None,
         **p.extra_generation_params,
         "Version": program_version() if opts.add_version_to_infotext else None,
         "User": p.user if opts.add_user_name_to_info else None,
@@ -708,42 +718,91 @@ def create_infotext(p, all_prompts, all_seeds, all_subseeds, comments=None, iter
     return f"{prompt_text}{negative_prompt_text}\n{generation_params_text}".strip()
 
 
+def needs_exclusive_model_access(p: StableDiffusionProcessing) -> bool:
+    """
+    whether processing p changes or uses something all jobs share - settings, the checkpoint, token merging, tiling, extra
+    networks and hypernetworks, DeepCache or face restoration models - so that it can't run concurrently with other jobs
+    """
+
+    if any(k not in opts.data_labels or opts.data.get(k, opts.get_default(k)) != v for k, v in p.override_settings.items()):
+        return True
+
+    checkpoint_info = sd_models.checkpoint_aliases.get(opts.sd_model_checkpoint)
+    sd_model = sd_models.model_data.sd_model
+    if sd_model is None or checkpoint_info is None or sd_model.sd_model_checkpoint != checkpoint_info.filename:
+        return True
+
+    if p.refiner_checkpoint not in (None, "", "None", "none") or getattr(p, "hr_checkpoint_name", None):
+        return True
+
+    token_merging_hr = getattr(p, "enable_hr", False) and p.get_token_merging_ratio(for_hr=True)
+    if p.get_token_merging_ratio() or token_merging_hr or (opts.tiling if p.tiling is None else p.tiling):
+        return True
+
+    # loaded extra networks and hypernetworks, the DeepCache cache and face restoration helpers are global
+    if opts.sd_hypernetwork not in (None, "", "None") or sd_deepcache.is_enabled():
+        return True
+
+    if opts.face_restoration if p.restore_faces is None else p.restore_faces:
+        return True
+
+    if p.disable_extra_networks:
+        return False
+
+    prompts = []
+    for prompt in (p.prompt, p.negative_prompt, getattr(p, "hr_prompt", None), getattr(p, "hr_negative_prompt", None)):
+        prompts += prompt if isinstance(prompt, list) else [prompt or ""]
+
+    prompts += [shared.prompt_styles.apply_styles_to_prompt("", p.styles or []), shared.prompt_styles.apply_negative_styles_to_prompt("", p.styles or [])]
+
+    return any(extra_networks.re_extra_net.search(prompt) for prompt in prompts)
+
+
 def process_images(p: StableDiffusionProcessing) -> Processed:
+    from utils.call_queue import queue_lock
+
     if p.scripts is not None:
         p.scripts.before_process(p)
 
-    stored_opts = {k: opts.data[k] if k in opts.data else opts.get_default(k) for k in p.override_settings.keys() if k in opts.data}
-
-    try:
-        # if no checkpoint override or the override checkpoint can't be found, remove override entry and load opts checkpoint
-        # and if after running refiner, the refiner model is not unloaded - webui swaps back to main model here, if model over is present it will be reloaded afterwards
-        if sd_models.checkpoint_aliases.get(p.override_settings.get('sd_model_checkpoint')) is None:
-            p.override_settings.pop('sd_model_checkpoint', None)
-            sd_models.reload_model_weights()
+    concurrent = job_context.current() is not None and not needs_exclusive_model_access(p)
 
-        for k, v in p.override_settings.items():
-            opts.set(k, v, is_api=True, run_callbacks=False)
+    with contextlib.nullcontext() if concurrent else queue_lock.exclusive():
+        stored_opts = {k: opts.data[k] if k in opts.data else opts.get_default(k) for k in p.override_settings.keys() if k in opts.data}
 
-            if k == 'sd_model_checkpoint':
+        try:
+            # if no checkpoint override or the override checkpoint can't be found, remove override entry and load opts checkpoint
+            # and if after running refiner, the refiner model is not unloaded - webui swaps back to main model here, if model over is present it will be reloaded afterwards
+            if sd_models.checkpoint_aliases.get(p.override_settings.get('sd_model_checkpoint')) is None:
+                p.override_settings.pop('sd_model_checkpoint', None)
                 sd_models.reload_model_weights()
 
-            if k == 'sd_vae':
-                sd_vae.reload_vae_weights()
+            for k, v in p.override_settings.items():
+                opts.set(k, v, is_api=True, run_callbacks=False)
 
-        sd_models.apply_token_merging(p.sd_model, p.get_token_merging_ratio())
+                if k == 'sd_model_checkpoint':
+                    sd_models.reload_model_weights()
 
-        res = process_images_inner(p)
+                if k == 'sd_vae':
+                    sd_vae.reload_vae_weights()
 
-    finally:
-        sd_models.apply_token_merging(p.sd_model, 0)
+            sd_models.apply_token_merging(p.sd_model, p.get_token_merging_ratio())
 
-        # restore opts to original state
-        if p.override_settings_restore_afterwards:
-            for k, v in stored_opts.items():
-                setattr(opts, k, v)
+            # switching cross attention optimization would affect other jobs in the middle of sampling
+            if not concurrent:
+                sd_hijack_autotune.apply(p.sd_model, p.width, p.height)
 
-                if k == 'sd_vae':
-                    sd_vae.reload_vae_weights()
+            res = process_images_inner(p)
+
+        finally:
+            sd_models.apply_token_merging(p.sd_model, 0)
+
+            # restore opts to original state
+            if p.override_settings_restore_afterwards:
+                for k, v in stored_opts.items():
+                    setattr(opts, k, v)
+
+                    if k == 'sd_vae':
+                        sd_vae.reload_vae_weights()
 
     return res
 
@@ -777,8 +836,8 @@ def process_images_inner(p: StableDiffusionProcessing) -> Processed:
     p.sd_vae_name = sd_vae.get_loaded_vae_name()
     p.sd_vae_hash = sd_vae.get_loaded_vae_hash()
 
-    modules.sd_hijack.model_hijack.apply_circular(p.tiling)
-    modules.sd_hijack.model_hijack.clear_comments()
+    model_hijack.apply_circular(p.tiling)
+    model_hijack.clear_comments()
 
     p.setup_prompts()
 
@@ -810,16 +869,16 @@ def process_images_inner(p: StableDiffusionProcessing) -> Processed:
 
             sd_unet.apply_unet()
 
-        if state.job_count == -1:
-            state.job_count = p.n_iter
+        if shared.state.job_count == -1:
+            shared.state.job_count = p.n_iter
 
         for n in range(p.n_iter):
             p.iteration = n
 
-            if state.skipped:
-                state.skipped = False
+            if shared.state.skipped:
+                shared.state.skipped = False
 
-            if state.interrupted:
+            if shared.state.interrupted:
                 break
 
             sd_models.reload_model_weights()  # model can be changed for example by refiner
@@ -885,7 +944,7 @@ def process_images_inner(p: StableDiffusionProcessing) -> Processed:
 
             devices.torch_gc()
 
-            state.nextjob()
+            shared.state.nextjob()
 
             if p.scripts is not None:
                 p.scripts.postprocess_batch(p, x_samples_ddim, batch_number=n)
@@ -902,20 +961,21 @@ def process_images_inner(p: StableDiffusionProcessing) -> Processed:
 
             save_samples = p.save_samples()
 
-            for i, x_sample in enumerate(x_samples_ddim):
-                p.batch_index = i
-
-                x_sample = 255. * np.moveaxis(x_sample.cpu().numpy(), 0, 2)
-                x_sample = x_sample.astype(np.uint8)
+            x_samples_uint8 = [(255. * np.moveaxis(x_sample.cpu().numpy(), 0, 2)).astype(np.uint8) for x_sample in x_samples_ddim]
 
-                if p.restore_faces:
+            if p.restore_faces:
+                for i, x_sample in enumerate(x_samples_uint8):
+                    p.batch_index = i
                     if save_samples and opts.save_images_before_face_restoration:
                         images.save_image(Image.fromarray(x_sample), p.outpath_samples, "", p.seeds[i], p.prompts[i], opts.samples_format, info=infotext(i), p=p, suffix="-before-face-restoration")
 
-                    devices.torch_gc()
+                devices.torch_gc()
 
-                    x_sample = modules.face_restoration.restore_faces(x_sample)
-                    devices.torch_gc()
+                x_samples_uint8 = components.face_restoration.restore_faces_batch(x_samples_uint8)
+                devices.torch_gc()
+
+            for i, x_sample in enumerate(x_samples_uint8):
+                p.batch_index = i
 
                 image = Image.fromarray(x_sample)
 
@@ -1054,8 +1114,12 @@ class StableDiffusionProcessingTxt2Img(StableDiffusionProcessing):
             self.width = self.firstphase_width
             self.height = self.firstphase_height
 
-        self.cached_hr_uc = StableDiffusionProcessingTxt2Img.cached_hr_uc
-        self.cached_hr_c = StableDiffusionProcessingTxt2Img.cached_hr_c
+        if job_context.current() is None:
+            self.cached_hr_uc = StableDiffusionProcessingTxt2Img.cached_hr_uc
+            self.cached_hr_c = StableDiffusionProcessingTxt2Img.cached_hr_c
+        else:
+            self.cached_hr_uc = [None, None]
+            self.cached_hr_c = [None, None]
 
     def calculate_target_resolution(self):
         if opts.use_old_hires_fix_width_height and self.applied_old_hires_behavior_to != (self.width, self.height):
@@ -1122,13 +1186,13 @@ class StableDiffusionProcessingTxt2Img(StableDiffusionProcessing):
 
             self.calculate_target_resolution()
 
-            if not state.processing_has_refined_job_count:
-                if state.job_count == -1:
-                    state.job_count = self.n_iter
+            if not shared.state.processing_has_refined_job_count:
+                if shared.state.job_count == -1:
+                    shared.state.job_count = self.n_iter
 
-                shared.total_tqdm.updateTotal((self.steps + (self.hr_second_pass_steps or self.steps)) * state.job_count)
-                state.job_count = state.job_count * 2
-                state.processing_has_refined_job_count = True
+                shared.total_tqdm.updateTotal((self.steps + (self.hr_second_pass_steps or self.steps)) * shared.state.job_count)
+                shared.state.job_count = shared.state.job_count * 2
+                shared.state.processing_has_refined_job_count = True
 
             if self.hr_second_pass_steps:
                 self.extra_generation_params["Hires steps"] = self.hr_second_pass_steps
@@ -1236,6 +1300,7 @@ class StableDiffusionProcessingTxt2Img(StableDiffusionProcessing):
             self.calculate_hr_conds()
 
         sd_models.apply_token_merging(self.sd_model, self.get_token_merging_ratio(for_hr=True))
+        sd_hijack_autotune.apply(self.sd_model, target_width, target_height)
 
         if self.scripts is not None:
             self.scripts.before_hr(self)
@@ -1243,6 +1308,7 @@ class StableDiffusionProcessingTxt2Img(StableDiffusionProcessing):
         samples = self.sampler.sample_img2img(self, samples, noise, self.hr_c, self.hr_uc, steps=self.hr_second_pass_steps or self.steps, image_conditioning=image_conditioning)
 
         sd_models.apply_token_merging(self.sd_model, self.get_token_merging_ratio())
+        sd_hijack_autotune.apply(self.sd_model, self.width, self.height)
 
         self.sampler = None
         devices.torch_gc()
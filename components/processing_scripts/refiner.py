@@ -1,9 +1,7 @@
 import gradio as gr
 
-from components.sd import , sd_models
+from components.sd import sd_models
 from components import scripts
-from ui.ui_common import create_refresh_button
-from ui.ui_components import InputAccordion
 
 
 class ScriptRefiner(scripts.ScriptBuiltinUI):
@@ -20,6 +18,9 @@ class ScriptRefiner(scripts.ScriptBuiltinUI):
         return scripts.AlwaysVisible
 
     def ui(self, is_img2img):
+        from ui.ui_common import create_refresh_button
+        from ui.ui_components import InputAccordion
+
         with InputAccordion(False, label="Refiner", elem_id=self.elem_id("enable")) as enable_refiner:
             with gr.Row():
                 refiner_checkpoint = gr.Dropdown(label='Checkpoint', elem_id=self.elem_id("checkpoint"), choices=sd_models.checkpoint_tiles(), value='', tooltip="switch to another model in the middle of generation")
@@ -39,6 +40,13 @@ class ScriptRefiner(scripts.ScriptBuiltinUI):
 
         return enable_refiner, refiner_checkpoint, refiner_switch_at
 
+    def api_args(self, is_img2img):
+        return [
+            {"label": "Refiner", "value": False},
+            {"label": "Checkpoint", "value": "", "choices": sd_models.checkpoint_tiles()},
+            {"label": "Switch at", "value": 0.8, "minimum": 0.01, "maximum": 1.0, "step": 0.01},
+        ]
+
     def setup(self, p, enable_refiner, refiner_checkpoint, refiner_switch_at):
         # the actual implementation is in sd_samplers_common.py, apply_refiner
 
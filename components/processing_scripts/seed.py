@@ -5,8 +5,6 @@ import gradio as gr
 from components import scripts
 from utils import errors
 from components.shared import cmd_opts
-from ui.ui_components import ToolButton
-from ui import ui
 
 
 class ScriptSeed(scripts.ScriptBuiltinUI):
@@ -25,6 +23,9 @@ class ScriptSeed(scripts.ScriptBuiltinUI):
         return scripts.AlwaysVisible
 
     def ui(self, is_img2img):
+        from ui.ui_components import ToolButton
+        from ui import ui
+
         with gr.Row(elem_id=self.elem_id("seed_row")):
             if cmd_opts.use_textbox_seed:
                 self.seed = gr.Textbox(label='Seed', value="", elem_id=self.elem_id("seed"), min_width=100)
@@ -66,6 +67,16 @@ class ScriptSeed(scripts.ScriptBuiltinUI):
 
         return self.seed, seed_checkbox, subseed, subseed_strength, seed_resize_from_w, seed_resize_from_h
 
+    def api_args(self, is_img2img):
+        return [
+            {"label": "Seed", "value": "" if cmd_opts.use_textbox_seed else -1},
+            {"label": "Extra", "value": False},
+            {"label": "Variation seed", "value": -1},
+            {"label": "Variation strength", "value": 0.0, "minimum": 0, "maximum": 1, "step": 0.01},
+            {"label": "Resize seed from width", "value": 0, "minimum": 0, "maximum": 2048, "step": 8},
+            {"label": "Resize seed from height", "value": 0, "minimum": 0, "maximum": 2048, "step": 8},
+        ]
+
     def setup(self, p, seed, seed_checkbox, subseed, subseed_strength, seed_resize_from_w, seed_resize_from_h):
         p.seed = seed
 
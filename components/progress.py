@@ -1,48 +1,33 @@
-import base64
-import io
 import time
 
 import gradio as gr
 from pydantic import BaseModel, Field
 
 from components.shared import opts
+from components.job_queue import queue
+from components import job_context
+from components.progress_stream import previews
 
 import components.shared as shared
 
 
-current_task = None
-pending_tasks = {}
-finished_tasks = []
-recorded_results = []
-recorded_results_limit = 2
-
-
 def start_task(id_task):
-    global current_task
-
-    current_task = id_task
-    pending_tasks.pop(id_task, None)
+    if id_task is not None:
+        queue.start(id_task)
 
 
 def finish_task(id_task):
-    global current_task
-
-    if current_task == id_task:
-        current_task = None
-
-    finished_tasks.append(id_task)
-    if len(finished_tasks) > 16:
-        finished_tasks.pop(0)
+    if id_task is not None:
+        queue.finish(id_task)
 
 
 def record_results(id_task, res):
-    recorded_results.append((id_task, res))
-    if len(recorded_results) > recorded_results_limit:
-        recorded_results.pop(0)
+    if id_task is not None:
+        queue.record_result(id_task, res)
 
 
 def add_task_to_queue(id_job):
-    pending_tasks[id_job] = time.time()
+    queue.track(id_job)
 
 
 class ProgressRequest(BaseModel):
@@ -67,22 +52,25 @@ def setup_progress_api(app):
 
 
 def progressapi(req: ProgressRequest):
-    active = req.id_task == current_task
-    queued = req.id_task in pending_tasks
-    completed = req.id_task in finished_tasks
+    job = queue.get(req.id_task)
+    active = job is not None and job.status == "running"
+    queued = job is not None and job.status == "queued"
+    completed = job is not None and not job.active
 
     if not active:
         textinfo = "Waiting..."
         if queued:
-            sorted_queued = sorted(pending_tasks.keys(), key=lambda x: pending_tasks[x])
-            queue_index = sorted_queued.index(req.id_task)
-            textinfo = "In queue: {}/{}".format(queue_index + 1, len(sorted_queued))
+            sorted_queued = queue.queued()
+            if req.id_task in sorted_queued:
+                queue_index = sorted_queued.index(req.id_task)
+                textinfo = "In queue: {}/{}".format(queue_index + 1, len(sorted_queued))
         return ProgressResponse(active=active, queued=queued, completed=completed, id_live_preview=-1, textinfo=textinfo)
 
     progress = 0
 
-    job_count, job_no = shared.state.job_count, shared.state.job_no
-    sampling_steps, sampling_step = shared.state.sampling_steps, shared.state.sampling_step
+    state = job_context.state_for(req.id_task) or shared.state
+    job_count, job_no = state.job_count, state.job_no
+    sampling_steps, sampling_step = state.sampling_steps, state.sampling_step
 
     if job_count > 0:
         progress += job_no / job_count
@@ -91,7 +79,7 @@ def progressapi(req: ProgressRequest):
 
     progress = min(progress, 1)
 
-    elapsed_since_start = time.time() - shared.state.time_start
+    elapsed_since_start = time.time() - state.time_start
     predicted_duration = elapsed_since_start / progress if progress > 0 else None
     eta = predicted_duration - elapsed_since_start if predicted_duration is not None else None
 
@@ -99,35 +87,22 @@ def progressapi(req: ProgressRequest):
     id_live_preview = req.id_live_preview
 
     if opts.live_previews_enable and req.live_preview:
-        shared.state.set_current_image()
-        if shared.state.id_live_preview != req.id_live_preview:
-            image = shared.state.current_image
+        state.set_current_image()
+        if state.id_live_preview != req.id_live_preview:
+            image = state.current_image
             if image is not None:
-                buffered = io.BytesIO()
-
-                if opts.live_previews_image_format == "png":
-                    # using optimize for large images takes an enormous amount of time
-                    if max(*image.size) <= 256:
-                        save_kwargs = {"optimize": True}
-                    else:
-                        save_kwargs = {"optimize": False, "compress_level": 1}
-
-                else:
-                    save_kwargs = {}
-
-                image.save(buffered, format=opts.live_previews_image_format, **save_kwargs)
-                base64_image = base64.b64encode(buffered.getvalue()).decode('ascii')
-                live_preview = f"data:image/{opts.live_previews_image_format};base64,{base64_image}"
-                id_live_preview = shared.state.id_live_preview
+                id_live_preview = state.id_live_preview
+                live_preview = previews.get(image, (id(state), id_live_preview))
 
-    return ProgressResponse(active=active, queued=queued, completed=completed, progress=progress, eta=eta, live_preview=live_preview, id_live_preview=id_live_preview, textinfo=shared.state.textinfo)
+    return ProgressResponse(active=active, queued=queued, completed=completed, progress=progress, eta=eta, live_preview=live_preview, id_live_preview=id_live_preview, textinfo=state.textinfo)
 
 
 def restore_progress(id_task):
-    while id_task == current_task or id_task in pending_tasks:
+    job = queue.get(id_task)
+    while job is not None and job.active:
         time.sleep(0.1)
 
-    res = next(iter([x[1] for x in recorded_results if id_task == x[0]]), None)
+    res = job.result if job is not None else None
     if res is not None:
         return res
 
@@ -0,0 +1,227 @@
+"""
+Push-based progress reporting.
+
+A single publisher thread watches shared.state and, whenever something changes, sends an event to every subscriber
+(Server-Sent Events or WebSocket connections of the API). A new live preview is encoded once for every distinct
+(format, size) requested by subscribers, and the encoded frame is shared by all of them and by polling endpoints,
+instead of being encoded again for each client on every poll.
+"""
+
+import asyncio
+import base64
+import io
+import threading
+import time
+from collections import OrderedDict
+
+from components import shared, job_context
+from utils import errors
+
+preview_formats = ("jpeg", "png", "webp")
+
+
+class PreviewCache:
+    """Keeps encoded frames of the latest live preview, keyed by (format, max size)."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.id_live_preview = None
+        self.frames = OrderedDict()
+
+    def get(self, image, id_live_preview, image_format=None, max_size=0):
+        """returns a data: uri with the image encoded in image_format, downscaled to fit into max_size if it's above 0"""
+
+        image_format = (image_format or shared.opts.live_previews_image_format).lower()
+        if image_format not in preview_formats:
+            image_format = shared.opts.live_previews_image_format
+
+        key = (image_format, max_size if max_size and max_size < max(image.size) else 0)
+
+        return self.cached(id_live_preview, key, lambda: encode_preview(image, *key))
+
+    def cached(self, id_live_preview, key, encode):
+        """returns the frame stored under key for the live preview, calling encode() to create it if there is none"""
+
+        with self.lock:
+            if self.id_live_preview != id_live_preview:
+                self.id_live_preview = id_live_preview
+                self.frames.clear()
+
+            frame = self.frames.get(key)
+            if frame is None:
+                frame = self.frames[key] = encode()
+
+        return frame
+
+
+def encode_preview(image, image_format, max_size=0):
+    if max_size:
+        image = image.copy()
+        image.thumbnail((max_size, max_size))
+
+    if image_format == "png":
+        # using optimize for large images takes an enormous amount of time
+        if max(*image.size) <= 256:
+            save_kwargs = {"optimize": True}
+        else:
+            save_kwargs = {"optimize": False, "compress_level": 1}
+    else:
+        save_kwargs = {}
+        if image.mode == "RGBA":
+            image = image.convert("RGB")
+
+    buffered = io.BytesIO()
+    image.save(buffered, format=image_format, **save_kwargs)
+    base64_image = base64.b64encode(buffered.getvalue()).decode('ascii')
+
+    return f"data:image/{image_format};base64,{base64_image}"
+
+
+previews = PreviewCache()
+
+
+def progress_snapshot(state):
+    """returns progress of the job using state as a dict; only values that change when the job advances are included"""
+
+    job_count, job_no = state.job_count, state.job_no
+    sampling_steps, sampling_step = state.sampling_steps, state.sampling_step
+
+    progress = 0
+    if job_count > 0:
+        progress += job_no / job_count
+    if sampling_steps > 0 and job_count > 0:
+        progress += 1 / job_count * sampling_step / sampling_steps
+    progress = min(progress, 1)
+
+    return {
+        "active": job_count > 0,
+        "job": state.job,
+        "job_no": job_no,
+        "job_count": job_count,
+        "sampling_step": sampling_step,
+        "sampling_steps": sampling_steps,
+        "progress": progress,
+        "textinfo": state.textinfo,
+        "interrupted": state.interrupted,
+        "skipped": state.skipped,
+    }
+
+
+def eta(state, progress):
+    if not progress or state.time_start is None:
+        return None
+
+    elapsed = time.time() - state.time_start
+    return elapsed / progress - elapsed
+
+
+class Subscriber:
+    """A connection receiving events. Events are put into an asyncio queue of the connection's event loop; if the client
+    doesn't keep up, older events are dropped so that it always gets the latest state."""
+
+    max_pending = 8
+    keepalive = 15
+    """seconds without events after which events() yields None, so that the connection can check that the client is still there"""
+
+    def __init__(self, loop, image_format=None, max_size=0, live_preview=True):
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=self.max_pending)
+        self.image_format = image_format
+        self.max_size = max_size
+        self.live_preview = live_preview
+
+    def push(self, event):
+        try:
+            self.loop.call_soon_threadsafe(self.put, event)
+        except RuntimeError:
+            # the event loop is closed; the connection is gone
+            pass
+
+    def put(self, event):
+        if self.queue.full():
+            self.queue.get_nowait()
+
+        self.queue.put_nowait(event)
+
+    async def events(self):
+        while True:
+            try:
+                yield await asyncio.wait_for(self.queue.get(), self.keepalive)
+            except asyncio.TimeoutError:
+                yield None
+
+
+class ProgressBroadcaster:
+    """Runs the publisher thread while there is at least one subscriber."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.subscribers = []
+        self.thread = None
+        self.last = None
+        self.last_preview = None
+
+    def subscribe(self, subscriber):
+        with self.lock:
+            self.subscribers.append(subscriber)
+
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, daemon=True, name="progress-broadcaster")
+                self.thread.start()
+
+        # a new subscriber gets the current state right away rather than with the next change
+        state = job_context.reported_state(shared.state)
+        snapshot = progress_snapshot(state)
+        subscriber.push({"type": "progress", **snapshot, "eta": eta(state, snapshot["progress"])})
+
+        image, id_live_preview = state.current_image, state.id_live_preview
+        if subscriber.live_preview and snapshot["active"] and image is not None:
+            subscriber.push({"type": "preview", "id_live_preview": id_live_preview, "image": previews.get(image, (id(state), id_live_preview), subscriber.image_format, subscriber.max_size)})
+
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self.lock:
+            if subscriber in self.subscribers:
+                self.subscribers.remove(subscriber)
+
+    def run(self):
+        while True:
+            with self.lock:
+                subscribers = list(self.subscribers)
+                if not subscribers:
+                    self.thread = None
+                    return
+
+            try:
+                self.publish(subscribers)
+            except Exception:
+                errors.report("Error sending progress updates", exc_info=True)
+
+            time.sleep(max(shared.opts.progress_stream_interval, 10) / 1000)
+
+    def publish(self, subscribers):
+        state = job_context.reported_state(shared.state)
+        snapshot = progress_snapshot(state)
+        if snapshot != self.last:
+            self.last = snapshot
+            event = {"type": "progress", **snapshot, "eta": eta(state, snapshot["progress"])}
+            for subscriber in subscribers:
+                subscriber.push(event)
+
+        if not shared.opts.live_previews_enable or not snapshot["active"]:
+            return
+
+        state.set_current_image()
+        image, id_live_preview = state.current_image, state.id_live_preview
+        if image is None or (id(state), id_live_preview) == self.last_preview:
+            return
+
+        self.last_preview = (id(state), id_live_preview)
+        for subscriber in subscribers:
+            if subscriber.live_preview:
+                frame = previews.get(image, self.last_preview, subscriber.image_format, subscriber.max_size)
+                subscriber.push({"type": "preview", "id_live_preview": id_live_preview, "image": frame})
+
+
+broadcaster = ProgressBroadcaster()
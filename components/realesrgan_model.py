@@ -1,12 +1,17 @@
 import os
 
 import numpy as np
+import torch
 from PIL import Image
-from realesrgan import RealESRGANer
 
-from components.upscaler import Upscaler, UpscalerData
+from components.upscaler import Upscaler, UpscalerData, models_cache
 from components.shared import cmd_opts, opts
-from components import modelloader, errors
+from components import modelloader, upscaler_utils
+from utils import errors
+
+
+pre_pad = 10
+"""pixels of reflection padding added at the right and bottom of images before upscaling, as RealESRGANer did, to avoid artifacts at the edges"""
 
 
 class UpscalerRealESRGAN(Upscaler):
@@ -42,26 +47,50 @@ class UpscalerRealESRGAN(Upscaler):
         if not self.enable:
             return img
 
+        half = not cmd_opts.no_half and not cmd_opts.upcast_sampling and self.device.type == 'cuda'
+        dtype = torch.float16 if half else torch.float32
+
         try:
             info = self.load_model(path)
         except Exception:
             errors.report(f"Unable to load RealESRGAN model {path}", exc_info=True)
             return img
 
-        upsampler = RealESRGANer(
-            scale=info.scale,
-            model_path=info.local_data_path,
-            model=info.model(),
-            half=not cmd_opts.no_half and not cmd_opts.upcast_sampling,
-            tile=opts.ESRGAN_tile,
-            tile_pad=opts.ESRGAN_tile_overlap,
-            device=self.device,
-        )
+        def load():
+            model = info.model()
+            state_dict = torch.load(info.local_data_path, map_location='cpu')
+            model.load_state_dict(state_dict['params_ema'] if 'params_ema' in state_dict else state_dict['params'], strict=True)
+            return model.eval().to(device=self.device, dtype=dtype)
+
+        try:
+            model = models_cache.get(path, self.device, load)
+        except Exception:
+            errors.report(f"Unable to load RealESRGAN model {path}", exc_info=True)
+            return img
+
+        if img.mode in ("RGBA", "LA") or (img.mode == "P" and "transparency" in img.info):
+            # like RealESRGANer, upscale alpha channel with the same model
+            alpha = img.convert("RGBA").getchannel("A").convert("RGB")
+            upscaled = self.upscale_padded(model, img.convert("RGB"), info.scale, dtype)
+            upscaled.putalpha(self.upscale_padded(model, alpha, info.scale, dtype).convert("L"))
+            return upscaled
+
+        return self.upscale_padded(model, img.convert("RGB"), info.scale, dtype)
+
+    def upscale_padded(self, model, img, scale, dtype):
+        """
+        Upscales an RGB image after padding it at the right and bottom by reflection, by pre_pad pixels and up to a
+        multiple of the factor by which 1x and 2x models pixel-unshuffle their input, then crops the padding off.
+        """
+
+        mod_scale = {1: 4, 2: 2}.get(scale, 1)
+        pad_h = pre_pad + (-(img.height + pre_pad)) % mod_scale
+        pad_w = pre_pad + (-(img.width + pre_pad)) % mod_scale
 
-        upsampled = upsampler.enhance(np.array(img), outscale=info.scale)[0]
+        padded = Image.fromarray(np.pad(np.asarray(img), ((0, pad_h), (0, pad_w), (0, 0)), mode="reflect"))
+        upscaled = upscaler_utils.upscale_with_model(model, padded, opts.ESRGAN_tile, opts.ESRGAN_tile_overlap, self.device, dtype)
 
-        image = Image.fromarray(upsampled)
-        return image
+        return upscaled.crop((0, 0, img.width * scale, img.height * scale))
 
     def load_model(self, path):
         for scaler in self.scalers:
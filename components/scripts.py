@@ -2,6 +2,7 @@ import os
 import re
 import sys
 import inspect
+import time
 from collections import namedtuple
 from dataclasses import dataclass
 
@@ -84,6 +85,17 @@ class Script:
 
         pass
 
+    def api_args(self, is_img2img):
+        """
+        Describes values returned by ui() without creating any gradio components; used when running API-only (--nowebui).
+
+        This function should return a list with a dict for every component that ui() returns, in the same order, with keys of
+        components.api.models.ScriptArg: label, value (the default value as run() or process() receive it), and, where they apply, minimum,
+        maximum, step and choices. If it returns None, API-only mode builds the script's UI to find its default values.
+        """
+
+        return None
+
     def show(self, is_img2img):
         """
         is_img2img is True if this function is called for the img2img interface, and Fasle otherwise
@@ -461,6 +473,7 @@ def load_scripts():
     # here the scripts_list is already ordered
     # processing_script is not considered though
     for scriptfile in scripts_list:
+        start = time.time()
         try:
             if scriptfile.basedir != paths.script_path:
                 sys.path = [scriptfile.basedir] + sys.path
@@ -475,7 +488,11 @@ def load_scripts():
         finally:
             sys.path = syspath
             current_basedir = paths.script_path
-            timer.startup_timer.record(scriptfile.filename)
+
+            # this runs concurrently with other startup steps, so time of each script is measured here instead of using
+            # startup_timer.record, which measures time since whatever was recorded last by any thread
+            startup_timer = timer.startup_timer
+            startup_timer.add_time_to_record(f"{startup_timer.base_category}load scripts/{scriptfile.filename}", time.time() - start)
 
     global scripts_txt2img, scripts_img2img, scripts_postproc
 
@@ -493,6 +510,23 @@ def wrap_call(func, filename, funcname, *args, default=None, **kwargs):
     return default
 
 
+def script_arg_from_control(control):
+    import components.api.models as api_models
+
+    arg_info = api_models.ScriptArg(label=control.label or "")
+
+    for field in ("value", "minimum", "maximum", "step"):
+        v = getattr(control, field, None)
+        if v is not None:
+            setattr(arg_info, field, v)
+
+    choices = getattr(control, 'choices', None)  # as of gradio 3.41, some items in choices are strings, and some are tuples where the first elem is the string
+    if choices is not None:
+        arg_info.choices = [x[0] if isinstance(x, tuple) else x for x in choices]
+
+    return arg_info
+
+
 class ScriptRunner:
     def __init__(self):
         self.scripts = []
@@ -504,6 +538,9 @@ class ScriptRunner:
         self.paste_field_names = []
         self.inputs = [None]
 
+        self.api_defaults = None
+        """default values for all script arguments if arguments were laid out by setup_api() rather than by UI"""
+
         self.on_before_component_elem_id = {}
         """dict of callbacks to be called before an element is created; key=elem_id, value=list of callbacks"""
 
@@ -570,7 +607,7 @@ class ScriptRunner:
             errors.report(f"Error creating UI for {script.name}: ", exc_info=True)
 
     def create_script_ui_inner(self, script):
-        import modules.api.models as api_models
+        import components.api.models as api_models
 
         controls = wrap_call(script.ui, script.filename, "ui", script.is_img2img)
 
@@ -583,19 +620,7 @@ class ScriptRunner:
 
         for control in controls:
             control.custom_script_source = os.path.basename(script.filename)
-
-            arg_info = api_models.ScriptArg(label=control.label or "")
-
-            for field in ("value", "minimum", "maximum", "step"):
-                v = getattr(control, field, None)
-                if v is not None:
-                    setattr(arg_info, field, v)
-
-            choices = getattr(control, 'choices', None)  # as of gradio 3.41, some items in choices are strings, and some are tuples where the first elem is the string
-            if choices is not None:
-                arg_info.choices = [x[0] if isinstance(x, tuple) else x for x in choices]
-
-            api_args.append(arg_info)
+            api_args.append(script_arg_from_control(control))
 
         script.api_info = api_models.ScriptInfo(
             name=script.name,
@@ -613,6 +638,67 @@ class ScriptRunner:
         self.inputs += controls
         script.args_to = len(self.inputs)
 
+    def setup_api(self):
+        """
+        Lays out arguments of scripts for use by API without creating UI, using api_args() of scripts. Scripts that don't
+        implement api_args() have their ui() called in a gr.Blocks that is never shown. Returns default values of all
+        arguments; position 0 is for the index of the selectable script to run.
+        """
+
+        import components.api.models as api_models
+
+        self.inputs = [None]
+        defaults = [0]
+
+        for script in self.alwayson_scripts + self.selectable_scripts:
+            script.args_from = len(defaults)
+            script.args_to = len(defaults)
+
+            try:
+                api_args = self.get_script_api_args(script)
+            except Exception:
+                errors.report(f"Error getting API arguments for {script.filename}: ", exc_info=True)
+                continue
+
+            if api_args is None:
+                continue
+
+            script.name = wrap_call(script.title, script.filename, "title", default=script.filename).lower()
+            script.api_info = api_models.ScriptInfo(
+                name=script.name,
+                is_img2img=script.is_img2img,
+                is_alwayson=script.alwayson,
+                args=api_args,
+            )
+
+            defaults += [arg.value for arg in api_args]
+            script.args_to = len(defaults)
+
+        all_titles = [wrap_call(script.title, script.filename, "title") or script.filename for script in self.scripts]
+        self.title_map = {title.lower(): script for title, script in zip(all_titles, self.scripts)}
+        self.titles = [wrap_call(script.title, script.filename, "title") or f"{script.filename} [error]" for script in self.selectable_scripts]
+
+        self.api_defaults = defaults
+        return defaults
+
+    @staticmethod
+    def get_script_api_args(script):
+        import components.api.models as api_models
+
+        declared = wrap_call(script.api_args, script.filename, "api_args", script.is_img2img)
+        if declared is not None:
+            return [api_models.ScriptArg(**arg) for arg in declared]
+
+        from components import gradio_extensons  # noqa: F401
+
+        with gr.Blocks():
+            controls = wrap_call(script.ui, script.filename, "ui", script.is_img2img)
+
+        if controls is None:
+            return None
+
+        return [script_arg_from_control(control) for control in controls]
+
     def setup_ui_for_section(self, section, scriptlist=None):
         if scriptlist is None:
             scriptlist = self.alwayson_scripts
@@ -631,6 +717,7 @@ class ScriptRunner:
 
     def prepare_ui(self):
         self.inputs = [None]
+        self.api_defaults = None
 
     def setup_ui(self):
         all_titles = [wrap_call(script.title, script.filename, "title") or script.filename for script in self.scripts]
@@ -696,8 +783,13 @@ class ScriptRunner:
         if script is None:
             return None
 
+        from utils.call_queue import queue_lock
+
         script_args = args[script.args_from:script.args_to]
-        processed = script.run(p, *script_args)
+
+        # selectable scripts often change settings directly, so they don't run concurrently with other jobs
+        with queue_lock.exclusive():
+            processed = script.run(p, *script_args)
 
         shared.total_tqdm.clear()
 
@@ -0,0 +1,108 @@
+import torch
+
+from components import shared
+
+import ldm.modules.diffusionmodules.openaimodel
+import sgm.modules.diffusionmodules.openaimodel
+
+
+class DeepCache:
+    """
+    Step-to-step reuse of deep UNet features (DeepCache). On full steps, the whole UNet is evaluated and the
+    input to the output block at the configured depth is remembered; on the steps in between, only the first
+    `depth` input blocks and the matching output blocks are evaluated, and the deep part of the network is
+    replaced with the remembered feature.
+    """
+
+    def __init__(self, interval, depth, warmup=0):
+        self.interval = interval
+        self.depth = depth
+        self.warmup = warmup
+
+        self.step = -1
+        self.call = 0
+        self.last_timesteps = None
+        self.cache = {}
+        """call -> (shape of x, remembered feature)"""
+
+    def reset(self):
+        """forgets remembered features; must be called when the model changes, e.g. when switching to the refiner"""
+
+        self.cache.clear()
+
+    def begin_call(self, timesteps):
+        """Returns True if this call to UNet must be a full one. A new sampling step is detected by a change of timesteps;
+        several calls with same timesteps (unbatched cond/uncond) each get their own cache slot."""
+
+        if self.last_timesteps is None or self.last_timesteps.shape != timesteps.shape or not torch.equal(self.last_timesteps, timesteps):
+            self.last_timesteps = timesteps.detach().clone()
+            self.step += 1
+            self.call = 0
+        else:
+            self.call += 1
+
+        return self.step < self.warmup or self.step % self.interval == 0
+
+    def forward(self, unet, x, timesteps=None, context=None, y=None, **kwargs):
+        module = sgm.modules.diffusionmodules.openaimodel if isinstance(unet, sgm.modules.diffusionmodules.openaimodel.UNetModel) else ldm.modules.diffusionmodules.openaimodel
+
+        depth = min(self.depth, len(unet.input_blocks) - 1)
+        full = self.begin_call(timesteps)
+
+        cached_shape, cached = self.cache.get(self.call, (None, None))
+        if not full and (cached is None or cached_shape != x.shape):
+            full = True
+
+        t_emb = module.timestep_embedding(timesteps, unet.model_channels, repeat_only=False)
+        emb = unet.time_embed(t_emb)
+        if unet.num_classes is not None:
+            assert y.shape[0] == x.shape[0]
+            emb = emb + unet.label_emb(y)
+
+        hs = []
+        h = x.type(unet.dtype)
+        input_blocks = unet.input_blocks if full else unet.input_blocks[:depth]
+        for block in input_blocks:
+            h = block(h, emb, context)
+            hs.append(h)
+
+        first_shallow_output = len(unet.output_blocks) - depth
+        if full:
+            h = unet.middle_block(h, emb, context)
+            for i, block in enumerate(unet.output_blocks):
+                if i == first_shallow_output:
+                    self.cache[self.call] = (x.shape, h)
+
+                h = module.th.cat([h, hs.pop()], dim=1)
+                h = block(h, emb, context)
+        else:
+            h = cached
+            for block in unet.output_blocks[first_shallow_output:]:
+                h = module.th.cat([h, hs.pop()], dim=1)
+                h = block(h, emb, context)
+
+        h = h.type(x.dtype)
+        if getattr(unet, 'predict_codebook_ids', False):
+            return unet.id_predictor(h)
+
+        return unet.out(h)
+
+
+current = None
+"""DeepCache object for the sampling that is currently running, or None if DeepCache is not in use"""
+
+
+def is_enabled():
+    return shared.opts.deepcache_interval > 1
+
+
+def activate():
+    global current
+
+    current = DeepCache(shared.opts.deepcache_interval, shared.opts.deepcache_depth, shared.opts.deepcache_warmup) if is_enabled() else None
+
+
+def deactivate():
+    global current
+
+    current = None
@@ -2,7 +2,7 @@ import torch
 from torch.nn.functional import silu
 from types import MethodType
 
-from components import shared, script_callbacks, patches,xlmr,xlmr_m18
+from components import shared, script_callbacks, patches,xlmr,xlmr_m18,import_hook,job_context
 from components.sd import sd_hijack_optimizations, sd_unet,sd_hijack_clip,sd_hijack_open_clip,sd_hijack_unet,sd_hijack_xlmr
 from utils import devices, errors
 from components.hypernetworks import hypernetwork
@@ -78,6 +78,10 @@ def apply_optimizations(option=None):
         current_optimizer = None
 
     selection = option or shared.opts.cross_attention_optimization
+    if selection == "Auto-tune":
+        # the fastest optimization for the resolution is picked by sd_hijack_autotune before each generation
+        selection = "Automatic"
+
     if selection == "Automatic" and len(optimizers) > 0:
         matching_optimizer = next(iter([x for x in optimizers if x.cmd_opt and getattr(shared.cmd_opts, x.cmd_opt, False)]), optimizers[0])
     else:
@@ -167,7 +171,9 @@ def undo_weighted_forward(sd_model):
 
 
 class StableDiffusionModelHijack:
-    fixes = None
+    fixes = job_context.job_local("fixes")
+    comments = job_context.job_local("comments", list)
+    extra_generation_params = job_context.job_local("extra_generation_params", dict)
     layers = None
     circular_enabled = False
     clip = None
@@ -230,7 +236,8 @@ class StableDiffusionModelHijack:
             else:
                 m.cond_stage_model = conditioner
 
-        if type(m.cond_stage_model) == xlmr.BertSeriesModelWithTransformation or type(m.cond_stage_model) == xlmr_m18.BertSeriesModelWithTransformation:
+        # xlmr modules are imported lazily; if they haven't been loaded, the model can't be using their classes
+        if (import_hook.is_loaded(xlmr) and type(m.cond_stage_model) == xlmr.BertSeriesModelWithTransformation) or (import_hook.is_loaded(xlmr_m18) and type(m.cond_stage_model) == xlmr_m18.BertSeriesModelWithTransformation):
             model_embeddings = m.cond_stage_model.roberta.embeddings
             model_embeddings.token_embedding = EmbeddingsWithFixes(model_embeddings.word_embeddings, self)
             m.cond_stage_model = sd_hijack_xlmr.FrozenXLMREmbedderWithCustomWords(m.cond_stage_model, self)
@@ -0,0 +1,168 @@
+import platform
+import time
+
+import torch
+
+from components import shared
+from components.sd import sd_hijack
+from utils import cache, devices, errors
+
+common_resolutions = [(512, 512), (768, 768), (1024, 1024), (512, 768), (768, 512)]
+"""resolutions benchmarked when auto-tuning is requested for the loaded model without specifying resolutions"""
+
+benchmark_batch_size = 2
+benchmark_repeats = 3
+context_tokens = 77
+
+
+def device_key():
+    if devices.device.type == 'cuda':
+        name = torch.cuda.get_device_name(devices.device)
+    else:
+        name = platform.processor() or platform.machine()
+
+    return f"{devices.device.type}/{name}/{torch.get_num_threads()} threads"
+
+
+def model_key(sd_model):
+    if getattr(sd_model, 'is_sdxl', False):
+        return "sdxl"
+    if getattr(sd_model, 'is_sd2', False):
+        return "sd2"
+
+    return "sd1"
+
+
+def shape_bucket(width, height):
+    """number of latent tokens in the highest resolution attention layer, rounded up to a power of two"""
+
+    tokens = max(width // 8, 1) * max(height // 8, 1)
+    return 1 << (tokens - 1).bit_length()
+
+
+def cache_key(sd_model, width, height):
+    return f"{device_key()}/{model_key(sd_model)}/{shape_bucket(width, height)}"
+
+
+def attention_shapes(sd_model, width, height):
+    """
+    Returns a list of (module, tokens, is_self_attention, count) for distinct cross attention modules of the model's UNet,
+    with the number of tokens each of them would process at the given resolution.
+    """
+
+    unet = sd_model.model.diffusion_model
+    channel_mult = list(getattr(unet, 'channel_mult', [1]))
+    latent_tokens = shape_bucket(width, height)
+
+    res = {}
+    for module in unet.modules():
+        if type(module).__name__ != 'CrossAttention':
+            continue
+
+        query_dim = module.to_q.in_features
+        context_dim = module.to_k.in_features
+        mult = query_dim // unet.model_channels
+        if mult not in channel_mult:
+            continue
+
+        level = channel_mult.index(mult)
+        key = (query_dim, context_dim, module.heads, level)
+        if key in res:
+            module, tokens, is_self_attention, count = res[key]
+            res[key] = (module, tokens, is_self_attention, count + 1)
+        else:
+            res[key] = (module, max(latent_tokens // (4 ** level), 1), query_dim == context_dim, 1)
+
+    return list(res.values())
+
+
+def synchronize():
+    if devices.device.type == 'cuda':
+        torch.cuda.synchronize(devices.device)
+    elif devices.device.type == 'mps' and hasattr(torch, 'mps'):
+        torch.mps.synchronize()
+
+
+def time_attention(shapes):
+    inputs = []
+    for module, tokens, is_self_attention, count in shapes:
+        x = torch.randn((benchmark_batch_size, tokens, module.to_q.in_features), device=devices.device, dtype=devices.dtype_unet)
+        context = None if is_self_attention else torch.randn((benchmark_batch_size, context_tokens, module.to_k.in_features), device=devices.device, dtype=devices.dtype_unet)
+        inputs.append((module, x, context, count))
+
+    total = 0.0
+    with torch.no_grad(), devices.autocast():
+        for module, x, context, count in inputs:
+            module(x, context=context)
+            synchronize()
+
+            start = time.perf_counter()
+            for _ in range(benchmark_repeats):
+                module(x, context=context)
+            synchronize()
+
+            total += (time.perf_counter() - start) / benchmark_repeats * count
+
+    return total
+
+
+def benchmark(sd_model, width, height):
+    """Times every available cross attention optimization on synthetic inputs shaped like the attention layers of the model
+    at the given resolution. Returns a dict of optimization title -> seconds per UNet call; failed optimizations are left out."""
+
+    shapes = attention_shapes(sd_model, width, height)
+    previous = sd_hijack.current_optimizer.title() if sd_hijack.current_optimizer is not None else "None"
+
+    timings = {}
+    try:
+        for optimizer in sd_hijack.optimizers:
+            sd_hijack.undo_optimizations()
+            try:
+                optimizer.apply()
+                timings[optimizer.title()] = time_attention(shapes)
+            except Exception as e:
+                errors.display(e, f"benchmarking cross attention optimization {optimizer.title()}", full_traceback=False)
+            finally:
+                optimizer.undo()
+                devices.torch_gc()
+    finally:
+        sd_hijack.model_hijack.apply_optimizations(previous)
+
+    return timings
+
+
+def tune(sd_model, width, height, force=False):
+    """Returns cached auto-tune results for the model at the given resolution, running the benchmark if there are none yet."""
+
+    results = cache.cache("attention-autotune")
+    key = cache_key(sd_model, width, height)
+
+    entry = results.get(key)
+    if entry is None or force or entry.get("winner") not in [x.title() for x in sd_hijack.optimizers]:
+        print(f"Benchmarking cross attention optimizations for {width}x{height}...")
+        timings = benchmark(sd_model, width, height)
+        if not timings:
+            return None
+
+        winner = min(timings, key=timings.get)
+        print(f"Fastest cross attention optimization for {width}x{height}: {winner}")
+
+        entry = {"winner": winner, "timings": timings}
+        results[key] = entry
+        cache.dump_cache()
+
+    return entry
+
+
+def apply(sd_model, width, height):
+    """Switches cross attention optimization to the fastest one for the resolution, if auto-tuning is enabled in settings."""
+
+    if shared.opts.cross_attention_optimization != "Auto-tune" or shared.cmd_opts.disable_opt_split_attention:
+        return
+
+    entry = tune(sd_model, width, height)
+    if entry is None:
+        return
+
+    if sd_hijack.current_optimizer is None or sd_hijack.current_optimizer.title() != entry["winner"]:
+        sd_hijack.model_hijack.apply_optimizations(entry["winner"])
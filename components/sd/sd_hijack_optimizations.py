@@ -1,5 +1,7 @@
 from __future__ import annotations
 import math
+import threading
+from typing import NamedTuple
 import psutil
 import platform
 
@@ -412,7 +414,7 @@ def sub_quad_attention_forward(self, x, context=None, mask=None, **kwargs):
     if shared.opts.upcast_attn:
         q, k = q.float(), k.float()
 
-    x = sub_quad_attention(q, k, v, q_chunk_size=shared.cmd_opts.sub_quad_q_chunk_size, kv_chunk_size=shared.cmd_opts.sub_quad_kv_chunk_size, chunk_threshold=shared.cmd_opts.sub_quad_chunk_threshold, use_checkpoint=self.training)
+    x = sub_quad_attention(q, k, v, **sub_quad_chunk_args(q, k, v), use_checkpoint=self.training)
 
     x = x.to(dtype)
 
@@ -425,6 +427,95 @@ def sub_quad_attention_forward(self, x, context=None, mask=None, **kwargs):
     return x
 
 
+class SubQuadChunking(NamedTuple):
+    q_chunk_size: int
+    kv_chunk_size: int
+    budget_bytes: int
+    peak_bytes: int
+
+
+sub_quad_chunking_cache: dict[tuple, SubQuadChunking] = {}
+sub_quad_chunking_lock = threading.Lock()
+
+
+def get_sub_quad_memory_budget(device):
+    if device.type == 'cpu' and shared.opts.sub_quad_cpu_memory_budget > 0:
+        return int(shared.opts.sub_quad_cpu_memory_budget * 1024 * 1024)
+
+    return int(get_available_vram() * 0.7)
+
+
+def estimate_sub_quad_peak_memory(batch_x_heads, q_tokens, k_tokens, v_channels, bytes_per_token, q_chunk_size, kv_chunk_size):
+    """estimated peak memory in bytes used by efficient_dot_product_attention for given shapes and chunk sizes, not counting q, k and v themselves"""
+
+    output_bytes = batch_x_heads * q_tokens * v_channels * bytes_per_token
+    q_chunk_size = min(q_chunk_size, q_tokens)
+
+    if kv_chunk_size >= k_tokens:
+        # attention scores and their softmax for one query chunk
+        return output_bytes + 2 * batch_x_heads * q_chunk_size * k_tokens * bytes_per_token
+
+    # weights and their exponent for one kv chunk, plus summaries of all kv chunks that are stacked together at the end
+    kv_chunks = math.ceil(k_tokens / kv_chunk_size)
+    chunk_bytes = 2 * batch_x_heads * q_chunk_size * kv_chunk_size * bytes_per_token
+    summaries_bytes = 2 * kv_chunks * batch_x_heads * q_chunk_size * (v_channels + 2) * bytes_per_token
+    return output_bytes + chunk_bytes + summaries_bytes
+
+
+def calculate_sub_quad_chunking(batch_x_heads, q_tokens, k_tokens, v_channels, bytes_per_token, budget_bytes):
+    """picks the largest chunks that fit into the memory budget: preferably no chunking, then query chunking only, then both"""
+
+    def peak(q_chunk_size, kv_chunk_size):
+        return estimate_sub_quad_peak_memory(batch_x_heads, q_tokens, k_tokens, v_channels, bytes_per_token, q_chunk_size, kv_chunk_size)
+
+    def power_of_two_sizes(limit):
+        size = 1 << max(limit - 1, 0).bit_length()
+        while size > 1:
+            size //= 2
+            yield size
+
+    if peak(q_tokens, k_tokens) <= budget_bytes:
+        return SubQuadChunking(q_tokens, k_tokens, budget_bytes, peak(q_tokens, k_tokens))
+
+    for q_chunk_size in power_of_two_sizes(q_tokens):
+        if q_chunk_size >= 64 and peak(q_chunk_size, k_tokens) <= budget_bytes:
+            return SubQuadChunking(q_chunk_size, k_tokens, budget_bytes, peak(q_chunk_size, k_tokens))
+
+    q_chunk_size = min(q_tokens, 1024)
+    for kv_chunk_size in power_of_two_sizes(k_tokens):
+        if peak(q_chunk_size, kv_chunk_size) <= budget_bytes:
+            return SubQuadChunking(q_chunk_size, kv_chunk_size, budget_bytes, peak(q_chunk_size, kv_chunk_size))
+
+    # nothing fits; use the smallest chunks that still do a reasonable amount of work per matmul
+    q_chunk_size, kv_chunk_size = min(q_tokens, 64), min(k_tokens, 64)
+    return SubQuadChunking(q_chunk_size, kv_chunk_size, budget_bytes, peak(q_chunk_size, kv_chunk_size))
+
+
+def sub_quad_chunk_args(q, k, v):
+    """keyword arguments with chunk sizes for sub_quad_attention: either taken from commandline, or computed from memory budget and cached per shape"""
+
+    if shared.opts.sub_quad_chunking != "Memory budget":
+        return dict(q_chunk_size=shared.cmd_opts.sub_quad_q_chunk_size, kv_chunk_size=shared.cmd_opts.sub_quad_kv_chunk_size, chunk_threshold=shared.cmd_opts.sub_quad_chunk_threshold)
+
+    bytes_per_token = torch.finfo(q.dtype).bits // 8
+    batch_x_heads, q_tokens, _ = q.shape
+    k_tokens = k.shape[1]
+    v_channels = v.shape[2]
+
+    # budget is rounded down to a power of two so that small fluctuations in free memory do not invalidate the cache
+    budget_bytes = get_sub_quad_memory_budget(q.device)
+    budget_bytes = 1 << (max(budget_bytes, 1).bit_length() - 1)
+
+    key = (q.device.type, batch_x_heads, q_tokens, k_tokens, v_channels, bytes_per_token, budget_bytes)
+    chunking = sub_quad_chunking_cache.get(key)
+    if chunking is None:
+        chunking = calculate_sub_quad_chunking(batch_x_heads, q_tokens, k_tokens, v_channels, bytes_per_token, budget_bytes)
+        with sub_quad_chunking_lock:
+            sub_quad_chunking_cache[key] = chunking
+
+    return dict(q_chunk_size=chunking.q_chunk_size, kv_chunk_size=chunking.kv_chunk_size, kv_chunk_size_min=None, chunk_threshold=0)
+
+
 def sub_quad_attention(q, k, v, q_chunk_size=1024, kv_chunk_size=None, kv_chunk_size_min=None, chunk_threshold=None, use_checkpoint=True):
     bytes_per_token = torch.finfo(q.dtype).bits//8
     batch_x_heads, q_tokens, _ = q.shape
@@ -670,7 +761,7 @@ def sub_quad_attnblock_forward(self, x):
     q = q.contiguous()
     k = k.contiguous()
     v = v.contiguous()
-    out = sub_quad_attention(q, k, v, q_chunk_size=shared.cmd_opts.sub_quad_q_chunk_size, kv_chunk_size=shared.cmd_opts.sub_quad_kv_chunk_size, chunk_threshold=shared.cmd_opts.sub_quad_chunk_threshold, use_checkpoint=self.training)
+    out = sub_quad_attention(q, k, v, **sub_quad_chunk_args(q, k, v), use_checkpoint=self.training)
     out = rearrange(out, 'b (h w) c -> b c h w', h=h)
     out = self.proj_out(out)
     return x + out
@@ -2,6 +2,7 @@ import collections
 import os.path
 import sys
 import threading
+import time
 
 import torch
 import re
@@ -15,7 +16,7 @@ from ldm.util import instantiate_from_config
 
 from components import paths, shared, modelloader, script_callbacks, hashes, extra_networks, processing, patches
 from utils import devices, errors, cache, lowvram
-from components.sd import sd_vae, sd_disable_initialization, sd_models_config,sd_unet, sd_models_xl, sd_hijack
+from components.sd import sd_vae, sd_disable_initialization, sd_models_config,sd_unet, sd_models_xl, sd_hijack, sd_shared_weights
 from utils.timer import Timer
 import tomesd
 import numpy as np
@@ -321,6 +322,12 @@ def get_checkpoint_state_dict(checkpoint_info: CheckpointInfo, timer):
     sd_model_hash = checkpoint_info.calculate_shorthash()
     timer.record("calculate hash")
 
+    if sd_shared_weights.enabled():
+        print(f"Mapping weights [{sd_model_hash}] from {checkpoint_info.filename}")
+        res = sd_shared_weights.read_state_dict(checkpoint_info)
+        timer.record("map weights from disk")
+        return res
+
     if checkpoint_info in checkpoints_loaded:
         # use checkpoint cache
         print(f"Loading weights [{sd_model_hash}] from cache")
@@ -370,11 +377,16 @@ def load_model_weights(model, checkpoint_info: CheckpointInfo, state_dict, timer
     if model.is_ssd:
         sd_hijack.model_hijack.convert_sdxl_to_ssd(model)
 
-    if shared.opts.sd_checkpoint_cache > 0:
+    is_shared = isinstance(state_dict, sd_shared_weights.SharedStateDict)
+
+    if shared.opts.sd_checkpoint_cache > 0 and not is_shared:
         # cache newly loaded model
         checkpoints_loaded[checkpoint_info] = state_dict.copy()
 
-    model.load_state_dict(state_dict, strict=False)
+    if is_shared:
+        sd_shared_weights.assign(model, state_dict)
+    else:
+        model.load_state_dict(state_dict, strict=False)
     timer.record("apply weights to model")
 
     del state_dict
@@ -748,10 +760,20 @@ def reuse_model_from_already_loaded(sd_model, checkpoint_info, timer):
         return None
 
 
+checkpoint_swaps = {"count": 0, "time": 0.0}
+"""number of times reload_model_weights switched to another checkpoint, and total time it took, in seconds"""
+
+
+def record_checkpoint_swap(start):
+    checkpoint_swaps["count"] += 1
+    checkpoint_swaps["time"] += time.perf_counter() - start
+
+
 def reload_model_weights(sd_model=None, info=None):
     checkpoint_info = info or select_checkpoint()
 
     timer = Timer()
+    start = time.perf_counter()
 
     if not sd_model:
         sd_model = model_data.sd_model
@@ -783,6 +805,7 @@ def reload_model_weights(sd_model=None, info=None):
             send_model_to_trash(sd_model)
 
         load_model(checkpoint_info, already_loaded_state_dict=state_dict)
+        record_checkpoint_swap(start)
         return model_data.sd_model
 
     try:
@@ -807,6 +830,8 @@ def reload_model_weights(sd_model=None, info=None):
     model_data.set_sd_model(sd_model)
     sd_unet.apply_unet()
 
+    record_checkpoint_swap(start)
+
     return sd_model
 
 
@@ -3,9 +3,9 @@ from collections import namedtuple
 import numpy as np
 import torch
 from PIL import Image
-from components import  images,shared
-from components.sd import sd_vae_approx, sd_samplers, sd_vae_taesd, sd_models
-from components.shared import opts, state
+from components import  images,shared,live_preview
+from components.sd import sd_vae_approx, sd_samplers, sd_vae_taesd, sd_models, sd_deepcache
+from components.shared import opts
 from utils import devices
 import k_diffusion.sampling
 
@@ -115,11 +115,13 @@ def images_tensor_to_samples(image, approximation=None, model=None):
 
 
 def store_latent(decoded):
-    state.current_latent = decoded
+    shared.state.current_latent = decoded
 
     if opts.live_previews_enable and opts.show_progress_every_n_steps > 0 and shared.state.sampling_step % opts.show_progress_every_n_steps == 0:
         if not shared.parallel_processing_allowed:
             shared.state.assign_current_image(sample_to_image(decoded))
+        elif live_preview.renderer.enabled() and not shared.state.concurrent:
+            live_preview.renderer.submit(decoded, shared.state.sampling_step)
 
 
 def is_sampler_using_eta_noise_seed_delta(p):
@@ -186,6 +188,9 @@ def apply_refiner(cfg_denoiser):
     with sd_models.SkipWritingToConfig():
         sd_models.reload_model_weights(info=refiner_checkpoint_info)
 
+    if sd_deepcache.current is not None:
+        sd_deepcache.current.reset()
+
     devices.torch_gc()
     cfg_denoiser.p.setup_conds()
     cfg_denoiser.update_inner_model()
@@ -250,14 +255,16 @@ class Sampler:
         if self.stop_at is not None and step > self.stop_at:
             raise InterruptedException
 
-        state.sampling_step = step
+        shared.state.sampling_step = step
         shared.total_tqdm.update()
 
     def launch_sampling(self, steps, func):
         self.model_wrap_cfg.steps = steps
         self.model_wrap_cfg.total_steps = self.config.total_steps(steps)
-        state.sampling_steps = steps
-        state.sampling_step = 0
+        shared.state.sampling_steps = steps
+        shared.state.sampling_step = 0
+
+        sd_deepcache.activate()
 
         try:
             return func()
@@ -270,6 +277,8 @@ class Sampler:
             return self.last_latent
         except InterruptedException:
             return self.last_latent
+        finally:
+            sd_deepcache.deactivate()
 
     def number_of_needed_noises(self, p):
         return p.steps
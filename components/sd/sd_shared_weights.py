@@ -0,0 +1,233 @@
+"""
+Loading of checkpoint weights as tensors backed by a memory-mapped file, so that several webui processes on one host that
+use the same checkpoint share its weights in RAM instead of each keeping a private copy.
+
+The file is mapped copy-on-write: all processes read the same pages from the OS page cache, and a process that changes
+a weight in place (for example, when applying a Lora) only gets a private copy of the pages it changed. If a safetensors
+checkpoint already has weights in the dtypes the model uses, the checkpoint file itself is mapped; otherwise weights are
+converted once into a cache file with every tensor aligned to a page boundary, and the cache file is mapped.
+"""
+
+import glob
+import hashlib
+import json
+import mmap
+import os
+import re
+import struct
+
+import numpy as np
+import torch
+
+from components import shared
+from components.sd import sd_models
+from utils import devices
+
+dtypes = {
+    "F64": torch.float64,
+    "F32": torch.float32,
+    "F16": torch.float16,
+    "BF16": torch.bfloat16,
+    "I64": torch.int64,
+    "I32": torch.int32,
+    "I16": torch.int16,
+    "I8": torch.int8,
+    "U8": torch.uint8,
+    "BOOL": torch.bool,
+}
+"""safetensors dtype names -> torch dtypes"""
+
+alignment = max(mmap.ALLOCATIONGRANULARITY, 4096)
+
+
+class SharedStateDict(dict):
+    """state dict with tensors backed by a memory-mapped file"""
+
+    def __init__(self, *args, filename=None):
+        super().__init__(*args)
+        self.filename = filename
+
+
+def enabled():
+    return shared.cmd_opts.shared_weights
+
+
+def cache_dir():
+    return shared.cmd_opts.shared_weights_dir or os.path.join(shared.cmd_opts.ckpt_dir or sd_models.model_path, "SharedWeights")
+
+
+def target_dtype(key):
+    """dtype the model will use for the weight, mirroring what load_model_weights does; None means the dtype is not changed"""
+
+    first_term = key.split('.', 1)[0]
+    if first_term == 'first_stage_model':
+        return devices.dtype_vae
+    if shared.cmd_opts.no_half:
+        return torch.float32
+    if first_term == 'depth_model' and shared.cmd_opts.upcast_sampling:
+        return None
+
+    return torch.float16
+
+
+def converted_dtype(key, dtype):
+    if not dtype.is_floating_point:
+        return dtype
+
+    return target_dtype(key) or dtype
+
+
+def map_tensors(filename, layout):
+    """returns a dict of tensors using memory of a copy-on-write mapping of the file; layout is a dict of key -> (dtype, shape, offset)"""
+
+    buffer = np.memmap(filename, dtype=np.uint8, mode='c')
+
+    res = {}
+    for key, (dtype, shape, offset) in layout.items():
+        count = int(np.prod(shape)) if shape else 1
+        tensor = torch.frombuffer(buffer, dtype=dtype, count=count, offset=offset) if count else torch.empty(0, dtype=dtype)
+        res[key] = tensor.view(shape)
+
+    return res
+
+
+def read_safetensors_layout(filename):
+    with open(filename, "rb") as file:
+        header_len = struct.unpack("<Q", file.read(8))[0]
+        header = json.loads(file.read(header_len))
+
+    data_start = 8 + header_len
+
+    res = {}
+    for key, entry in header.items():
+        if key == "__metadata__":
+            continue
+
+        res[key] = (dtypes[entry["dtype"]], tuple(entry["shape"]), data_start + entry["data_offsets"][0])
+
+    return res
+
+
+def cache_filename(checkpoint_info):
+    stat = os.stat(checkpoint_info.filename)
+    description = f"{checkpoint_info.filename}:{stat.st_mtime}:{stat.st_size}:{devices.dtype_vae}:{shared.cmd_opts.no_half}:{shared.cmd_opts.upcast_sampling}"
+    digest = hashlib.sha256(description.encode("utf8")).hexdigest()[:16]
+    name = os.path.splitext(os.path.basename(checkpoint_info.filename))[0]
+
+    # hash of the path keeps caches of checkpoints with the same name in other directories or with other extensions apart
+    path_digest = hashlib.sha256(os.path.abspath(checkpoint_info.filename).encode("utf8")).hexdigest()[:8]
+
+    return os.path.join(cache_dir(), f"{name}-{path_digest}-{digest}.weights")
+
+
+def write_cache(filename, state_dict):
+    """
+    Writes state_dict into filename: 8 bytes with length of the JSON header, the JSON header with dtype, shape and offset of
+    every tensor, and then data of tensors, each starting at a multiple of alignment.
+    """
+
+    entries = {}
+    offset = 0
+    for key, tensor in state_dict.items():
+        dtype = converted_dtype(key, tensor.dtype)
+        size = tensor.numel() * torch.empty(0, dtype=dtype).element_size()
+        entries[key] = {"dtype": str(dtype).replace("torch.", ""), "shape": list(tensor.shape), "offset": offset}
+        offset += (size + alignment - 1) // alignment * alignment
+
+    header = json.dumps(entries).encode("utf8")
+    data_start = (8 + len(header) + alignment - 1) // alignment * alignment
+
+    os.makedirs(os.path.dirname(filename), exist_ok=True)
+    filename_tmp = f"{filename}.{os.getpid()}.tmp"
+    with open(filename_tmp, "wb") as file:
+        file.write(struct.pack("<Q", len(header)))
+        file.write(header)
+
+        for key, tensor in state_dict.items():
+            file.seek(data_start + entries[key]["offset"])
+            tensor = tensor.to(dtype=converted_dtype(key, tensor.dtype)).contiguous()
+            file.write(tensor.reshape(-1).view(torch.uint8).numpy().tobytes())
+
+        file.truncate(data_start + offset)
+
+    os.replace(filename_tmp, filename)
+
+
+def read_cache_layout(filename):
+    with open(filename, "rb") as file:
+        header_len = struct.unpack("<Q", file.read(8))[0]
+        header = json.loads(file.read(header_len))
+
+    data_start = (8 + header_len + alignment - 1) // alignment * alignment
+
+    return {key: (getattr(torch, entry["dtype"]), tuple(entry["shape"]), data_start + entry["offset"]) for key, entry in header.items()}
+
+
+def remove_stale_caches(filename):
+    """removes cache files made from earlier versions of the same checkpoint file or for other dtypes"""
+
+    prefix = os.path.basename(filename).rsplit("-", 1)[0]
+    for stale in glob.glob(os.path.join(os.path.dirname(filename), glob.escape(prefix) + "-*.weights")):
+        if stale == filename or not re.fullmatch(re.escape(prefix) + r"-[0-9a-f]{16}\.weights", os.path.basename(stale)):
+            continue
+
+        try:
+            os.remove(stale)
+        except OSError:
+            pass  # still mapped by another process on Windows
+
+
+def read_state_dict(checkpoint_info):
+    """returns a SharedStateDict with weights of the checkpoint in the dtypes the model will use"""
+
+    if os.path.splitext(checkpoint_info.filename)[1].lower() == ".safetensors":
+        try:
+            layout = read_safetensors_layout(checkpoint_info.filename)
+        except KeyError:
+            layout = None  # unusual dtype; the cache will be made from what safetensors library reads
+
+        if layout is not None:
+            # mapping doesn't read anything yet, so it's cheap even if it turns out the dtypes are wrong
+            state_dict = sd_models.get_state_dict_from_checkpoint(map_tensors(checkpoint_info.filename, layout))
+            if all(converted_dtype(key, tensor.dtype) == tensor.dtype for key, tensor in state_dict.items()):
+                return SharedStateDict(state_dict, filename=checkpoint_info.filename)
+
+            del state_dict
+
+    filename = cache_filename(checkpoint_info)
+    if not os.path.isfile(filename):
+        print(f"Converting weights of {checkpoint_info.filename} for sharing between processes into {filename}")
+
+        state_dict = sd_models.read_state_dict(checkpoint_info.filename, map_location="cpu")
+        write_cache(filename, state_dict)
+        del state_dict
+
+        remove_stale_caches(filename)
+
+    return SharedStateDict(map_tensors(filename, read_cache_layout(filename)), filename=filename)
+
+
+def assign(model, state_dict):
+    """
+    Makes parameters and buffers of the model use tensors from state_dict as they are, without copying them, which is what
+    load_state_dict would do. Parameters missing from state_dict that are still on meta device are replaced with zeros.
+    """
+
+    for module_name, module in model.named_modules():
+        prefix = f"{module_name}." if module_name else ""
+
+        for collection in (module._parameters, module._buffers):
+            for name, value in list(collection.items()):
+                if value is None:
+                    continue
+
+                tensor = state_dict.get(prefix + name)
+                if tensor is None:
+                    if value.is_meta:
+                        tensor = torch.zeros_like(value, device=devices.cpu)
+                    else:
+                        continue
+                elif tensor.shape != value.shape:
+                    raise RuntimeError(f"size mismatch for {prefix + name}: shape in checkpoint is {tuple(tensor.shape)}, shape in model is {tuple(value.shape)}")
+
+                collection[name] = torch.nn.Parameter(tensor, requires_grad=value.requires_grad) if collection is module._parameters else tensor
@@ -1,6 +1,7 @@
 import torch.nn
 
 from components import script_callbacks, shared
+from components.sd import sd_deepcache
 from utils import devices
 
 unet_options = []
@@ -89,6 +90,9 @@ def create_unet_forward(original_forward):
         if current_unet is not None:
             return current_unet.forward(x, timesteps, context, *args, **kwargs)
 
+        if sd_deepcache.current is not None and not args:
+            return sd_deepcache.current.forward(self, x, timesteps, context, **kwargs)
+
         return original_forward(self, x, timesteps, context, *args, **kwargs)
 
     return UNetModel_forward
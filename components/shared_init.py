@@ -37,9 +37,6 @@ def initialize():
     from components import styles
     shared.prompt_styles = styles.StyleDatabase(shared.styles_filename)
 
-    from components import interrogate
-    shared.interrogator = interrogate.InterrogateModels("interrogate")
-
     from components import shared_total_tqdm
     shared.total_tqdm = shared_total_tqdm.TotalTQDM()
 
@@ -29,7 +29,7 @@ def refresh_vae_list():
 def cross_attention_optimizations():
     import components.sd.sd_hijack
 
-    return ["Automatic"] + [x.title() for x in components.sd.sd_hijack.optimizers] + ["None"]
+    return ["Automatic", "Auto-tune"] + [x.title() for x in components.sd.sd_hijack.optimizers] + ["None"]
 
 
 def sd_unet_items():
@@ -115,8 +115,8 @@ def ui_reorder_categories():
 
 class Shared(sys.modules[__name__].__class__):
     """
-    this class is here to provide sd_model field as a property, so that it can be created and loaded on demand rather than
-    at program startup.
+    this class is here to provide sd_model and interrogator fields as properties, so that they can be created and loaded on
+    demand rather than at program startup, and state as a property, so that jobs running concurrently each have their own.
     """
 
     sd_model_val = None
@@ -133,5 +133,37 @@ class Shared(sys.modules[__name__].__class__):
 
         components.sd.sd_models.model_data.set_sd_model(value)
 
+    state_val = None
+
+    @property
+    def state(self):
+        """State of the concurrent job running on this thread, or the global State"""
+
+        from components import job_context
+
+        context = job_context.current()
+        return self.state_val if context is None else context.state
+
+    @state.setter
+    def state(self, value):
+        self.state_val = value
+
+    interrogator_val = None
+
+    @property
+    def interrogator(self):
+        """created on first use, so that the interrogate module isn't imported unless something needs it"""
+
+        if self.interrogator_val is None:
+            from components import interrogate
+
+            self.interrogator_val = interrogate.InterrogateModels("interrogate")
+
+        return self.interrogator_val
+
+    @interrogator.setter
+    def interrogator(self, value):
+        self.interrogator_val = value
+
 
 sys.modules['components.shared'].__class__ = Shared
@@ -95,6 +95,8 @@ options_templates.update(options_section(('saving-to-dirs', "Saving to a directo
 options_templates.update(options_section(('upscaling', "Upscaling", "postprocessing"), {
     "ESRGAN_tile": OptionInfo(192, "Tile size for ESRGAN upscalers.", gr.Slider, {"minimum": 0, "maximum": 512, "step": 16}).info("0 = no tiling"),
     "ESRGAN_tile_overlap": OptionInfo(8, "Tile overlap for ESRGAN upscalers.", gr.Slider, {"minimum": 0, "maximum": 48, "step": 1}).info("Low values = visible seam"),
+    "upscaler_tile_batch_size": OptionInfo(0, "Tile batch size for ESRGAN upscalers", gr.Slider, {"minimum": 0, "maximum": 64, "step": 1}).info("number of tiles processed by the model at once; 0 = pick from free memory"),
+    "upscaler_models_cache_mb": OptionInfo(1024, "Memory budget for keeping loaded upscaler models (MB)", gr.Number).info("least recently used models are unloaded when loaded models take more; the model in use is always kept"),
     "realesrgan_enabled_models": OptionInfo(["R-ESRGAN 4x+", "R-ESRGAN 4x+ Anime6B"], "Select which Real-ESRGAN models to show in the web UI.", gr.CheckboxGroup, lambda: {"choices": shared_items.realesrgan_models_names()}),
     "upscaler_for_img2img": OptionInfo(None, "Upscaler for img2img", gr.Dropdown, lambda: {"choices": [x.name for x in shared.sd_upscalers]}),
 }))
@@ -104,6 +106,7 @@ options_templates.update(options_section(('face-restoration', "Face restoration"
     "face_restoration_model": OptionInfo("CodeFormer", "Face restoration model", gr.Radio, lambda: {"choices": [x.name() for x in shared.face_restorers]}),
     "code_former_weight": OptionInfo(0.5, "CodeFormer weight", gr.Slider, {"minimum": 0, "maximum": 1, "step": 0.01}).info("0 = maximum effect; 1 = minimum effect"),
     "face_restoration_unload": OptionInfo(False, "Move face restoration model from VRAM into RAM after processing"),
+    "face_restoration_batch_size": OptionInfo(16, "Face restoration batch size", gr.Slider, {"minimum": 1, "maximum": 64, "step": 1}).info("maximum number of faces restored in one pass of the model"),
 }))
 
 options_templates.update(options_section(('system', "System", "system"), {
@@ -119,12 +122,17 @@ options_templates.update(options_section(('system', "System", "system"), {
     "disable_mmap_load_safetensors": OptionInfo(False, "Disable memmapping for loading .safetensors files.").info("fixes very slow loading speed in some cases"),
     "hide_ldm_prints": OptionInfo(True, "Prevent Stability-AI's ldm/sgm modules from printing noise to console."),
     "dump_stacks_on_signal": OptionInfo(False, "Print stack traces before exiting the program with ctrl+c."),
+    "cpu_concurrent_jobs": OptionInfo(1, "Number of generation jobs to run at the same time when generating on CPU", gr.Slider, {"minimum": 1, "maximum": 16, "step": 1}).info("CPU cores are split evenly between jobs; jobs that change settings, the checkpoint, token merging or tiling, jobs using extra networks, hypernetworks, DeepCache or face restoration, and jobs using scripts from the dropdown, still run alone"),
 }))
 
 options_templates.update(options_section(('API', "API", "system"), {
     "api_enable_requests": OptionInfo(True, "Allow http:// and https:// URLs for input images in API", restrict_api=True),
     "api_forbid_local_requests": OptionInfo(True, "Forbid URLs to local resources", restrict_api=True),
     "api_useragent": OptionInfo("", "User agent for requests", restrict_api=True),
+    "job_queue_max_per_client": OptionInfo(0, "Maximum number of unfinished queued API jobs per client", gr.Number, restrict_api=True).info("0 = unlimited; client is identified by X-Client-Id header or by address"),
+    "job_queue_affinity_max_wait": OptionInfo(120, "Run queued API jobs that use the already loaded checkpoint first, for jobs waiting less than (seconds)", gr.Number, restrict_api=True).info("reduces checkpoint swaps; 0 = always run jobs in order"),
+    "job_queue_keep_results": OptionInfo(16, "Number of finished jobs to keep results for", gr.Slider, {"minimum": 1, "maximum": 256, "step": 1}),
+    "job_queue_result_ttl": OptionInfo(30, "Time to keep results of finished jobs (minutes)", gr.Number).info("0 = until pushed out by newer jobs"),
 }))
 
 options_templates.update(options_section(('training', "Training", "training"), {
@@ -194,17 +202,24 @@ options_templates.update(options_section(('img2img', "img2img", "sd"), {
     "img2img_inpaint_sketch_default_brush_color": OptionInfo("#ffffff", "Inpaint sketch initial brush color", ui_components.FormColorPicker, {}).info("default brush color of img2img inpaint sketch").needs_reload_ui(),
     "return_mask": OptionInfo(False, "For inpainting, include the greyscale mask in results for web"),
     "return_mask_composite": OptionInfo(False, "For inpainting, include masked composite in results for web"),
+    "img2img_batch_resume": OptionInfo(False, "Resume interrupted img2img batches").info("inputs listed in img2img-batch-manifest.jsonl in the output directory as done with the same prompts and settings are skipped; delete it to process everything again"),
+    "img2img_batch_prefetch": OptionInfo(2, "Number of images to load ahead in img2img batch", gr.Slider, {"minimum": 1, "maximum": 16, "step": 1}),
     "img2img_batch_show_results_limit": OptionInfo(32, "Show the first N batch img2img results in UI", gr.Slider, {"minimum": -1, "maximum": 1000, "step": 1}).info('0: disable, -1: show all images. Too many images can cause lag'),
 }))
 
 options_templates.update(options_section(('optimizations', "Optimizations", "sd"), {
-    "cross_attention_optimization": OptionInfo("Automatic", "Cross attention optimization", gr.Dropdown, lambda: {"choices": shared_items.cross_attention_optimizations()}),
+    "cross_attention_optimization": OptionInfo("Automatic", "Cross attention optimization", gr.Dropdown, lambda: {"choices": shared_items.cross_attention_optimizations()}).info("Auto-tune = benchmark available optimizations for the loaded model and use the fastest one for each resolution"),
+    "sub_quad_chunking": OptionInfo("Commandline", "Sub-quadratic attention chunk sizes", gr.Radio, {"choices": ["Commandline", "Memory budget"]}).info("Commandline = use --sub-quad-q-chunk-size, --sub-quad-kv-chunk-size and --sub-quad-chunk-threshold; Memory budget = pick largest chunks that fit into available memory for each shape"),
+    "sub_quad_cpu_memory_budget": OptionInfo(0, "Sub-quadratic attention memory budget on CPU", gr.Number, {"precision": 0}).info("in megabytes; used with Memory budget chunk sizes; 0 = 70% of available RAM"),
     "s_min_uncond": OptionInfo(0.0, "Negative Guidance minimum sigma", gr.Slider, {"minimum": 0.0, "maximum": 15.0, "step": 0.01}).link("PR", "https://github.com/AUTOMATIC1111/stable-diffusion-webui/pull/9177").info("skip negative prompt for some steps when the image is almost ready; 0=disable, higher=faster"),
     "token_merging_ratio": OptionInfo(0.0, "Token merging ratio", gr.Slider, {"minimum": 0.0, "maximum": 0.9, "step": 0.1}, infotext='Token merging ratio').link("PR", "https://github.com/AUTOMATIC1111/stable-diffusion-webui/pull/9256").info("0=disable, higher=faster"),
     "token_merging_ratio_img2img": OptionInfo(0.0, "Token merging ratio for img2img", gr.Slider, {"minimum": 0.0, "maximum": 0.9, "step": 0.1}).info("only applies if non-zero and overrides above"),
     "token_merging_ratio_hr": OptionInfo(0.0, "Token merging ratio for high-res pass", gr.Slider, {"minimum": 0.0, "maximum": 0.9, "step": 0.1}, infotext='Token merging ratio hr').info("only applies if non-zero and overrides above"),
     "pad_cond_uncond": OptionInfo(False, "Pad prompt/negative prompt to be same length", infotext='Pad conds').info("improves performance when prompt and negative prompt have different lengths; changes seeds"),
     "persistent_cond_cache": OptionInfo(True, "Persistent cond cache").info("do not recalculate conds from prompts if prompts have not changed since previous calculation"),
+    "deepcache_interval": OptionInfo(1, "DeepCache interval", gr.Slider, {"minimum": 1, "maximum": 10, "step": 1}, infotext='DeepCache interval').info("reuse deep UNet features between steps; only every N-th step runs the full UNet; 1=disable, higher=faster"),
+    "deepcache_depth": OptionInfo(3, "DeepCache depth", gr.Slider, {"minimum": 1, "maximum": 11, "step": 1}, infotext='DeepCache depth').info("number of shallow UNet blocks recomputed on cached steps; lower=faster, higher=closer to full quality"),
+    "deepcache_warmup": OptionInfo(0, "DeepCache warmup steps", gr.Slider, {"minimum": 0, "maximum": 50, "step": 1}, infotext='DeepCache warmup').info("always run the full UNet for this many first steps"),
     "batch_cond_uncond": OptionInfo(True, "Batch cond/uncond").info("do both conditional and unconditional denoising in one batch; uses a bit more VRAM during sampling, but improves speed; previously this was controlled by --always-batch-cond-uncond comandline argument"),
 }))
 
@@ -225,7 +240,7 @@ options_templates.update(options_section(('interrogate', "Interrogate"), {
     "interrogate_clip_min_length": OptionInfo(24, "BLIP: minimum description length", gr.Slider, {"minimum": 1, "maximum": 128, "step": 1}),
     "interrogate_clip_max_length": OptionInfo(48, "BLIP: maximum description length", gr.Slider, {"minimum": 1, "maximum": 256, "step": 1}),
     "interrogate_clip_dict_limit": OptionInfo(1500, "CLIP: maximum number of lines in text file").info("0 = No limit"),
-    "interrogate_clip_skip_categories": OptionInfo([], "CLIP: skip inquire categories", gr.CheckboxGroup, lambda: {"choices": interrogate.category_types()}, refresh=interrogate.category_types),
+    "interrogate_clip_skip_categories": OptionInfo([], "CLIP: skip inquire categories", gr.CheckboxGroup, lambda: {"choices": interrogate.category_types()}, refresh=lambda: interrogate.category_types()),
     "interrogate_deepbooru_score_threshold": OptionInfo(0.5, "deepbooru: score threshold", gr.Slider, {"minimum": 0, "maximum": 1, "step": 0.01}),
     "deepbooru_sort_alpha": OptionInfo(True, "deepbooru: sort tags alphabetically").info("if not: sort by score"),
     "deepbooru_use_spaces": OptionInfo(True, "deepbooru: use spaces in tags").info("if not: use underscores"),
@@ -242,6 +257,7 @@ options_templates.update(options_section(('extra_networks', "Extra Networks", "s
     "extra_networks_card_height": OptionInfo(0, "Card height for Extra Networks").info("in pixels"),
     "extra_networks_card_text_scale": OptionInfo(1.0, "Card text scale", gr.Slider, {"minimum": 0.0, "maximum": 2.0, "step": 0.01}).info("1 = original size"),
     "extra_networks_card_show_desc": OptionInfo(True, "Show description on card"),
+    "extra_networks_page_size": OptionInfo(100, "Number of Extra Networks cards to request at once", gr.Slider, {"minimum": 10, "maximum": 1000, "step": 10}).info("more cards are requested when scrolling to the end of the page"),
     "extra_networks_card_order_field": OptionInfo("Path", "Default order field for Extra Networks cards", gr.Dropdown, {"choices": ['Path', 'Name', 'Date Created', 'Date Modified']}).needs_reload_ui(),
     "extra_networks_card_order": OptionInfo("Ascending", "Default order for Extra Networks cards", gr.Dropdown, {"choices": ['Ascending', 'Descending']}).needs_reload_ui(),
     "extra_networks_add_text_separator": OptionInfo(" ", "Extra networks separator").info("extra text to add before <...> when adding extra network to prompt"),
@@ -329,6 +345,9 @@ options_templates.update(options_section(('ui', "Live previews", "ui"), {
     "live_preview_allow_lowvram_full": OptionInfo(False, "Allow Full live preview method with lowvram/medvram").info("If not, Approx NN will be used instead; Full live preview method is very detrimental to speed if lowvram/medvram optimizations are enabled"),
     "live_preview_content": OptionInfo("Prompt", "Live preview subject", gr.Radio, {"choices": ["Combined", "Prompt", "Negative prompt"]}),
     "live_preview_refresh_period": OptionInfo(1000, "Progressbar and preview update period").info("in milliseconds"),
+    "live_preview_background": OptionInfo(True, "Render live previews on a separate thread").info("sampling doesn't wait for previews; previews that come while one is being rendered are skipped"),
+    "live_preview_max_fps": OptionInfo(0, "Maximum live preview frame rate", gr.Slider, {"minimum": 0, "maximum": 30, "step": 1}).info("when rendering on a separate thread; 0 = no limit"),
+    "progress_stream_interval": OptionInfo(100, "Progress stream check period", gr.Slider, {"minimum": 10, "maximum": 1000, "step": 10}).info("in milliseconds; how often the API's progress stream checks for changes; clients only receive an update when progress or the live preview changes"),
     "live_preview_fast_interrupt": OptionInfo(False, "Return image with chosen live preview method on interrupt").info("makes interrupts faster"),
     "js_live_preview_in_modal_lightbox": OptionInfo(False, "Show Live preview in full page image viewer"),
 }))
@@ -359,6 +378,7 @@ options_templates.update(options_section(('postprocessing', "Postprocessing", "p
     'postprocessing_enable_in_main_ui': OptionInfo([], "Enable postprocessing operations in txt2img and img2img tabs", ui_components.DropdownMulti, lambda: {"choices": [x.name for x in shared_items.postprocessing_scripts()]}),
     'postprocessing_operation_order': OptionInfo([], "Postprocessing operation order", ui_components.DropdownMulti, lambda: {"choices": [x.name for x in shared_items.postprocessing_scripts()]}),
     'upscaling_max_images_in_cache': OptionInfo(5, "Maximum number of images in upscaling cache", gr.Slider, {"minimum": 0, "maximum": 10, "step": 1}),
+    'postprocessing_prefetch_images': OptionInfo(4, "Number of images to load ahead and save in background when postprocessing a batch", gr.Slider, {"minimum": 1, "maximum": 32, "step": 1}).info("also the number of threads decoding input images"),
     'postprocessing_existing_caption_action': OptionInfo("Ignore", "Action for existing captions", gr.Radio, {"choices": ["Ignore", "Keep", "Prepend", "Append"]}).info("when generating captions using postprocessing; Ignore = use generated; Keep = use original; Prepend/Append = combine both"),
 }))
 
@@ -25,8 +25,13 @@ class State:
     current_image_sampling_step = 0
     id_live_preview = 0
     textinfo = None
+    batch_file = None
+    batch_files_done = 0
+    batch_files_total = 0
     time_start = None
     server_start = None
+    concurrent = False
+    """True for State of a job running concurrently with others; see QueueLock.job in utils/call_queue.py"""
     _server_command_signal = threading.Event()
     _server_command: Optional[str] = None
 
@@ -76,13 +81,34 @@ class State:
         self.skipped = True
         log.info("Received skip request")
 
+        for state in self.concurrent_states():
+            state.skipped = True
+
     def interrupt(self):
         self.interrupted = True
         log.info("Received interrupt request")
 
+        for state in self.concurrent_states():
+            state.interrupted = True
+
+    def concurrent_states(self):
+        """for the global State, returns states of jobs running concurrently, so that skipping and interrupting applies to them too"""
+
+        if self.concurrent:
+            return []
+
+        from components import job_context
+
+        return [context.state for context in job_context.running()]
+
     def nextjob(self):
         if shared.opts.live_previews_enable and shared.opts.show_progress_every_n_steps == -1:
-            self.do_set_current_image()
+            from components import live_preview
+
+            if live_preview.renderer.enabled() and not self.concurrent and self.current_latent is not None:
+                live_preview.renderer.submit(self.current_latent, self.sampling_step)
+            else:
+                self.do_set_current_image()
 
         self.job_no += 1
         self.sampling_step = 0
@@ -98,6 +124,9 @@ class State:
             "job_no": self.job_no,
             "sampling_step": self.sampling_step,
             "sampling_steps": self.sampling_steps,
+            "batch_file": self.batch_file,
+            "batch_files_done": self.batch_files_done,
+            "batch_files_total": self.batch_files_total,
         }
 
         return obj
@@ -116,7 +145,15 @@ class State:
         self.skipped = False
         self.interrupted = False
         self.textinfo = None
+        self.batch_file = None
+        self.batch_files_done = 0
+        self.batch_files_total = 0
         self.job = job
+
+        if not self.concurrent:
+            from components import live_preview
+            live_preview.renderer.reset()
+
         devices.torch_gc()
         log.info("Starting job %s", job)
 
@@ -133,6 +170,11 @@ class State:
         if not shared.parallel_processing_allowed:
             return
 
+        from components import live_preview
+        if live_preview.renderer.enabled() and not self.concurrent:
+            # previews are rendered in the background as latents come in
+            return
+
         if self.sampling_step - self.current_image_sampling_step >= shared.opts.show_progress_every_n_steps and shared.opts.live_previews_enable and shared.opts.show_progress_every_n_steps != -1:
             self.do_set_current_image()
 
@@ -140,13 +182,13 @@ class State:
         if self.current_latent is None:
             return
 
-        import modules.sd_samplers
+        from components.sd import sd_samplers
 
         try:
             if shared.opts.show_progress_grid:
-                self.assign_current_image(modules.sd_samplers.samples_to_image_grid(self.current_latent))
+                self.assign_current_image(sd_samplers.samples_to_image_grid(self.current_latent))
             else:
-                self.assign_current_image(modules.sd_samplers.sample_to_image(self.current_latent))
+                self.assign_current_image(sd_samplers.sample_to_image(self.current_latent))
 
             self.current_image_sampling_step = self.sampling_step
 
@@ -1,16 +1,83 @@
 import os
+import threading
 from abc import abstractmethod
+from collections import OrderedDict
 
 import PIL
 from PIL import Image
 
 import components.shared
 from components import modelloader, shared
+from utils import devices
 
 LANCZOS = (Image.Resampling.LANCZOS if hasattr(Image, 'Resampling') else Image.LANCZOS)
 NEAREST = (Image.Resampling.NEAREST if hasattr(Image, 'Resampling') else Image.NEAREST)
 
 
+def model_size(model):
+    """memory used by parameters and buffers of a torch module, in bytes"""
+
+    return sum(t.numel() * t.element_size() for t in [*model.parameters(), *model.buffers()])
+
+
+class UpscalerModelCache:
+    """
+    Loaded upscaler networks, keyed by model path and device, shared by all upscalers. When total size of the networks
+    goes over the memory budget from settings, the least recently used ones are dropped.
+    """
+
+    def __init__(self):
+        self.models = OrderedDict()
+        self.lock = threading.RLock()
+
+    def get(self, path, device, load):
+        """Returns the network for path on device, calling load() to create it if it's not in the cache yet."""
+
+        key = (path, str(device))
+        with self.lock:
+            model = self.models.get(key)
+            if model is not None:
+                self.models.move_to_end(key)
+                return model
+
+            model = load()
+
+            self.models[key] = model
+            self.evict(keep=key)
+
+            return model
+
+    def evict(self, keep=None):
+        budget = shared.opts.upscaler_models_cache_mb * 1024 * 1024
+
+        with self.lock:
+            total = sum(model_size(model) for model in self.models.values())
+            for key in list(self.models):
+                if total <= budget:
+                    break
+                if key == keep:
+                    continue
+
+                total -= model_size(self.models.pop(key))
+
+    def unload(self, path=None):
+        """Drops the networks loaded from path, or all networks if path is None."""
+
+        with self.lock:
+            for key in list(self.models):
+                if path is None or key[0] == path:
+                    del self.models[key]
+
+        devices.torch_gc()
+
+    def loaded(self):
+        with self.lock:
+            return [(path, device, model_size(model)) for (path, device), model in self.models.items()]
+
+
+models_cache = UpscalerModelCache()
+
+
 class Upscaler:
     name = None
     model_path = None
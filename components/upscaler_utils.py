@@ -0,0 +1,98 @@
+import numpy as np
+import psutil
+import torch
+from PIL import Image
+
+from components import images, shared
+from utils import devices
+
+tile_bytes_per_pixel = 64 * 4 * 8
+"""rough estimate of memory used by intermediate activations of an ESRGAN-like network per input pixel, in bytes"""
+
+
+def get_available_memory(device):
+    if device.type == 'cuda':
+        free, _ = torch.cuda.mem_get_info(device)
+        return free
+
+    return psutil.virtual_memory().available
+
+
+def tile_batch_size(device, tile_w, tile_h, scale):
+    """number of tiles to process in one forward pass: taken from settings, or, if it's 0, calculated from free memory"""
+
+    if shared.opts.upscaler_tile_batch_size > 0:
+        return shared.opts.upscaler_tile_batch_size
+
+    per_tile = tile_w * tile_h * (tile_bytes_per_pixel + scale * scale * 3 * 4)
+    budget = get_available_memory(device) * 0.5
+
+    return max(1, min(int(budget // per_tile), 64))
+
+
+def pil_images_to_torch_bgr(tiles, device, dtype):
+    arr = np.stack([np.asarray(tile.convert("RGB")) for tile in tiles])
+    arr = np.ascontiguousarray(arr[:, :, :, ::-1].transpose(0, 3, 1, 2))
+    return torch.from_numpy(arr).to(device=device, dtype=dtype) / 255
+
+
+def torch_bgr_to_uint8_rgb(batch):
+    """converts a batch of BGR images in 0..1 range to a numpy uint8 array of shape (N, H, W, 3) with RGB channels"""
+
+    batch = batch.float().clamp_(0, 1).mul_(255).to(torch.uint8).cpu().numpy()
+    return np.ascontiguousarray(batch[:, ::-1].transpose(0, 2, 3, 1))
+
+
+def upscale_batch(model, batch):
+    """runs model on a batch of tiles; if it doesn't fit into memory, splits the batch in halves and tries again"""
+
+    try:
+        with torch.no_grad():
+            return model(batch)
+    except torch.cuda.OutOfMemoryError:
+        if batch.shape[0] == 1:
+            raise
+
+        devices.torch_gc()
+        half = batch.shape[0] // 2
+        return torch.cat([upscale_batch(model, batch[:half]), upscale_batch(model, batch[half:])])
+
+
+def upscale_without_tiling(model, img, device, dtype=torch.float32):
+    batch = pil_images_to_torch_bgr([img], device, dtype)
+    output = upscale_batch(model, batch)
+    return Image.fromarray(torch_bgr_to_uint8_rgb(output)[0], 'RGB')
+
+
+def upscale_with_model(model, img, tile_size, tile_overlap, device, dtype=torch.float32):
+    """
+    Upscales img with model, splitting it into tiles of tile_size with tile_overlap. Tiles are stacked into batches sized
+    to fit into free memory and run through the model in one forward pass per batch; results are kept as arrays until
+    they are blended into the final image.
+    """
+
+    if tile_size <= 0:
+        return upscale_without_tiling(model, img, device, dtype)
+
+    grid = images.split_grid(img, tile_size, tile_size, tile_overlap)
+    tiles = [tile for _, _, row in grid.tiles for _, _, tile in row]
+
+    # the first tile is upscaled alone to learn the model's scale, which is needed to estimate memory use of a batch
+    first = upscale_batch(model, pil_images_to_torch_bgr(tiles[:1], device, dtype))
+    scale = first.shape[3] // tiles[0].width
+    outputs = [torch_bgr_to_uint8_rgb(first)]
+
+    batch_size = tile_batch_size(device, grid.tile_w, grid.tile_h, scale)
+    for i in range(1, len(tiles), batch_size):
+        batch = pil_images_to_torch_bgr(tiles[i:i + batch_size], device, dtype)
+        outputs.append(torch_bgr_to_uint8_rgb(upscale_batch(model, batch)))
+
+    upscaled_tiles = iter(np.concatenate(outputs))
+
+    newtiles = []
+    for y, h, row in grid.tiles:
+        newrow = [[x * scale, w * scale, next(upscaled_tiles)] for x, w, _ in row]
+        newtiles.append([y * scale, h * scale, newrow])
+
+    newgrid = images.Grid(newtiles, grid.tile_w * scale, grid.tile_h * scale, grid.image_w * scale, grid.image_h * scale, grid.overlap * scale)
+    return images.combine_grid(newgrid)
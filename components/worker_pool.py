@@ -0,0 +1,450 @@
+"""
+Supervisor mode: several API-only webui processes (workers), each with its own model and torch thread budget, behind a
+dispatcher that serves the same /sdapi/v1/* endpoints on the main port and forwards every request to one of the workers.
+
+Progress requests go to the worker running the job given as id_task, or else to the worker that got the client's last
+generation request. Only HTTP is forwarded: the /sdapi/v1/progress/ws WebSocket is closed with an explanation.
+
+This module is imported by launch.py before the rest of webui, so it must not import torch or anything that does.
+"""
+
+import asyncio
+import json
+import os
+import re
+import subprocess
+import sys
+import threading
+import time
+
+from components.paths_internal import script_path
+from utils import errors
+
+health_check_interval = 5
+"""seconds between health checks of workers"""
+
+max_health_failures = 6
+"""a worker that was healthy and then failed this many health checks in a row is considered hung and restarted"""
+
+max_restart_delay = 60
+
+max_job_records = 256
+"""jobs remembered per worker to route requests about them; same as JobQueue.keep_records"""
+
+supervisor_args = {"--workers": True, "--worker-threads": True, "--worker-base-port": True, "--port": True, "--listen": False}
+"""command line arguments not passed to workers: name -> whether the argument takes a value"""
+
+broadcast_paths = {
+    "/sdapi/v1/options",
+    "/sdapi/v1/refresh-checkpoints",
+    "/sdapi/v1/refresh-vae",
+    "/sdapi/v1/reload-checkpoint",
+    "/sdapi/v1/unload-checkpoint",
+    "/sdapi/v1/unload-upscalers",
+    "/sdapi/v1/interrupt",
+    "/sdapi/v1/skip",
+}
+"""POST requests that change state of the server and are sent to every worker"""
+
+re_job_path = re.compile(r"^/sdapi/v1/jobs/(job\([0-9a-f]+\))(?:/result)?$")
+re_job_id = re.compile(r"^job\([0-9a-f]+\)$")
+re_job_submit_path = re.compile(r"^/sdapi/v1/jobs/[a-z0-9-]+$")
+
+hop_by_hop_headers = {"connection", "keep-alive", "transfer-encoding", "upgrade", "host", "content-length"}
+
+
+def worker_argv(argv):
+    """returns command line arguments for a worker: the supervisor's own, without those that only make sense for the supervisor"""
+
+    res = []
+    skip_value = False
+    for arg in argv:
+        if skip_value:
+            skip_value = False
+            continue
+
+        name = arg.split("=", 1)[0]
+        if name in supervisor_args:
+            skip_value = supervisor_args[name] and "=" not in arg
+            continue
+
+        res.append(arg)
+
+    return res
+
+
+def same_checkpoint(a, b):
+    """checks if two checkpoint names given as titles ("model.safetensors [abcdef1234]"), filenames or names without extension refer to the same checkpoint"""
+
+    def name(x):
+        return os.path.splitext(x.split(" [", 1)[0].replace("\\", "/").rsplit("/", 1)[-1])[0].lower()
+
+    return a == b or name(a) == name(b)
+
+
+def requested_checkpoint(body):
+    """returns checkpoint from override_settings of a generation request's JSON body, if there is one"""
+
+    try:
+        data = json.loads(body) if body else None
+    except ValueError:
+        return None
+
+    if not isinstance(data, dict) or not isinstance(data.get("override_settings"), dict):
+        return None
+
+    return data["override_settings"].get("sd_model_checkpoint") or None
+
+
+class Worker:
+    def __init__(self, index, port, threads, cores=None):
+        self.index = index
+        self.port = port
+        self.threads = threads
+        self.cores = cores
+        self.url = f"http://127.0.0.1:{port}"
+
+        self.process = None
+        self.started = None
+        self.healthy = False
+        self.was_healthy = False
+        self.failures = 0
+        self.restarts = 0
+        self.restart_delay = 1
+        self.next_start = 0
+
+        self.checkpoint = None
+        self.in_flight = 0
+        self.queued_jobs = 0
+
+    @property
+    def alive(self):
+        return self.process is not None and self.process.poll() is None
+
+    @property
+    def load(self):
+        return self.in_flight + self.queued_jobs
+
+    def start(self, argv):
+        env = os.environ.copy()
+        env['COMMANDLINE_ARGS'] = ""  # already included in argv
+        env['OMP_NUM_THREADS'] = env['MKL_NUM_THREADS'] = str(self.threads)
+
+        command = [sys.executable, os.path.join(script_path, "webui.py"), *argv, "--nowebui", "--port", str(self.port)]
+        self.process = subprocess.Popen(command, cwd=script_path, env=env)
+        self.started = time.time()
+        self.healthy = self.was_healthy = False
+        self.failures = 0
+
+        if self.cores and hasattr(os, "sched_setaffinity"):
+            try:
+                os.sched_setaffinity(self.process.pid, self.cores)
+            except OSError:
+                errors.report(f"Could not pin worker {self.index} to CPU cores", exc_info=True)
+
+        print(f"Started worker {self.index} on port {self.port} with {self.threads} threads, pid {self.process.pid}")
+
+    def stop(self):
+        if self.alive:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+
+    def dict(self):
+        return {
+            "index": self.index,
+            "port": self.port,
+            "pid": self.process.pid if self.process else None,
+            "alive": self.alive,
+            "healthy": self.healthy,
+            "threads": self.threads,
+            "checkpoint": self.checkpoint,
+            "in_flight": self.in_flight,
+            "queued_jobs": self.queued_jobs,
+            "restarts": self.restarts,
+            "uptime": time.time() - self.started if self.alive else None,
+        }
+
+
+class WorkerPool:
+    """
+    Starts workers, restarts those that crash or stop responding to health checks, and picks a worker for each request.
+
+    A request that names a checkpoint in override_settings goes to an idle worker that already has it loaded; if there is
+    none, to any idle worker; if all are busy, to the least loaded one, preferring one with the checkpoint.
+    """
+
+    def __init__(self, count, threads=0, base_port=7862, argv=(), auth=None):
+        cpu_count = os.cpu_count() or 1
+        threads = threads or max(1, cpu_count // count)
+
+        available_cores = sorted(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else []
+        pin = len(available_cores) >= count * threads
+
+        self.workers = [Worker(i, base_port + i, threads, available_cores[i * threads:(i + 1) * threads] if pin else None) for i in range(count)]
+        self.argv = list(argv)
+        self.auth = auth
+        self.lock = threading.Lock()
+        self.job_workers = {}
+        self.client_workers = {}
+        """client address -> worker that got that client's last request that wasn't about a specific job"""
+        self.stopping = False
+        self.monitor_thread = None
+
+    def start(self):
+        for worker in self.workers:
+            worker.start(self.argv)
+
+        self.monitor_thread = threading.Thread(target=self.monitor, daemon=True, name="worker-pool-monitor")
+        self.monitor_thread.start()
+
+    def stop(self):
+        self.stopping = True
+        for worker in self.workers:
+            worker.stop()
+
+    def monitor(self):
+        import httpx
+
+        with httpx.Client(timeout=10, auth=self.auth) as client:
+            while not self.stopping:
+                for worker in self.workers:
+                    try:
+                        self.check(worker, client)
+                    except Exception:
+                        errors.report(f"Error checking worker {worker.index}", exc_info=True)
+
+                time.sleep(health_check_interval)
+
+    def check(self, worker, client):
+        if self.stopping:
+            return
+
+        if not worker.alive:
+            if worker.process is not None and worker.next_start == 0:
+                print(f"Worker {worker.index} exited with code {worker.process.returncode}; restarting in {worker.restart_delay}s")
+                worker.healthy = False
+                worker.next_start = time.time() + worker.restart_delay
+
+                # workers that crash right after starting are restarted less and less often
+                crashed_early = time.time() - worker.started < 60
+                worker.restart_delay = min(worker.restart_delay * 2, max_restart_delay) if crashed_early else 1
+
+            if time.time() >= worker.next_start:
+                worker.next_start = 0
+                worker.restarts += 1
+                worker.start(self.argv)
+
+            return
+
+        try:
+            options = client.get(f"{worker.url}/sdapi/v1/options")
+            options.raise_for_status()
+            jobs = client.get(f"{worker.url}/sdapi/v1/jobs")
+            jobs.raise_for_status()
+        except Exception:
+            worker.failures += 1
+            worker.healthy = False
+            if worker.was_healthy and worker.failures >= max_health_failures:
+                print(f"Worker {worker.index} is not responding; restarting")
+                worker.process.kill()
+            return
+
+        with self.lock:
+            worker.checkpoint = options.json().get("sd_model_checkpoint")
+            worker.queued_jobs = sum(1 for job in jobs.json() if job.get("status") in ("queued", "running"))
+            worker.failures = 0
+            worker.healthy = worker.was_healthy = True
+
+    def choose(self, checkpoint=None):
+        with self.lock:
+            healthy = [worker for worker in self.workers if worker.healthy]
+            if not healthy:
+                return None
+
+            def has_checkpoint(worker):
+                return checkpoint is None or (worker.checkpoint is not None and same_checkpoint(worker.checkpoint, checkpoint))
+
+            idle = [worker for worker in healthy if worker.load == 0]
+            candidates = [worker for worker in idle if has_checkpoint(worker)] or idle or healthy
+
+            return min(candidates, key=lambda worker: (worker.load, not has_checkpoint(worker), worker.index))
+
+    def progress_worker(self, id_job, client):
+        """
+        The worker to ask about progress: the one running job id_job if it's given, otherwise the one that got the client's
+        last request, so that a client never sees progress of another client's generation. Returns None if it's unknown.
+        """
+
+        with self.lock:
+            if id_job is not None:
+                return self.job_workers.get(id_job)
+
+            worker = self.client_workers.get(client)
+            healthy = [worker for worker in self.workers if worker.healthy]
+            if worker is None and len(healthy) == 1:
+                worker = healthy[0]
+
+            return worker
+
+    def add_client(self, client, worker):
+        with self.lock:
+            self.client_workers.pop(client, None)
+            self.client_workers[client] = worker
+
+            while len(self.client_workers) > max_job_records * len(self.workers):
+                del self.client_workers[next(iter(self.client_workers))]
+
+    def add_job(self, id_job, worker):
+        with self.lock:
+            self.job_workers[id_job] = worker
+            worker.queued_jobs += 1
+
+            # workers themselves only remember this many jobs
+            while len(self.job_workers) > max_job_records * len(self.workers):
+                del self.job_workers[next(iter(self.job_workers))]
+
+    def add_in_flight(self, worker, amount):
+        with self.lock:
+            worker.in_flight += amount
+
+
+def basic_auth(api_auth):
+    """returns (username, password) of the first credential in --api-auth argument, for health checks"""
+
+    if not api_auth:
+        return None
+
+    username, _, password = api_auth.split(",")[0].strip().partition(":")
+    return username, password
+
+
+def create_dispatcher(pool):
+    import httpx
+    from fastapi import FastAPI, HTTPException, Request, WebSocket
+    from fastapi.responses import JSONResponse, Response, StreamingResponse
+
+    app = FastAPI()
+    client = httpx.AsyncClient(timeout=httpx.Timeout(None, connect=10))
+
+    def response_headers(resp):
+        return {name: value for name, value in resp.headers.items() if name.lower() not in hop_by_hop_headers}
+
+    async def forward(worker, request, path, body):
+        headers = {name: value for name, value in request.headers.items() if name.lower() not in hop_by_hop_headers}
+        req = client.build_request(request.method, worker.url + path, params=request.query_params, content=body, headers=headers)
+        try:
+            return await client.send(req, stream=True)
+        except httpx.HTTPError as e:
+            raise HTTPException(status_code=502, detail=f"Worker {worker.index} failed to respond: {e}") from e
+
+    async def forward_whole(worker, request, path, body):
+        resp = await forward(worker, request, path, body)
+        try:
+            await resp.aread()
+        finally:
+            await resp.aclose()
+
+        return resp
+
+    @app.get("/sdapi/v1/workers")
+    def get_workers():
+        with pool.lock:
+            return [worker.dict() for worker in pool.workers]
+
+    @app.websocket("/sdapi/v1/progress/ws")
+    async def progress_websocket(websocket: WebSocket):
+        # only HTTP is forwarded to workers
+        await websocket.accept()
+        await websocket.close(code=1008, reason="WebSocket progress is not available with --workers; use /sdapi/v1/progress/stream with id_task")
+
+    @app.api_route("/sdapi/v1/{path:path}", methods=["GET", "POST", "PUT", "DELETE", "PATCH"])
+    async def dispatch(request: Request, path: str):
+        path = f"/sdapi/v1/{path}"
+        body = await request.body()
+
+        if request.method == "POST" and path in broadcast_paths:
+            workers = [worker for worker in pool.workers if worker.healthy]
+            if not workers:
+                raise HTTPException(status_code=503, detail="No healthy workers")
+
+            responses = await asyncio.gather(*[forward_whole(worker, request, path, body) for worker in workers])
+            resp = next((x for x in responses if x.status_code >= 400), responses[0])
+            return Response(resp.content, status_code=resp.status_code, headers=response_headers(resp))
+
+        if request.method == "GET" and path == "/sdapi/v1/jobs":
+            workers = [worker for worker in pool.workers if worker.healthy]
+            responses = await asyncio.gather(*[forward_whole(worker, request, path, body) for worker in workers])
+            return JSONResponse([job for resp in responses if resp.status_code == 200 for job in resp.json()])
+
+        client = request.client.host if request.client else None
+        is_progress = path.startswith("/sdapi/v1/progress")
+
+        m = re_job_path.match(path)
+        if m:
+            worker = pool.job_workers.get(m.group(1))
+            if worker is None:
+                raise HTTPException(status_code=404, detail="Job not found")
+        elif is_progress:
+            id_job = request.query_params.get("id_task")
+            if id_job is not None and not re_job_id.match(id_job):
+                raise HTTPException(status_code=404, detail="Job not found")
+
+            worker = pool.progress_worker(id_job, client)
+            if worker is None:
+                raise HTTPException(status_code=404 if id_job is not None else 400, detail="Job not found" if id_job is not None else "Several workers are running; pass id of a job as id_task, or make a generation request first")
+        else:
+            worker = pool.choose(requested_checkpoint(body) if request.method == "POST" else None)
+
+        if worker is None:
+            raise HTTPException(status_code=503, detail="No healthy workers")
+
+        if not m and not is_progress and request.method == "POST":
+            pool.add_client(client, worker)
+
+        if request.method == "POST" and re_job_submit_path.match(path):
+            resp = await forward_whole(worker, request, path, body)
+            if resp.status_code == 200:
+                pool.add_job(resp.json()["id"], worker)
+
+            return Response(resp.content, status_code=resp.status_code, headers=response_headers(resp))
+
+        # progress requests, including SSE streams that stay open for long, don't make a worker busy
+        in_flight = 0 if is_progress else 1
+
+        pool.add_in_flight(worker, in_flight)
+        try:
+            resp = await forward(worker, request, path, body)
+        except Exception:
+            pool.add_in_flight(worker, -in_flight)
+            raise
+
+        async def stream():
+            try:
+                async for chunk in resp.aiter_raw():
+                    yield chunk
+            finally:
+                await resp.aclose()
+                pool.add_in_flight(worker, -in_flight)
+
+        return StreamingResponse(stream(), status_code=resp.status_code, headers=response_headers(resp))
+
+    return app
+
+
+def run(args, argv):
+    """runs the supervisor: starts args.workers workers and serves the dispatcher until interrupted"""
+
+    import uvicorn
+
+    port = args.port or 7861
+    pool = WorkerPool(args.workers, threads=args.worker_threads, base_port=args.worker_base_port or port + 1, argv=worker_argv(argv), auth=basic_auth(args.api_auth))
+    app = create_dispatcher(pool)
+
+    pool.start()
+    try:
+        uvicorn.run(app, host="0.0.0.0" if args.listen else "127.0.0.1", port=port, timeout_keep_alive=args.timeout_keep_alive)
+    finally:
+        pool.stop()
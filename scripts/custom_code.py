@@ -60,6 +60,12 @@ return process_images(p)
 
         return [code, indent_level]
 
+    def api_args(self, is_img2img):
+        return [
+            {"label": "Python code", "value": ""},
+            {"label": "Indent level", "value": 2},
+        ]
+
     def run(self, p, code, indent_level):
         assert cmd_opts.allow_code, '--allow-code option must be enabled'
 
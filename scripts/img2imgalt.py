@@ -158,6 +158,21 @@ class Script(scripts.Script):
             cfg, randomness, sigma_adjustment,
         ]
 
+    def api_args(self, is_img2img):
+        return [
+            {"label": "", "value": None},
+            {"label": "Override `Sampling method` to Euler?(this method is built for it)", "value": True},
+            {"label": "Override `prompt` to the same value as `original prompt`?(and `negative prompt`)", "value": True},
+            {"label": "Original prompt", "value": ""},
+            {"label": "Original negative prompt", "value": ""},
+            {"label": "Override `Sampling Steps` to the same value as `Decode steps`?", "value": True},
+            {"label": "Decode steps", "value": 50, "minimum": 1, "maximum": 150, "step": 1},
+            {"label": "Override `Denoising strength` to 1?", "value": True},
+            {"label": "Decode CFG scale", "value": 1.0, "minimum": 0.0, "maximum": 15.0, "step": 0.1},
+            {"label": "Randomness", "value": 0.0, "minimum": 0.0, "maximum": 1.0, "step": 0.01},
+            {"label": "Sigma adjustment for finding noise for image", "value": False},
+        ]
+
     def run(self, p, _, override_sampler, override_prompt, original_prompt, original_negative_prompt, override_steps, st, override_strength, cfg, randomness, sigma_adjustment):
         # Override
         if override_sampler:
@@ -4,7 +4,7 @@ import gradio as gr
 import components.scripts as scripts
 from components import deepbooru, images, processing, shared
 from components.processing import Processed
-from components.shared import opts, state
+from components.shared import opts
 
 
 class Script(scripts.Script):
@@ -22,6 +22,14 @@ class Script(scripts.Script):
 
         return [loops, final_denoising_strength, denoising_curve, append_interrogation]
 
+    def api_args(self, is_img2img):
+        return [
+            {"label": "Loops", "value": 4, "minimum": 1, "maximum": 32, "step": 1},
+            {"label": "Final denoising strength", "value": 0.5, "minimum": 0, "maximum": 1, "step": 0.01},
+            {"label": "Denoising strength curve", "value": "Linear", "choices": ["Aggressive", "Linear", "Lazy"]},
+            {"label": "Append interrogated prompt at each iteration", "value": "None", "choices": ["None", "CLIP", "DeepBooru"]},
+        ]
+
     def run(self, p, loops, final_denoising_strength, denoising_curve, append_interrogation):
         processing.fix_seed(p)
         batch_count = p.n_iter
@@ -43,7 +51,7 @@ class Script(scripts.Script):
         original_init_image = p.init_images
         original_prompt = p.prompt
         original_inpainting_fill = p.inpainting_fill
-        state.job_count = loops * batch_count
+        shared.state.job_count = loops * batch_count
 
         initial_color_corrections = [processing.setup_color_correction(p.init_images[0])]
 
@@ -90,12 +98,12 @@ class Script(scripts.Script):
                     elif append_interrogation == "DeepBooru":
                         p.prompt += deepbooru.model.tag(p.init_images[0])
 
-                state.job = f"Iteration {i + 1}/{loops}, batch {n + 1}/{batch_count}"
+                shared.state.job = f"Iteration {i + 1}/{loops}, batch {n + 1}/{batch_count}"
 
                 processed = processing.process_images(p)
 
                 # Generation cancelled.
-                if state.interrupted:
+                if shared.state.interrupted:
                     break
 
                 if initial_seed is None:
@@ -105,7 +113,7 @@ class Script(scripts.Script):
                 p.seed = processed.seed + 1
                 p.denoising_strength = calculate_denoising_strength(i + 1)
 
-                if state.skipped:
+                if shared.state.skipped:
                     break
 
                 last_image = processed.images[0]
@@ -116,13 +124,13 @@ class Script(scripts.Script):
                     history.append(last_image)
                     all_images.append(last_image)
 
-            if batch_count > 1 and not state.skipped and not state.interrupted:
+            if batch_count > 1 and not shared.state.skipped and not shared.state.interrupted:
                 history.append(last_image)
                 all_images.append(last_image)
 
             p.inpainting_fill = original_inpainting_fill
 
-            if state.interrupted:
+            if shared.state.interrupted:
                     break
 
         if len(history) > 1:
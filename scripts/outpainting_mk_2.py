@@ -7,9 +7,9 @@ import components.scripts as scripts
 import gradio as gr
 from PIL import Image, ImageDraw
 
-from components import images
+from components import images, shared
 from components.processing import Processed, process_images
-from components.shared import opts, state
+from components.shared import opts
 
 
 # this function is taken from https://github.com/parlance-zz/g-diffuser-bot
@@ -139,6 +139,19 @@ class Script(scripts.Script):
 
         return [info, pixels, mask_blur, direction, noise_q, color_variation]
 
+    def api_args(self, is_img2img):
+        if not is_img2img:
+            return None
+
+        return [
+            {"label": "", "value": None},
+            {"label": "Pixels to expand", "value": 128, "minimum": 8, "maximum": 256, "step": 8},
+            {"label": "Mask blur", "value": 8, "minimum": 0, "maximum": 64, "step": 1},
+            {"label": "Outpainting direction", "value": ['left', 'right', 'up', 'down'], "choices": ['left', 'right', 'up', 'down']},
+            {"label": "Fall-off exponent (lower=higher detail)", "value": 1.0, "minimum": 0.0, "maximum": 4.0, "step": 0.01},
+            {"label": "Color variation", "value": 0.05, "minimum": 0.0, "maximum": 1.0, "step": 0.01},
+        ]
+
     def run(self, p, _, pixels, mask_blur, direction, noise_q, color_variation):
         initial_seed_and_info = [None, None]
 
@@ -258,12 +271,12 @@ class Script(scripts.Script):
         batch_count = p.n_iter
         batch_size = p.batch_size
         p.n_iter = 1
-        state.job_count = batch_count * ((1 if left > 0 else 0) + (1 if right > 0 else 0) + (1 if up > 0 else 0) + (1 if down > 0 else 0))
+        shared.state.job_count = batch_count * ((1 if left > 0 else 0) + (1 if right > 0 else 0) + (1 if up > 0 else 0) + (1 if down > 0 else 0))
         all_processed_images = []
 
         for i in range(batch_count):
             imgs = [init_img] * batch_size
-            state.job = f"Batch {i + 1} out of {batch_count}"
+            shared.state.job = f"Batch {i + 1} out of {batch_count}"
 
             if left > 0:
                 imgs = expand(imgs, batch_size, left, is_left=True)
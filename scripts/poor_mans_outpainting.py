@@ -7,7 +7,8 @@ from PIL import Image, ImageDraw
 from components import images
 from utils import devices
 from components.processing import Processed, process_images
-from components.shared import opts, state
+from components import shared
+from components.shared import opts
 
 
 class Script(scripts.Script):
@@ -28,6 +29,17 @@ class Script(scripts.Script):
 
         return [pixels, mask_blur, inpainting_fill, direction]
 
+    def api_args(self, is_img2img):
+        if not is_img2img:
+            return None
+
+        return [
+            {"label": "Pixels to expand", "value": 128, "minimum": 8, "maximum": 256, "step": 8},
+            {"label": "Mask blur", "value": 4, "minimum": 0, "maximum": 64, "step": 1},
+            {"label": "Masked content", "value": 0, "choices": ['fill', 'original', 'latent noise', 'latent nothing']},
+            {"label": "Outpainting direction", "value": ['left', 'right', 'up', 'down'], "choices": ['left', 'right', 'up', 'down']},
+        ]
+
     def run(self, p, pixels, mask_blur, inpainting_fill, direction):
         initial_seed = None
         initial_info = None
@@ -107,14 +119,14 @@ class Script(scripts.Script):
         batch_count = len(work)
         print(f"Poor man's outpainting will process a total of {len(work)} images tiled as {len(grid.tiles[0][2])}x{len(grid.tiles)}.")
 
-        state.job_count = batch_count
+        shared.state.job_count = batch_count
 
         for i in range(batch_count):
             p.init_images = [work[i]]
             p.image_mask = work_mask[i]
             p.latent_mask = work_latent_mask[i]
 
-            state.job = f"Batch {i + 1} out of {batch_count}"
+            shared.state.job = f"Batch {i + 1} out of {batch_count}"
             processed = process_images(p)
 
             if initial_seed is None:
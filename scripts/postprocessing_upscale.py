@@ -5,7 +5,6 @@ from components import scripts_postprocessing, shared
 import gradio as gr
 
 from ui.ui_components import FormRow, ToolButton
-from ui.ui import switch_values_symbol
 
 upscale_cache = {}
 
@@ -15,6 +14,8 @@ class ScriptPostprocessingUpscale(scripts_postprocessing.ScriptPostprocessing):
     order = 1000
 
     def ui(self):
+        from ui.ui import switch_values_symbol
+
         selected_tab = gr.State(value=0)
 
         with gr.Column():
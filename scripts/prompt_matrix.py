@@ -3,9 +3,9 @@ import math
 import components.scripts as scripts
 import gradio as gr
 
-from components import images
+from components import images, shared
 from components.processing import process_images
-from components.shared import opts, state
+from components.shared import opts
 import components.sd.sd_samplers
 
 
@@ -17,11 +17,11 @@ def draw_xy_grid(xs, ys, x_label, y_label, cell):
 
     first_processed = None
 
-    state.job_count = len(xs) * len(ys)
+    shared.state.job_count = len(xs) * len(ys)
 
     for iy, y in enumerate(ys):
         for ix, x in enumerate(xs):
-            state.job = f"{ix + iy * len(xs) + 1} out of {len(xs) * len(ys)}"
+            shared.state.job = f"{ix + iy * len(xs) + 1} out of {len(xs) * len(ys)}"
 
             processed = cell(x, y)
             if first_processed is None:
@@ -55,6 +55,15 @@ class Script(scripts.Script):
 
         return [put_at_start, different_seeds, prompt_type, variations_delimiter, margin_size]
 
+    def api_args(self, is_img2img):
+        return [
+            {"label": "Put variable parts at start of prompt", "value": False},
+            {"label": "Use different seed for each picture", "value": False},
+            {"label": "Select prompt", "value": "positive", "choices": ["positive", "negative"]},
+            {"label": "Select joining char", "value": "comma", "choices": ["comma", "space"]},
+            {"label": "Grid margins (px)", "value": 0, "minimum": 0, "maximum": 500, "step": 2},
+        ]
+
     def run(self, p, put_at_start, different_seeds, prompt_type, variations_delimiter, margin_size):
         modules.processing.fix_seed(p)
         # Raise error if promp type is not positive or negative
@@ -7,7 +7,7 @@ import gradio as gr
 
 from components.sd import sd_samplers, sd_models
 from components.processing import Processed, process_images
-from components.shared import state
+from components import shared
 from utils import errors
 
 
@@ -128,6 +128,14 @@ class Script(scripts.Script):
         prompt_txt.change(lambda tb: gr.update(lines=7) if ("\n" in tb) else gr.update(lines=2), inputs=[prompt_txt], outputs=[prompt_txt], show_progress=False)
         return [checkbox_iterate, checkbox_iterate_batch, prompt_position, prompt_txt]
 
+    def api_args(self, is_img2img):
+        return [
+            {"label": "Iterate seed every line", "value": False},
+            {"label": "Use same random seed for all lines", "value": False},
+            {"label": "Insert prompts at the", "value": "start", "choices": ["start", "end"]},
+            {"label": "List of prompt inputs", "value": ""},
+        ]
+
     def run(self, p, checkbox_iterate, checkbox_iterate_batch, prompt_position, prompt_txt: str):
         lines = [x for x in (x.strip() for x in prompt_txt.splitlines()) if x]
 
@@ -154,13 +162,13 @@ class Script(scripts.Script):
         if (checkbox_iterate or checkbox_iterate_batch) and p.seed == -1:
             p.seed = int(random.randrange(4294967294))
 
-        state.job_count = job_count
+        shared.state.job_count = job_count
 
         images = []
         all_prompts = []
         infotexts = []
         for args in jobs:
-            state.job = f"{state.job_no + 1} out of {state.job_count}"
+            shared.state.job = f"{shared.state.job_no + 1} out of {shared.state.job_count}"
 
             copy_p = copy.copy(p)
             for k, v in args.items():
@@ -7,7 +7,7 @@ from PIL import Image
 from components import processing, shared, images
 from utils import devices
 from components.processing import Processed
-from components.shared import opts, state
+from components.shared import opts
 
 
 class Script(scripts.Script):
@@ -25,6 +25,14 @@ class Script(scripts.Script):
 
         return [info, overlap, upscaler_index, scale_factor]
 
+    def api_args(self, is_img2img):
+        return [
+            {"label": "", "value": None},
+            {"label": "Tile overlap", "value": 64, "minimum": 0, "maximum": 256, "step": 16},
+            {"label": "Upscaler", "value": 0, "choices": [x.name for x in shared.sd_upscalers]},
+            {"label": "Scale Factor", "value": 2.0, "minimum": 1.0, "maximum": 4.0, "step": 0.05},
+        ]
+
     def run(self, p, _, overlap, upscaler_index, scale_factor):
         if isinstance(upscaler_index, str):
             upscaler_index = [x.name.lower() for x in shared.sd_upscalers].index(upscaler_index.lower())
@@ -62,9 +70,9 @@ class Script(scripts.Script):
                 work.append(tiledata[2])
 
         batch_count = math.ceil(len(work) / batch_size)
-        state.job_count = batch_count * upscale_count
+        shared.state.job_count = batch_count * upscale_count
 
-        print(f"SD upscaling will process a total of {len(work)} images tiled as {len(grid.tiles[0][2])}x{len(grid.tiles)} per upscale in a total of {state.job_count} batches.")
+        print(f"SD upscaling will process a total of {len(work)} images tiled as {len(grid.tiles[0][2])}x{len(grid.tiles)} per upscale in a total of {shared.state.job_count} batches.")
 
         result_images = []
         for n in range(upscale_count):
@@ -76,7 +84,7 @@ class Script(scripts.Script):
                 p.batch_size = batch_size
                 p.init_images = work[i * batch_size:(i + 1) * batch_size]
 
-                state.job = f"Batch {i + 1 + n * batch_count} out of {state.job_count}"
+                shared.state.job = f"Batch {i + 1 + n * batch_count} out of {shared.state.job_count}"
                 processed = processing.process_images(p)
 
                 if initial_info is None:
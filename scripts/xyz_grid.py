@@ -13,7 +13,7 @@ import gradio as gr
 
 from components import images, processing
 from components.processing import process_images, Processed, StableDiffusionProcessingTxt2Img
-from components.shared import opts, state
+from components.shared import opts
 import components.shared as shared
 from  components.sd import sd_samplers,sd_models,sd_vae,sd_samplers_kdiffusion
 from utils import  errors
@@ -264,6 +264,8 @@ axis_options = [
     AxisOption("Face restore", str, apply_face_restore, format_value=format_value),
     AxisOption("Token merging ratio", float, apply_override('token_merging_ratio')),
     AxisOption("Token merging ratio high-res", float, apply_override('token_merging_ratio_hr')),
+    AxisOption("DeepCache interval", int, apply_override('deepcache_interval')),
+    AxisOption("DeepCache depth", int, apply_override('deepcache_depth')),
     AxisOption("Always discard next-to-last sigma", str, apply_override('always_discard_next_to_last_sigma', boolean=True), choices=boolean_choice(reverse=True)),
     AxisOption("SGM noise multiplier", str, apply_override('sgm_noise_multiplier', boolean=True), choices=boolean_choice(reverse=True)),
     AxisOption("Refiner checkpoint", str, apply_field('refiner_checkpoint'), format_value=format_remove_path, confirm=confirm_checkpoints_or_none, cost=1.0, choices=lambda: ['None'] + sorted(sd_models.checkpoints_list, key=str.casefold)),
@@ -281,7 +283,7 @@ def draw_xyz_grid(p, xs, ys, zs, x_labels, y_labels, z_labels, cell, draw_legend
 
     processed_result = None
 
-    state.job_count = list_size * p.n_iter
+    shared.state.job_count = list_size * p.n_iter
 
     def process_cell(x, y, z, ix, iy, iz):
         nonlocal processed_result
@@ -289,7 +291,7 @@ def draw_xyz_grid(p, xs, ys, zs, x_labels, y_labels, z_labels, cell, draw_legend
         def index(ix, iy, iz):
             return ix + iy * len(xs) + iz * len(xs) * len(ys)
 
-        state.job = f"{index(ix, iy, iz) + 1} out of {list_size}"
+        shared.state.job = f"{index(ix, iy, iz) + 1} out of {list_size}"
 
         processed: Processed = cell(x, y, z, ix, iy, iz)
 
@@ -523,6 +525,27 @@ class Script(scripts.Script):
 
         return [x_type, x_values, x_values_dropdown, y_type, y_values, y_values_dropdown, z_type, z_values, z_values_dropdown, draw_legend, include_lone_images, include_sub_grids, no_fixed_seeds, margin_size, csv_mode]
 
+    def api_args(self, is_img2img):
+        self.current_axis_options = [x for x in axis_options if type(x) == AxisOption or x.is_img2img == is_img2img]
+        axis_labels = [x.label for x in self.current_axis_options]
+
+        res = []
+        for axis, default_type in (("X", 1), ("Y", 0), ("Z", 0)):
+            res += [
+                {"label": f"{axis} type", "value": default_type, "choices": axis_labels},
+                {"label": f"{axis} values", "value": ""},
+                {"label": f"{axis} values", "value": []},
+            ]
+
+        return res + [
+            {"label": "Draw legend", "value": True},
+            {"label": "Include Sub Images", "value": False},
+            {"label": "Include Sub Grids", "value": False},
+            {"label": "Keep -1 for seeds", "value": False},
+            {"label": "Grid margins (px)", "value": 0, "minimum": 0, "maximum": 500, "step": 2},
+            {"label": "Use text inputs instead of dropdowns", "value": False},
+        ]
+
     def run(self, p, x_type, x_values, x_values_dropdown, y_type, y_values, y_values_dropdown, z_type, z_values, z_values_dropdown, draw_legend, include_lone_images, include_sub_grids, no_fixed_seeds, margin_size, csv_mode):
         if not no_fixed_seeds:
             modules.processing.fix_seed(p)
@@ -656,9 +679,9 @@ class Script(scripts.Script):
         print(f"X/Y/Z plot will create {len(xs) * len(ys) * len(zs) * image_cell_count} images on {len(zs)} {len(xs)}x{len(ys)} grid{plural_s}{cell_console_text}. (Total steps to process: {total_steps})")
         shared.total_tqdm.updateTotal(total_steps)
 
-        state.xyz_plot_x = AxisInfo(x_opt, xs)
-        state.xyz_plot_y = AxisInfo(y_opt, ys)
-        state.xyz_plot_z = AxisInfo(z_opt, zs)
+        shared.state.xyz_plot_x = AxisInfo(x_opt, xs)
+        shared.state.xyz_plot_y = AxisInfo(y_opt, ys)
+        shared.state.xyz_plot_z = AxisInfo(z_opt, zs)
 
         # If one of the axes is very slow to change between (like SD model
         # checkpoint), then make sure it is in the outer iteration of the nested
@@ -0,0 +1,25 @@
+import numpy as np
+import pytest
+from PIL import Image
+
+from components import images
+
+
+@pytest.mark.parametrize("width,height,tile,overlap", [
+    (100, 100, 192, 8),
+    (150, 300, 192, 8),
+    (300, 150, 192, 8),
+    (63, 64, 64, 8),
+    (424, 26, 192, 8),
+    (41, 32, 64, 32),
+    (632, 12, 256, 16),
+    (700, 500, 192, 8),
+    (1024, 768, 512, 64),
+])
+def test_combine_grid_matches_pil(width, height, tile, overlap):
+    rng = np.random.default_rng(width * 1000 + height)
+    image = Image.fromarray(rng.integers(0, 256, (height, width, 3), dtype=np.uint8))
+
+    grid = images.split_grid(image, tile, tile, overlap)
+
+    assert np.array_equal(np.asarray(images.combine_grid(grid)), np.asarray(images.combine_grid_pil(grid)))
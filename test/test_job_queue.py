@@ -0,0 +1,135 @@
+import threading
+import time
+from collections import Counter
+from types import SimpleNamespace
+
+import pytest
+
+from components import shared
+from components.job_queue import Job, JobQueue
+from utils import call_queue
+
+
+@pytest.fixture
+def job_queue_opts(monkeypatch):
+    opts = SimpleNamespace(
+        job_queue_max_per_client=0,
+        job_queue_affinity_max_wait=0,
+        job_queue_keep_results=16,
+        job_queue_result_ttl=30,
+        sd_model_checkpoint=None,
+        sd_vae=None,
+    )
+    monkeypatch.setattr(shared, "opts", opts)
+    return opts
+
+
+def wait_until_finished(queue, id_job, timeout=10):
+    deadline = time.time() + timeout
+    while queue.get(id_job).active:
+        assert time.time() < deadline, f"job {id_job} didn't finish"
+        time.sleep(0.01)
+
+
+def test_worker_leaves_tracked_ui_tasks_alone(job_queue_opts):
+    queue = JobQueue()
+    queue.track("task(ui)")
+
+    job = queue.submit(lambda: "result", kind="txt2img")
+    wait_until_finished(queue, job.id)
+
+    assert queue.get(job.id).status == "done"
+    assert queue.get(job.id).result == "result"
+
+    ui_task = queue.get("task(ui)")
+    assert ui_task.status == "queued"
+    assert ui_task.error is None
+    assert queue.queued() == ["task(ui)"]
+
+
+def test_only_last_ui_results_are_kept(job_queue_opts):
+    queue = JobQueue()
+    for i in range(4):
+        queue.track(f"task({i})")
+        queue.start(f"task({i})")
+        queue.record_result(f"task({i})", f"result {i}")
+        queue.finish(f"task({i})")
+        time.sleep(0.01)
+
+    assert [queue.get(f"task({i})").result for i in range(4)] == [None, None, "result 2", "result 3"]
+
+
+def test_queued_ui_task_is_not_cancelled(job_queue_opts):
+    queue = JobQueue()
+    queue.track("task(ui)")
+
+    assert not queue.cancel("task(ui)")
+    assert queue.get("task(ui)").status == "queued"
+
+
+def test_two_workers_run_each_job_once(job_queue_opts, monkeypatch):
+    monkeypatch.setattr(call_queue, "concurrent_jobs", lambda: 2)
+
+    queue = JobQueue()
+    runs = Counter()
+    lock = threading.Lock()
+
+    def make_job(i):
+        def run():
+            with lock:
+                runs[i] += 1
+            time.sleep(0.01)
+            return i
+
+        return run
+
+    jobs = [queue.submit(make_job(i), kind="txt2img") for i in range(10)]
+    for job in jobs:
+        wait_until_finished(queue, job.id)
+
+    assert len(queue.workers) == 2
+    assert runs == Counter(range(10))
+    assert [queue.get(job.id).result for job in jobs] == list(range(10))
+
+
+def test_cancelled_job_is_not_started(job_queue_opts):
+    queue = JobQueue()
+    queue.track("task(ui)")
+    queue.jobs["task(ui)"].func = lambda: None
+    queue.cancel("task(ui)")
+
+    assert not queue.start("task(ui)")
+    assert queue.get("task(ui)").status == "cancelled"
+
+
+@pytest.fixture
+def loaded_checkpoint(job_queue_opts, monkeypatch):
+    job_queue_opts.job_queue_affinity_max_wait = 60
+    job_queue_opts.sd_model_checkpoint = "a"
+    job_queue_opts.sd_vae = "Automatic"
+    monkeypatch.setattr(JobQueue, "checkpoint_title", staticmethod(lambda name: name))
+    monkeypatch.setattr(JobQueue, "loaded_affinity", staticmethod(lambda: ("a", None)))
+
+
+def queued_job(queue, id_job, priority=0, affinity=None, age=0):
+    job = queue.jobs[id_job] = Job(id_job, func=lambda: None, priority=priority, affinity=affinity, order=len(queue.jobs))
+    job.created -= age
+    return job
+
+
+def test_pick_prefers_loaded_checkpoint(loaded_checkpoint):
+    queue = JobQueue()
+    queued_job(queue, "job(b)", affinity=("b", None, None))
+    queued_job(queue, "job(extras)")
+    queued_job(queue, "job(a)", affinity=("a", None, None))
+
+    assert queue.pick(queue.queued_jobs()).id == "job(a)"
+    assert queue.stats["swaps_avoided"] == 1
+
+
+def test_pick_runs_head_when_a_job_is_overdue(loaded_checkpoint):
+    queue = JobQueue()
+    queued_job(queue, "job(old)", affinity=("a", None, None), age=120)
+    queued_job(queue, "job(urgent)", priority=5, affinity=("b", None, None))
+
+    assert queue.pick(queue.queued_jobs()).id == "job(urgent)"
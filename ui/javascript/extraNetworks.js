@@ -35,63 +35,27 @@ function setupExtraNetworksForTab(tabname) {
     tabs.appendChild(refresh);
     tabs.appendChild(showDirsDiv);
 
+    // cards are searched and sorted on the server; changing the search or the order requests them anew
     var applyFilter = function() {
-        var searchTerm = search.value.toLowerCase();
-
-        gradioApp().querySelectorAll('#' + tabname + '_extra_tabs div.card').forEach(function(elem) {
-            var searchOnly = elem.querySelector('.search_only');
-            var text = elem.querySelector('.name').textContent.toLowerCase() + " " + elem.querySelector('.search_term').textContent.toLowerCase();
-
-            var visible = text.indexOf(searchTerm) != -1;
-
-            if (searchOnly && searchTerm.length < 4) {
-                visible = false;
-            }
-
-            elem.style.display = visible ? "" : "none";
-        });
-
-        applySort();
-    };
-
-    var applySort = function() {
-        var cards = gradioApp().querySelectorAll('#' + tabname + '_extra_tabs div.card');
-
-        var reverse = sortOrder.classList.contains("sortReverse");
         var sortKey = sort.querySelector("input").value.toLowerCase().replace("sort", "").replaceAll(" ", "_").replace(/_+$/, "").trim() || "name";
-        sortKey = "sort" + sortKey.charAt(0).toUpperCase() + sortKey.slice(1);
-        var sortKeyStore = sortKey + "-" + (reverse ? "Descending" : "Ascending") + "-" + cards.length;
-
-        if (sortKeyStore == sort.dataset.sortkey) {
-            return;
-        }
-        sort.dataset.sortkey = sortKeyStore;
-
-        cards.forEach(function(card) {
-            card.originalParentElement = card.parentElement;
-        });
-        var sortedCards = Array.from(cards);
-        sortedCards.sort(function(cardA, cardB) {
-            var a = cardA.dataset[sortKey];
-            var b = cardB.dataset[sortKey];
-            if (!isNaN(a) && !isNaN(b)) {
-                return parseInt(a) - parseInt(b);
-            }
-
-            return (a < b ? -1 : (a > b ? 1 : 0));
-        });
-        if (reverse) {
-            sortedCards.reverse();
-        }
-        cards.forEach(function(card) {
-            card.remove();
-        });
-        sortedCards.forEach(function(card) {
-            card.originalParentElement.appendChild(card);
+        var query = {
+            search: search.value,
+            sort: sortKey,
+            order: sortOrder.classList.contains("sortReverse") ? "descending" : "ascending",
+        };
+
+        gradioApp().querySelectorAll('#' + tabname + '_extra_tabs .extra-network-cards[data-page]').forEach(function(container) {
+            extraNetworksLoadCards(container, query);
         });
     };
 
-    search.addEventListener("input", applyFilter);
+    var applySort = applyFilter;
+
+    var searchTimeout = null;
+    search.addEventListener("input", function() {
+        clearTimeout(searchTimeout);
+        searchTimeout = setTimeout(applyFilter, 250);
+    });
     sortOrder.addEventListener("click", function() {
         sortOrder.classList.toggle("sortReverse");
         applySort();
@@ -111,6 +75,153 @@ function setupExtraNetworksForTab(tabname) {
     showDirsUpdate();
 }
 
+var extraNetworksCardLists = {};
+
+function extraNetworksLoadCards(container, query) { // starts showing cards matching the query in the container, requesting more as the end of the list is scrolled into view
+    var list = extraNetworksCardLists[container.id];
+    if (!list) {
+        list = extraNetworksCardLists[container.id] = {sentinel: document.createElement('div'), visible: false};
+        list.sentinel.className = 'extra-network-cards-sentinel';
+        list.observer = new IntersectionObserver(function(entries) {
+            list.visible = entries[entries.length - 1].isIntersecting;
+            if (list.visible) {
+                extraNetworksRequestCards(list);
+            }
+        });
+    }
+
+    if (list.container !== container) { // gradio replaces page HTML on refresh
+        list.observer.disconnect();
+        list.container = container;
+        list.visible = false;
+    }
+
+    list.query = query;
+    list.cursor = null;
+    list.done = false;
+    list.request = (list.request || 0) + 1;
+    list.loading = false;
+
+    container.innerHTML = '';
+    container.appendChild(list.sentinel);
+    list.observer.observe(list.sentinel);
+
+    if (list.visible) {
+        extraNetworksRequestCards(list);
+    }
+}
+
+function extraNetworksRequestCards(list) {
+    if (list.loading || list.done) return;
+
+    var container = list.container;
+    var request = list.request;
+    var args = Object.assign({page: container.dataset.page}, list.query);
+    if (list.cursor) {
+        args.cursor = list.cursor;
+    }
+
+    list.loading = true;
+    requestGet("./sd_extra_networks/items", args, function(data) {
+        if (request != list.request) return; // the query has changed while the request was in progress
+
+        list.loading = false;
+        list.cursor = data.next_cursor;
+        list.done = !data.next_cursor;
+
+        data.items.forEach(function(item) {
+            container.insertBefore(extraNetworksCreateCard(container, item), list.sentinel);
+        });
+
+        if (data.total !== null) {
+            var noCards = gradioApp().getElementById(container.id.replace(/_cards$/, '_no_cards'));
+            if (noCards) {
+                noCards.style.display = data.total == 0 && !list.query.search ? '' : 'none';
+            }
+        }
+
+        // the sentinel is still visible if the cards didn't fill the screen
+        if (!list.done && list.visible) {
+            setTimeout(function() {
+                extraNetworksRequestCards(list);
+            }, 1);
+        }
+    }, function() {
+        if (request == list.request) {
+            list.loading = false;
+        }
+    });
+}
+
+function extraNetworksCreateCard(container, item) {
+    var tabname = container.dataset.tabname;
+
+    var card = document.createElement('div');
+    card.className = 'card';
+    card.dataset.name = item.name;
+    if (opts.extra_networks_card_height) card.style.height = opts.extra_networks_card_height + 'px';
+    if (opts.extra_networks_card_width) card.style.width = opts.extra_networks_card_width + 'px';
+    card.style.fontSize = (opts.extra_networks_card_text_scale * 100) + '%';
+
+    var onclick = item.onclick || ('return cardClicked(' + JSON.stringify(tabname) + ', ' + item.prompt + ', ' + container.dataset.allowNegativePrompt + ')');
+    card.onclick = new Function('event', onclick);
+
+    if (item.preview) {
+        var img = document.createElement('img');
+        img.className = 'preview';
+        img.loading = 'lazy';
+        img.src = item.preview;
+        card.appendChild(img);
+    }
+
+    var buttonRow = document.createElement('div');
+    buttonRow.className = 'button-row';
+    if (item.metadata) {
+        var metadataButton = document.createElement('div');
+        metadataButton.className = 'metadata-button card-button';
+        metadataButton.title = 'Show internal metadata';
+        metadataButton.onclick = function(event) {
+            extraNetworksRequestMetadata(event, container.dataset.page, item.name);
+        };
+        buttonRow.appendChild(metadataButton);
+    }
+
+    var editButton = document.createElement('div');
+    editButton.className = 'edit-button card-button';
+    editButton.title = 'Edit metadata';
+    editButton.onclick = function(event) {
+        extraNetworksEditUserMetadata(event, tabname, container.dataset.idPage, item.name);
+    };
+    buttonRow.appendChild(editButton);
+    card.appendChild(buttonRow);
+
+    var actions = document.createElement('div');
+    actions.className = 'actions';
+
+    var additional = document.createElement('div');
+    additional.className = 'additional';
+    var searchTerm = document.createElement('span');
+    searchTerm.style.display = 'none';
+    searchTerm.className = 'search_term' + (item.search_only ? ' search_only' : '');
+    searchTerm.textContent = item.search_term;
+    additional.appendChild(searchTerm);
+    actions.appendChild(additional);
+
+    var name = document.createElement('span');
+    name.className = 'name';
+    name.textContent = item.name;
+    actions.appendChild(name);
+
+    var description = document.createElement('span');
+    description.className = 'description';
+    description.innerHTML = item.description; // descriptions may contain HTML, as in cards rendered on the server
+    actions.appendChild(description);
+
+    card.appendChild(actions);
+
+    return card;
+}
+
 function extraNetworksMovePromptToTab(tabname, id, showPrompt, showNegativePrompt) {
     if (!gradioApp().querySelector('.toprow-compact-tools')) return; // only applicable for compact prompt layout
 
@@ -381,6 +492,7 @@ function extraNetworksRefreshSingleCard(page, tabname, name) {
     requestGet("./sd_extra_networks/get-single-card", {page: page, tabname: tabname, name: name}, function(data) {
         if (data && data.html) {
             var card = gradioApp().querySelector(`#${tabname}_${page.replace(" ", "_")}_cards > .card[data-name="${name}"]`);
+            if (!card) return; // not loaded yet; it will be requested with the new data when scrolled into view
 
             var newDiv = document.createElement('DIV');
             newDiv.innerHTML = data.html;
@@ -153,9 +153,10 @@ def extension_table():
         <tbody>
     """
 
+    extensions.read_info_from_repos()
+
     for ext in extensions.extensions:
         ext: extensions.Extension
-        ext.read_info_from_repo()
 
         remote = f"""<a href="{html.escape(ext.remote or '')}" target="_blank">{html.escape("built-in" if ext.is_builtin else ext.remote or '')}</a>"""
 
@@ -527,8 +528,7 @@ def refresh_available_extensions_from_data(hide_tags, sort_column, filter_text="
 
 
 def preload_extensions_git_metadata():
-    for extension in extensions.extensions:
-        extension.read_info_from_repo()
+    extensions.read_info_from_repos()
 
 
 def create_ui():
@@ -13,7 +13,7 @@ from fastapi.exceptions import HTTPException
 
 from components.generation_parameters_copypaste import image_from_url_text
 from ui.ui_components import ToolButton
-from ui import ui_extra_networks_user_metadata
+from ui import ui_extra_networks_user_metadata, ui_extra_networks_index
 
 extra_pages = []
 allowed_dirs = set()
@@ -82,15 +82,42 @@ def get_single_card(page: str = "", tabname: str = "", name: str = ""):
         item = page.items.get(name)
 
     page.read_user_metadata(item)
+    ui_extra_networks_index.get_index(page).update_item(item)
     item_html = page.create_html_for_item(item, tabname)
 
     return JSONResponse({"html": item_html})
 
 
+def get_items(page: str = "", search: str = "", sort: str = "default", order: str = "ascending", limit: int = 0, cursor: str = None, refresh: bool = False):
+    """
+    Returns cards of an extra networks page as JSON, searched, sorted and paginated on the server. Pass next_cursor from
+    the response as cursor to get the next page of results. With refresh, the page's lists are reloaded and changed
+    items are read again before the search.
+    """
+
+    from starlette.responses import JSONResponse
+
+    page = next(iter([x for x in extra_pages if x.name == page]), None)
+    if page is None:
+        raise HTTPException(status_code=404, detail="Page not found")
+
+    index = ui_extra_networks_index.get_index(page)
+    if refresh:
+        index.update(refresh=True)
+
+    try:
+        res = index.query(search=search, sort=sort, descending=order.lower() == "descending", limit=limit or shared.opts.extra_networks_page_size, cursor=cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e)) from e
+
+    return JSONResponse(res)
+
+
 def add_pages_to_demo(app):
     app.add_api_route("/sd_extra_networks/thumb", fetch_file, methods=["GET"])
     app.add_api_route("/sd_extra_networks/metadata", get_metadata, methods=["GET"])
     app.add_api_route("/sd_extra_networks/get-single-card", get_single_card, methods=["GET"])
+    app.add_api_route("/sd_extra_networks/items", get_items, methods=["GET"])
 
 
 def quote_js(s):
@@ -139,60 +166,22 @@ class ExtraNetworksPage:
         return ""
 
     def create_html(self, tabname):
-        items_html = ''
-
-        self.metadata = {}
-
-        subdirs = {}
-        for parentdir in [os.path.abspath(x) for x in self.allowed_directories_for_previews()]:
-            for root, dirs, _ in sorted(os.walk(parentdir, followlinks=True), key=lambda x: shared.natural_sort_key(x[0])):
-                for dirname in sorted(dirs, key=shared.natural_sort_key):
-                    x = os.path.join(root, dirname)
-
-                    if not os.path.isdir(x):
-                        continue
-
-                    subdir = os.path.abspath(x)[len(parentdir):].replace("\\", "/")
-
-                    if shared.opts.extra_networks_dir_button_function:
-                        if not subdir.startswith("/"):
-                            subdir = "/" + subdir
-                    else:
-                        while subdir.startswith("/"):
-                            subdir = subdir[1:]
-
-                    is_empty = len(os.listdir(x)) == 0
-                    if not is_empty and not subdir.endswith("/"):
-                        subdir = subdir + "/"
-
-                    if ("/." in subdir or subdir.startswith(".")) and not shared.opts.extra_networks_show_hidden_directories:
-                        continue
-
-                    subdirs[subdir] = 1
+        """
+        Creates HTML for the page: directory buttons and an empty container for cards; cards are requested from
+        /sd_extra_networks/items and rendered by javascript as they are scrolled into view.
+        """
 
-        if subdirs:
-            subdirs = {"": 1, **subdirs}
+        index = ui_extra_networks_index.get_index(self)
+        index.update()
 
         subdirs_html = "".join([f"""
 <button class='lg secondary gradio-button custom-button{" search-all" if subdir=="" else ""}' onclick='extraNetworksSearchButton("{tabname}_extra_search", event)'>
 {html.escape(subdir if subdir!="" else "all")}
 </button>
-""" for subdir in subdirs])
-
-        self.items = {x["name"]: x for x in self.list_items()}
-        for item in self.items.values():
-            metadata = item.get("metadata")
-            if metadata:
-                self.metadata[item["name"]] = metadata
-
-            if "user_metadata" not in item:
-                self.read_user_metadata(item)
+""" for subdir in index.subdirs])
 
-            items_html += self.create_html_for_item(item, tabname)
-
-        if items_html == '':
-            dirs = "".join([f"<li>{x}</li>" for x in self.allowed_directories_for_previews()])
-            items_html = shared.html("extra-networks-no-cards.html").format(dirs=dirs)
+        dirs = "".join([f"<li>{x}</li>" for x in self.allowed_directories_for_previews()])
+        no_cards_html = shared.html("extra-networks-no-cards.html").format(dirs=dirs)
 
         self_name_id = self.name.replace(" ", "_")
 
@@ -200,13 +189,24 @@ class ExtraNetworksPage:
 <div id='{tabname}_{self_name_id}_subdirs' class='extra-network-subdirs extra-network-subdirs-cards'>
 {subdirs_html}
 </div>
-<div id='{tabname}_{self_name_id}_cards' class='extra-network-cards'>
-{items_html}
+<div id='{tabname}_{self_name_id}_cards' class='extra-network-cards' data-tabname='{html.escape(tabname)}' data-page='{html.escape(self.name)}' data-id-page='{html.escape(self.id_page)}' data-allow-negative-prompt='{"true" if self.allow_negative_prompt else "false"}' data-version='{index.version}'>
+</div>
+<div id='{tabname}_{self_name_id}_no_cards' class='extra-network-no-cards' style='display: none'>
+{no_cards_html}
 </div>
 """
 
         return res
 
+    def item_filenames(self):
+        """
+        Returns a dict of item name -> filename for all items without creating them, so that the index of cards can
+        recreate only items whose files have changed. None means the page doesn't support this, and all of its items
+        are recreated whenever the index is updated.
+        """
+
+        return None
+
     def create_item(self, name, index=None):
         raise NotImplementedError()
 
@@ -424,7 +424,7 @@ def create_ui(interface: gr.Blocks, unrelated_tabs, tabname):
 
     def refresh():
         for pg in ui.stored_extra_pages:
-            pg.refresh()
+            ui_extra_networks_index.get_index(pg).update(refresh=True)
 
         ui.pages_contents = [pg.create_html(ui.tabname) for pg in ui.stored_extra_pages]
 
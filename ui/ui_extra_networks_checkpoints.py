@@ -44,6 +44,9 @@ class ExtraNetworksPageCheckpoints(ui_extra_networks.ExtraNetworksPage):
             if item is not None:
                 yield item
 
+    def item_filenames(self):
+        return {name: checkpoint.filename for name, checkpoint in list(sd_models.checkpoints_list.items())}
+
     def allowed_directories_for_previews(self):
         return [v for v in [shared.cmd_opts.ckpt_dir, sd_models.model_path] if v is not None]
 
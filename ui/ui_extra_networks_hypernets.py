@@ -42,6 +42,9 @@ class ExtraNetworksPageHypernetworks(ui_extra_networks.ExtraNetworksPage):
             if item is not None:
                 yield item
 
+    def item_filenames(self):
+        return dict(shared.hypernetworks)
+
     def allowed_directories_for_previews(self):
         return [shared.cmd_opts.hypernetwork_dir]
 
@@ -0,0 +1,309 @@
+import base64
+import bisect
+import html
+import json
+import os
+import threading
+
+from components import shared
+from utils import errors
+
+sort_fields = ("default", "name", "path", "date_created", "date_modified")
+
+
+def directory_listing(path):
+    """returns a dict of group -> tuple of (filename, mtime, size) for files in path; group is the part of filename before the first dot"""
+
+    groups = {}
+    try:
+        with os.scandir(path) as entries:
+            for entry in entries:
+                try:
+                    if not entry.is_file():
+                        continue
+
+                    stat = entry.stat()
+                except OSError:
+                    continue
+
+                groups.setdefault(entry.name.partition(".")[0], []).append((entry.name, stat.st_mtime_ns, stat.st_size))
+    except OSError:
+        pass
+
+    return {group: tuple(sorted(files)) for group, files in groups.items()}
+
+
+def sort_value(value):
+    """makes sort keys of different types comparable with each other, and storable in a cursor"""
+
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return (0, value)
+
+    return (1, str(value if value is not None else "").lower())
+
+
+def encode_cursor(key):
+    return base64.urlsafe_b64encode(json.dumps(key).encode("utf8")).decode("ascii")
+
+
+def decode_cursor(cursor):
+    try:
+        value, name = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return tuple(value), name
+    except Exception:
+        raise ValueError(f"invalid cursor: {cursor}") from None
+
+
+class PageIndex:
+    """
+    Cards of an extra networks page kept in memory, for searching, sorting and paginating on the server.
+
+    update() only creates items that have changed since the previous update. To find these, it lists each directory
+    with items once and compares the modification times and sizes of each item's file and of files next to it that have
+    the same name up to the first dot, like previews, descriptions and user metadata. This is only possible for pages
+    that implement item_filenames(); for other pages, all items are created anew on every update.
+
+    Items also hold values that are worked out later without any file changing, like hashes of checkpoints computed after
+    they are first loaded; to pick those up, update(refresh=True) creates all items anew.
+    """
+
+    def __init__(self, page):
+        self.page = page
+        self.lock = threading.RLock()
+        self.items = {}
+        """source name -> item as made by page.create_item"""
+        self.signatures = {}
+        self.subdirs = []
+        self.version = 0
+        self.indexed = False
+        self.sorted = {}
+        """sort field -> (version, sorted list of (sort value, item name), item names in the same order)"""
+
+    def signature(self, filename, listings):
+        if not filename:
+            return None
+
+        dirname, basename = os.path.split(os.path.abspath(filename))
+        listing = listings.get(dirname)
+        if listing is None:
+            listing = listings[dirname] = directory_listing(dirname)
+
+        return listing.get(basename.partition(".")[0])
+
+    def create_item(self, name, index):
+        item = self.page.create_item(name, index)
+        if item is not None and "user_metadata" not in item:
+            self.page.read_user_metadata(item)
+
+        return item
+
+    def update(self, refresh=False):
+        """
+        brings the index up to date with files on disk; if refresh is True, asks the page to reload its lists of items
+        first and creates every item anew
+        """
+
+        with self.lock:
+            if refresh:
+                self.page.refresh()
+
+            filenames = self.page.item_filenames()
+            if filenames is None:
+                items = {}
+                for item in self.page.list_items():
+                    items[item["name"]] = item
+                    if "user_metadata" not in item:
+                        self.page.read_user_metadata(item)
+
+                changed = True
+                self.signatures = {}
+            else:
+                items = {}
+                signatures = {}
+                listings = {}
+                changed = len(filenames) != len(self.items)
+
+                for index, (name, filename) in enumerate(filenames.items()):
+                    signature = self.signature(filename, listings)
+                    item = self.items.get(name)
+
+                    if refresh or item is None or signature is None or self.signatures.get(name) != signature:
+                        try:
+                            item = self.create_item(name, index)
+                        except Exception as e:
+                            errors.display(e, f"creating item for extra network {name}")
+                            item = None
+
+                        changed = True
+                    elif item.get("sort_keys", {}).get("default") != index:
+                        item["sort_keys"] = {**item.get("sort_keys", {}), "default": index}
+                        changed = True
+
+                    if item is not None:
+                        items[name] = item
+                        signatures[name] = signature
+
+                self.signatures = signatures
+
+            self.items = items
+            self.page.items = {item["name"]: item for item in items.values()}
+            self.page.metadata = {item["name"]: item["metadata"] for item in items.values() if item.get("metadata")}
+
+            if changed or not self.indexed:
+                self.subdirs = self.list_subdirs()
+                self.version += 1
+                self.indexed = True
+
+    def ensure_indexed(self):
+        if not self.indexed:
+            self.update()
+
+    def update_item(self, item):
+        """replaces an item after it has been created anew elsewhere, e.g. after its user metadata has been edited"""
+
+        with self.lock:
+            for name, existing in self.items.items():
+                if existing["name"] == item["name"]:
+                    self.items[name] = item
+                    self.signatures.pop(name, None)
+                    self.version += 1
+                    break
+
+    def local_path(self, filename):
+        for parentdir in self.page.allowed_directories_for_previews():
+            absdir = os.path.abspath(parentdir)
+            if filename.startswith(absdir):
+                return absdir, filename[len(absdir):]
+
+        return None, None
+
+    def list_subdirs(self):
+        """directories with items, formatted for directory buttons; unlike directory buttons in older versions, directories without any items are not listed"""
+
+        subdirs = {}
+        for item in self.items.values():
+            filename = os.path.abspath(item.get("filename") or "")
+            parentdir, local_path = self.local_path(filename)
+            if parentdir is None:
+                continue
+
+            parts = local_path.replace("\\", "/").strip("/").split("/")[:-1]
+            for i in range(1, len(parts) + 1):
+                subdir = "/".join(parts[:i])
+                subdir = ("/" if shared.opts.extra_networks_dir_button_function else "") + subdir + "/"
+
+                if ("/." in subdir or subdir.startswith(".")) and not shared.opts.extra_networks_show_hidden_directories:
+                    continue
+
+                subdirs[subdir] = 1
+
+        subdirs = sorted(subdirs, key=shared.natural_sort_key)
+
+        return [""] + subdirs if subdirs else []
+
+    def sorted_names(self, field):
+        cached = self.sorted.get(field)
+        if cached is not None and cached[0] == self.version:
+            return cached[1], cached[2]
+
+        keys = sorted((sort_value(item.get("sort_keys", {}).get(field)), item["name"]) for item in self.items.values())
+        names = [name for _, name in keys]
+        self.sorted[field] = (self.version, keys, names)
+
+        return keys, names
+
+    def card(self, item):
+        """returns the data the browser needs to render a card for item"""
+
+        _, local_path = self.local_path(item.get("filename", ""))
+        onclick = item.get("onclick")
+        if onclick is not None:
+            # pages provide onclick as a quoted and escaped HTML attribute
+            onclick = html.unescape(onclick.strip()[1:-1] if onclick.strip()[:1] in "\"'" else onclick)
+
+        return {
+            "name": item["name"],
+            "preview": item.get("preview"),
+            "description": (item.get("description") or "") if shared.opts.extra_networks_card_show_desc else "",
+            "search_term": item.get("search_term", ""),
+            "prompt": item.get("prompt"),
+            "onclick": onclick,
+            "local_preview": item.get("local_preview"),
+            "metadata": bool(item.get("metadata")),
+            "search_only": bool(local_path) and ("/." in local_path or "\\." in local_path) and shared.opts.extra_networks_hidden_models != "Always",
+            "sort_keys": item.get("sort_keys", {}),
+        }
+
+    def matches(self, card, search):
+        if card["search_only"] and (shared.opts.extra_networks_hidden_models == "Never" or len(search) < 4):
+            return False
+
+        return not search or search in f'{card["name"]} {card["search_term"]}'.lower()
+
+    def query(self, search="", sort="default", descending=False, limit=100, cursor=None):
+        """
+        Returns a dict with one page of cards matching the search, in the sort order; cursor is the next_cursor value
+        from the response for the previous page, or None for the first page.
+        """
+
+        if sort not in sort_fields:
+            raise ValueError(f"unknown sort field: {sort}; must be one of {', '.join(sort_fields)}")
+
+        search = (search or "").strip().lower()
+        limit = max(1, limit)
+
+        with self.lock:
+            self.ensure_indexed()
+
+            keys, names = self.sorted_names(sort)
+            items = {item["name"]: item for item in self.items.values()}
+
+            if cursor is None:
+                start = len(keys) - 1 if descending else 0
+            else:
+                key = decode_cursor(cursor)
+                start = bisect.bisect_left(keys, key) - 1 if descending else bisect.bisect_right(keys, key)
+
+            positions = range(start, -1, -1) if descending else range(start, len(keys))
+
+            cards = []
+            next_cursor = None
+            total = 0
+            for position in positions:
+                card = self.card(items[names[position]])
+                if not self.matches(card, search):
+                    continue
+
+                if len(cards) == limit:
+                    next_cursor = encode_cursor(cards[-1]["cursor"])
+                    break
+
+                card["cursor"] = keys[position]
+                cards.append(card)
+
+            for card in cards:
+                del card["cursor"]
+
+            if cursor is None:
+                total = sum(1 for item in self.items.values() if self.matches(self.card(item), search))
+
+            return {
+                "items": cards,
+                "next_cursor": next_cursor,
+                "total": total if cursor is None else None,
+                "version": self.version,
+                "subdirs": self.subdirs,
+            }
+
+
+indexes = {}
+indexes_lock = threading.Lock()
+
+
+def get_index(page):
+    with indexes_lock:
+        index = indexes.get(page.name)
+        if index is None or index.page is not page:
+            index = indexes[page.name] = PageIndex(page)
+
+        return index
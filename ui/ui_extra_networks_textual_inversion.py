@@ -40,5 +40,8 @@ class ExtraNetworksPageTextualInversion(ui_extra_networks.ExtraNetworksPage):
             if item is not None:
                 yield item
 
+    def item_filenames(self):
+        return {name: embedding.filename for name, embedding in list(sd_hijack.model_hijack.embedding_db.word_embeddings.items())}
+
     def allowed_directories_for_previews(self):
         return list(sd_hijack.model_hijack.embedding_db.embedding_dirs)
@@ -122,3 +122,28 @@ def cached_data_for_file(subsection, title, filename, func):
         dump_cache()
 
     return entry['value']
+
+
+def cached_data_for_key(subsection, title, key, func):
+    """
+    Same as cached_data_for_file, but instead of a file's modification time, the cached data is checked against key,
+    a string that changes whenever the data has to be generated again.
+    """
+
+    existing_cache = cache(subsection)
+
+    entry = existing_cache.get(title)
+    if entry and entry.get("key") != key:
+        entry = None
+
+    if not entry or 'value' not in entry:
+        value = func()
+        if value is None:
+            return None
+
+        entry = {'key': key, 'value': value}
+        existing_cache[title] = entry
+
+        dump_cache()
+
+    return entry['value']
@@ -1,11 +1,185 @@
+from contextlib import contextmanager
 from functools import wraps
 import html
+import os
+import threading
 import time
 
-from components import shared, progress
+import torch
+
+from components import shared, shared_state, progress, job_context
 from utils import errors,devices,fifo_lock
 
-queue_lock = fifo_lock.FIFOLock()
+
+def concurrent_jobs():
+    """how many generation jobs may run at the same time; more than one only when generating on CPU"""
+
+    if devices.device is None or devices.device.type != "cpu":
+        return 1
+
+    return max(1, int(shared.opts.cpu_concurrent_jobs))
+
+
+class QueueLock(fifo_lock.FIFOLock):
+    """
+    Lock for work that uses the model. Entering it with `with queue_lock:` gives exclusive access. Generation jobs use
+    `with queue_lock.job(id_task):` instead, which lets up to concurrent_jobs() of them run at the same time. Each of
+    those gets its own shared.state (see components/job_context.py) and its own share of CPU cores: the thread running
+    the job and the intra-op threads it starts are pinned to the cores, and the intra-op thread count is set to match.
+    Everyone waits for their turn in the same FIFO queue.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.condition = threading.Condition()
+        self.slots = set()
+        """indexes of slots taken by running concurrent jobs"""
+        self.cores = None
+        self.threads = None
+        self.teams_lock = threading.Lock()
+        self.teams = {}
+        """native id of a thread -> native ids of intra-op threads it has started"""
+
+    def acquire(self, blocking=True):
+        if not super().acquire(blocking):
+            return False
+
+        with self.condition:
+            if not blocking and self.slots:
+                super().release()
+                return False
+
+            self.condition.wait_for(lambda: not self.slots)
+
+        return True
+
+    __enter__ = acquire
+
+    def take_slot(self, limit):
+        """waits until fewer than limit concurrent jobs run and returns index of a free slot"""
+
+        super().acquire()
+        try:
+            with self.condition:
+                self.condition.wait_for(lambda: len(self.slots) < limit)
+                slot = min(set(range(limit)) - self.slots)
+                self.slots.add(slot)
+        finally:
+            super().release()
+
+        return slot
+
+    def free_slot(self, slot):
+        with self.condition:
+            self.slots.discard(slot)
+            self.condition.notify_all()
+
+    def slot_cores(self, slot, limit):
+        if self.cores is None:
+            self.cores = sorted(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else list(range(os.cpu_count() or 1))
+            self.threads = torch.get_num_threads()
+
+        per_slot = max(1, len(self.cores) // limit)
+        return self.cores[slot * per_slot:(slot + 1) * per_slot] or self.cores
+
+    @staticmethod
+    def native_threads():
+        try:
+            return {int(x) for x in os.listdir("/proc/self/task")}
+        except OSError:
+            return set()
+
+    def pin(self, cores, threads):
+        """
+        Makes this thread and its intra-op threads use only the cores, with threads intra-op threads; affinity is only
+        supported on Linux.
+
+        Intra-op threads are started by OpenMP once for every thread that runs parallel work and are reused afterwards;
+        they keep the affinity they were started with, so those started by this thread for an earlier job, possibly with
+        other cores, are found in /proc/self/task and pinned too.
+        """
+
+        torch.set_num_threads(threads)
+
+        if not hasattr(os, "sched_setaffinity"):
+            return
+
+        ident = threading.get_native_id()
+        try:
+            os.sched_setaffinity(0, cores)
+
+            with self.teams_lock:
+                alive = self.native_threads()
+                self.teams = {owner: team & alive for owner, team in self.teams.items() if owner in alive}
+                team = self.teams.setdefault(ident, set())
+
+                for tid in list(team):
+                    try:
+                        os.sched_setaffinity(tid, cores)
+                    except ProcessLookupError:
+                        team.discard(tid)
+
+                # parallel work big enough to use all intra-op threads; threads that appear while it runs are new ones
+                # started by this thread, and already have the right affinity
+                torch.ones(max(threads, 1) * 65536).add_(1)
+                team.update(self.native_threads() - alive)
+        except OSError:
+            errors.report("Error setting CPU affinity for a job", exc_info=True)
+
+    @contextmanager
+    def job(self, id_task=None):
+        limit = concurrent_jobs()
+        if limit <= 1:
+            with self:
+                yield
+            return
+
+        slot = self.take_slot(limit)
+
+        threads = torch.get_num_threads()
+        cores = os.sched_getaffinity(0) if hasattr(os, "sched_getaffinity") else None
+        slot_cores = self.slot_cores(slot, limit)
+        self.pin(slot_cores, len(slot_cores))
+
+        state = shared_state.State()
+        state.concurrent = True
+
+        try:
+            with job_context.job(state, id_task=id_task, slot=slot) as context:
+                yield
+        finally:
+            self.pin(cores, threads)
+            self.free_slot(context.slot)
+
+    @contextmanager
+    def exclusive(self):
+        """
+        When called from a concurrent job, gives up its slot and waits until the job can run alone, so that it can change
+        things all jobs share, like settings or the loaded checkpoint; the job gets a slot back afterwards. Otherwise
+        does nothing.
+        """
+
+        context = job_context.current()
+        if context is None or context.slot is None:
+            yield
+            return
+
+        limit = concurrent_jobs()
+
+        self.free_slot(context.slot)
+        context.slot = None
+
+        try:
+            with self:
+                self.pin(self.cores, self.threads)
+                yield
+        finally:
+            context.slot = self.take_slot(max(limit, 1))
+            slot_cores = self.slot_cores(context.slot, limit)
+            self.pin(slot_cores, len(slot_cores))
+
+
+queue_lock = QueueLock()
 
 
 def wrap_queued_call(func):
@@ -29,7 +203,7 @@ def wrap_gradio_gpu_call(func, extra_outputs=None):
         else:
             id_task = None
 
-        with queue_lock:
+        with queue_lock.job(id_task):
             shared.state.begin(job=id_task)
             progress.start_task(id_task)
 
@@ -16,6 +16,7 @@ parser.add_argument("--test-server", action='store_true', help="launch.py argume
 parser.add_argument("--log-startup", action='store_true', help="launch.py argument: print a detailed log of what's happening at startup")
 parser.add_argument("--skip-prepare-environment", action='store_true', help="launch.py argument: skip all environment preparation")
 parser.add_argument("--skip-install", action='store_true', help="launch.py argument: skip installation of packages")
+parser.add_argument("--recheck-environment", action='store_true', help="launch.py argument: run all environment checks and extension installers even if nothing has changed since they last passed")
 parser.add_argument("--dump-sysinfo", action='store_true', help="launch.py argument: dump limited sysinfo file (without information about extensions, options) to disk and quit")
 parser.add_argument("--loglevel", type=str, help="log level; one of: CRITICAL, ERROR, WARNING, INFO, DEBUG", default=None)
 parser.add_argument("--do-not-download-clip", action='store_true', help="do not download CLIP model even if it's not included in the checkpoint")
@@ -72,6 +73,8 @@ parser.add_argument("--disable-nan-check", action='store_true', help="do not che
 parser.add_argument("--use-cpu", nargs='+', help="use CPU as torch device for specified modules", default=[], type=str.lower)
 parser.add_argument("--use-ipex", action="store_true", help="use Intel XPU as torch device")
 parser.add_argument("--disable-model-loading-ram-optimization", action='store_true', help="disable an optimization that reduces RAM use when loading a model")
+parser.add_argument("--shared-weights", action='store_true', help="keep CPU-resident checkpoint weights in a memory-mapped file, so that webui processes on the same host using the same checkpoint share them in RAM")
+parser.add_argument("--shared-weights-dir", type=str, default=None, help="directory for checkpoint weights converted for --shared-weights; default is SharedWeights in the checkpoints directory")
 parser.add_argument("--listen", action='store_true', help="launch gradio with 0.0.0.0 as server name, allowing to respond to network requests")
 parser.add_argument("--port", type=int, help="launch gradio with given server port, you need root/admin rights for ports < 1024, defaults to 7860 if available", default=None)
 parser.add_argument("--show-negative-prompt", action='store_true', help="does not do anything", default=False)
@@ -119,3 +122,7 @@ parser.add_argument('--timeout-keep-alive', type=int, default=30, help='set time
 parser.add_argument("--disable-all-extensions", action='store_true', help="prevent all extensions from running regardless of any other settings", default=False)
 parser.add_argument("--disable-extra-extensions", action='store_true', help="prevent all extensions except built-in from running regardless of any other settings", default=False)
 parser.add_argument("--skip-load-model-at-start", action='store_true', help="if load a model at web start, only take effect when --nowebui", )
+parser.add_argument("--workers", type=int, default=0, help="launch.py argument: run this many API-only webui processes, each with its own model, behind a dispatcher serving the API on --port; implies --nowebui")
+parser.add_argument("--worker-threads", type=int, default=0, help="number of torch threads for each of --workers processes; default is CPU count divided by number of workers")
+parser.add_argument("--worker-base-port", type=int, default=None, help="port of the first of --workers processes; others use following ports; default is one after --port")
+parser.add_argument("--startup-workers", type=int, default=None, help="number of threads for running independent startup steps concurrently; 1 runs them one after another; default is based on CPU count")
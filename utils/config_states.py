@@ -10,7 +10,7 @@ from datetime import datetime
 import git
 
 from components import shared, extensions
-from utils import errors
+from utils import errors, git_metadata
 from components.paths_internal import script_path, config_states_dir
 
 all_config_states = {}
@@ -47,6 +47,10 @@ def list_config_states():
 
 
 def get_webui_config():
+    info = git_metadata.read_info(script_path)
+    if info is not None:
+        return info
+
     webui_repo = None
 
     try:
@@ -81,9 +85,9 @@ def get_webui_config():
 def get_extension_config():
     ext_config = {}
 
-    for ext in extensions.extensions:
-        ext.read_info_from_repo()
+    extensions.read_info_from_repos()
 
+    for ext in extensions.extensions:
         entry = {
             "name": ext.name,
             "path": ext.path,
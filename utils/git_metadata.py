@@ -0,0 +1,254 @@
+"""
+Reading of basic information about a git repository (remote URL, branch, commit hash and date) directly from files in its
+.git directory, without running git.
+
+Only the common layouts are understood: loose and packed refs, loose commit objects, and commits stored undeltified in
+version 2 pack indexes. For anything else read_info returns None, and the caller should fall back to asking git.
+"""
+
+import mmap
+import os
+import re
+import struct
+import zlib
+
+re_remote_section = re.compile(r'^\s*\[\s*remote\s+"([^"]*)"\s*\]\s*$')
+re_section = re.compile(r'^\s*\[')
+re_url = re.compile(r'^\s*url\s*=\s*(.*?)\s*$')
+
+pack_commit_type = 1
+
+
+def read_text(filename):
+    try:
+        with open(filename, "r", encoding="utf8") as file:
+            return file.read()
+    except (OSError, UnicodeDecodeError):
+        return None
+
+
+def git_dirs(path):
+    """returns (gitdir, commondir) for a working tree: the .git directory, and the directory with shared refs and objects,
+    which is different from gitdir for worktrees; returns None if path is not a git working tree"""
+
+    gitdir = os.path.join(path, ".git")
+    if os.path.isfile(gitdir):
+        text = read_text(gitdir) or ""
+        if not text.startswith("gitdir:"):
+            return None
+
+        gitdir = os.path.normpath(os.path.join(path, text[len("gitdir:"):].strip()))
+
+    if not os.path.isdir(gitdir):
+        return None
+
+    commondir = read_text(os.path.join(gitdir, "commondir"))
+    commondir = os.path.normpath(os.path.join(gitdir, commondir.strip())) if commondir else gitdir
+
+    return gitdir, commondir
+
+
+def head_ref(gitdir):
+    """returns the name of the ref HEAD points to, like "refs/heads/master", or None if HEAD is detached"""
+
+    head = (read_text(os.path.join(gitdir, "HEAD")) or "").strip()
+    return head[len("ref:"):].strip() if head.startswith("ref:") else None
+
+
+def state_key(path):
+    """
+    Returns a string that changes when anything read_info returns can change: modification times of HEAD, the ref it
+    points to, packed-refs and config. Returns None if path is not a git working tree.
+    """
+
+    dirs = git_dirs(path)
+    if dirs is None:
+        return None
+
+    gitdir, commondir = dirs
+    ref = head_ref(gitdir)
+    files = [os.path.join(gitdir, "HEAD"), os.path.join(commondir, "packed-refs"), os.path.join(commondir, "config")]
+    if ref is not None:
+        files.append(os.path.join(commondir, ref))
+
+    def mtime(filename):
+        try:
+            return os.stat(filename).st_mtime_ns
+        except OSError:
+            return None
+
+    return ";".join(f"{os.path.basename(filename)}:{mtime(filename)}" for filename in files)
+
+
+def resolve_ref(gitdir, commondir, ref):
+    for directory in dict.fromkeys([gitdir, commondir]):
+        sha = (read_text(os.path.join(directory, ref)) or "").strip()
+        if sha:
+            return sha
+
+    for line in (read_text(os.path.join(commondir, "packed-refs")) or "").splitlines():
+        if line.startswith(("#", "^")):
+            continue
+
+        sha, _, name = line.partition(" ")
+        if name.strip() == ref:
+            return sha
+
+    return None
+
+
+def remote_url(commondir, remote="origin"):
+    section = None
+    for line in (read_text(os.path.join(commondir, "config")) or "").splitlines():
+        m = re_remote_section.match(line)
+        if m:
+            section = m.group(1)
+            continue
+
+        if re_section.match(line):
+            section = None
+            continue
+
+        m = re_url.match(line)
+        if m and section == remote:
+            return m.group(1)
+
+    return None
+
+
+def read_loose_object(commondir, sha):
+    try:
+        with open(os.path.join(commondir, "objects", sha[:2], sha[2:]), "rb") as file:
+            data = zlib.decompress(file.read())
+    except (OSError, zlib.error):
+        return None
+
+    header, _, body = data.partition(b"\0")
+    return body if header.startswith(b"commit ") else None
+
+
+def find_in_pack_index(index, sha):
+    """returns offset of the object in the pack for a version 2 pack index, or None if it's not there"""
+
+    if index[:8] != b"\377tOc\0\0\0\2":
+        return None
+
+    name = bytes.fromhex(sha)
+    fanout = 8
+    lo = struct.unpack_from(">I", index, fanout + (name[0] - 1) * 4)[0] if name[0] else 0
+    hi = struct.unpack_from(">I", index, fanout + name[0] * 4)[0]
+    count = struct.unpack_from(">I", index, fanout + 255 * 4)[0]
+    names = fanout + 256 * 4
+
+    while lo < hi:
+        mid = (lo + hi) // 2
+        current = index[names + mid * 20:names + mid * 20 + 20]
+        if current == name:
+            break
+        if current < name:
+            lo = mid + 1
+        else:
+            hi = mid
+    else:
+        return None
+
+    offsets = names + count * 20 + count * 4
+    offset = struct.unpack_from(">I", index, offsets + mid * 4)[0]
+    if offset & 0x80000000:
+        offset = struct.unpack_from(">Q", index, offsets + count * 4 + (offset & 0x7fffffff) * 8)[0]
+
+    return offset
+
+
+def read_packed_object(commondir, sha):
+    pack_dir = os.path.join(commondir, "objects", "pack")
+    try:
+        index_files = [x for x in os.listdir(pack_dir) if x.endswith(".idx")]
+    except OSError:
+        return None
+
+    for index_file in index_files:
+        try:
+            with open(os.path.join(pack_dir, index_file), "rb") as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as index:
+                offset = find_in_pack_index(index, sha)
+        except (OSError, ValueError, struct.error):
+            continue
+
+        if offset is None:
+            continue
+
+        try:
+            with open(os.path.join(pack_dir, index_file[:-4] + ".pack"), "rb") as file:
+                file.seek(offset)
+                byte = file.read(1)[0]
+                obj_type = (byte >> 4) & 7
+                while byte & 0x80:
+                    byte = file.read(1)[0]
+
+                # deltified commits are left to git
+                if obj_type != pack_commit_type:
+                    return None
+
+                decompressor = zlib.decompressobj()
+                data = b""
+                while not decompressor.eof:
+                    chunk = file.read(4096)
+                    if not chunk:
+                        break
+                    data += decompressor.decompress(chunk)
+
+                return data
+        except (OSError, IndexError, zlib.error):
+            return None
+
+    return None
+
+
+def commit_date(commit):
+    """returns committer timestamp of a raw commit object"""
+
+    for line in commit.split(b"\n"):
+        if not line:
+            break
+
+        if line.startswith(b"committer "):
+            return int(line.rsplit(b" ", 2)[1])
+
+    return None
+
+
+def read_info(path):
+    """
+    Returns a dict with remote, branch, commit_hash and commit_date of the git repository at path, or None if the
+    information can't be read without running git.
+    """
+
+    dirs = git_dirs(path)
+    if dirs is None:
+        return None
+
+    gitdir, commondir = dirs
+    ref = head_ref(gitdir)
+    if ref is None:
+        sha = (read_text(os.path.join(gitdir, "HEAD")) or "").strip()
+    else:
+        sha = resolve_ref(gitdir, commondir, ref)
+
+    if not sha or not re.fullmatch(r"[0-9a-f]{40}", sha):
+        return None
+
+    commit = read_loose_object(commondir, sha) or read_packed_object(commondir, sha)
+    if commit is None:
+        return None
+
+    try:
+        date = commit_date(commit)
+    except (ValueError, IndexError):
+        return None
+
+    return {
+        "remote": remote_url(commondir),
+        "branch": ref[len("refs/heads/"):] if ref and ref.startswith("refs/heads/") else None,
+        "commit_hash": sha,
+        "commit_date": date,
+    }
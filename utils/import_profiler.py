@@ -0,0 +1,101 @@
+"""
+Measures how long imports take by wrapping builtins.__import__; webui.py installs the wrapper for the imports done at
+startup and removes it afterwards.
+
+For every module that gets imported, both inclusive time (with modules it imports) and self time (without them) are
+kept. Only calls that actually import something are measured; names already in sys.modules skip straight to the
+original __import__.
+"""
+
+import builtins
+import sys
+import threading
+import time
+
+original_import = builtins.__import__
+local = threading.local()
+lock = threading.Lock()
+
+import_times = {}
+"""module name -> [inclusive seconds, self seconds]"""
+
+
+def resolve_name(name, globals, level):
+    if not level:
+        return name
+
+    package = (globals or {}).get('__package__') or ''
+    parts = package.rsplit('.', level - 1)
+    base = parts[0] if len(parts) >= level else package
+
+    return f"{base}.{name}" if name else base
+
+
+def profiled_import(name, globals=None, locals=None, fromlist=(), level=0):
+    if not level and name in sys.modules and not fromlist:
+        return original_import(name, globals, locals, fromlist, level)
+
+    stack = getattr(local, 'stack', None)
+    if stack is None:
+        stack = local.stack = []
+
+    modules_count = len(sys.modules)
+    start = time.perf_counter()
+    stack.append(0.0)
+
+    try:
+        return original_import(name, globals, locals, fromlist, level)
+    finally:
+        children = stack.pop()
+
+        if len(sys.modules) != modules_count:
+            elapsed = time.perf_counter() - start
+            if stack:
+                stack[-1] += elapsed
+
+            fullname = resolve_name(name, globals, level)
+            with lock:
+                times = import_times.setdefault(fullname, [0.0, 0.0])
+                times[0] += elapsed
+                times[1] += elapsed - children
+
+
+def install():
+    builtins.__import__ = profiled_import
+
+
+def uninstall():
+    """stops measuring imports; times measured so far are kept"""
+
+    # if something else has wrapped __import__ since, leave it be rather than removing its wrapper too
+    if builtins.__import__ is profiled_import:
+        builtins.__import__ = original_import
+
+
+def by_package():
+    """self time of imports summed by top-level package, slowest first"""
+
+    with lock:
+        res = {}
+        for name, (_, self_time) in import_times.items():
+            package = name.partition('.')[0]
+            res[package] = res.get(package, 0.0) + self_time
+
+    return dict(sorted(res.items(), key=lambda x: x[1], reverse=True))
+
+
+def slowest(limit=50):
+    """modules that took longest to import including modules they import, as {name: seconds}"""
+
+    with lock:
+        items = sorted(import_times.items(), key=lambda x: x[1][0], reverse=True)[:limit]
+
+    return {name: inclusive for name, (inclusive, _) in items}
+
+
+def record(timer, min_time=0.01):
+    """adds import time of packages that took at least min_time to timer, as "imports/<package>" records"""
+
+    for package, self_time in by_package().items():
+        if self_time >= min_time:
+            timer.add_time_to_record(f"imports/{package}", self_time)
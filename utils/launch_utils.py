@@ -1,6 +1,9 @@
 # this scripts installs necessary requirements and launches main program in webui.py
+import configparser
+import hashlib
 import logging
 import re
+import site
 import subprocess
 import os
 import shutil
@@ -9,10 +12,12 @@ import importlib.util
 import importlib.metadata
 import platform
 import json
-from functools import lru_cache
+from contextlib import contextmanager
+from functools import lru_cache, partial
 
 from utils import cmd_args, errors
-from components.paths_internal import script_path, extensions_dir
+from components.paths_internal import script_path, extensions_dir, data_path
+from utils.task_graph import TaskGraph
 from utils.timer import startup_timer
 from utils import logging_config
 
@@ -23,6 +28,8 @@ python = sys.executable
 git = os.environ.get('GIT', "git")
 index_url = os.environ.get('INDEX_URL', "")
 dir_repos = "repositories"
+environment_cache_file = os.environ.get('SD_WEBUI_ENVIRONMENT_CACHE_FILE', os.path.join(data_path, "environment_cache.json"))
+pip_lock_file = os.path.join(script_path, "tmp", "pip.lock")
 
 # Whether to default to printing command output
 default_command_live = (os.environ.get('WEBUI_LAUNCH_LIVE_OUTPUT') == "1")
@@ -141,7 +148,41 @@ def run_pip(command, desc=None, live=default_command_live):
         return
 
     index_url_line = f' --index-url {index_url}' if index_url != '' else ''
-    return run(f'"{python}" -m pip {command} --prefer-binary{index_url_line}', desc=f"Installing {desc}", errdesc=f"Couldn't install {desc}", live=live)
+    with pip_lock():
+        return run(f'"{python}" -m pip {command} --prefer-binary{index_url_line}', desc=f"Installing {desc}", errdesc=f"Couldn't install {desc}", live=live)
+
+
+@contextmanager
+def pip_lock():
+    """lock shared between processes, held while pip runs, so that extension installers running at the same time don't install packages over each other"""
+
+    os.makedirs(os.path.dirname(pip_lock_file), exist_ok=True)
+
+    with open(pip_lock_file, "a+b") as file:
+        if platform.system() == "Windows":
+            import msvcrt
+
+            file.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(file.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    pass  # LK_LOCK gives up after 10 seconds
+
+            try:
+                yield
+            finally:
+                file.seek(0)
+                msvcrt.locking(file.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            import fcntl
+
+            fcntl.flock(file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(file, fcntl.LOCK_UN)
 
 
 def check_run_python(code: str) -> bool:
@@ -226,9 +267,11 @@ def version_check(commit):
 
 
 def run_extension_installer(extension_dir):
+    """runs install.py of the extension, if it has one; returns False if the installer failed"""
+
     path_installer = os.path.join(extension_dir, "install.py")
     if not os.path.isfile(path_installer):
-        return
+        return True
 
     try:
         env = os.environ.copy()
@@ -239,6 +282,9 @@ def run_extension_installer(extension_dir):
             print(stdout)
     except Exception as e:
         errors.report(str(e))
+        return False
+
+    return True
 
 
 def list_extensions(settings_file):
@@ -260,20 +306,58 @@ def list_extensions(settings_file):
     return [x for x in os.listdir(extensions_dir) if x not in disabled_extensions]
 
 
+def extension_requirements(extension_dir):
+    """returns names of extensions listed in Requires field of [Extension] section in the extension's metadata.ini"""
+
+    config = configparser.ConfigParser()
+    try:
+        config.read(os.path.join(extension_dir, "metadata.ini"))
+    except Exception:
+        errors.report(f"Error reading metadata.ini for extension {extension_dir}.", exc_info=True)
+        return []
+
+    text = config.get("Extension", "Requires", fallback='').lower().strip()
+    return [x for x in re.split(r"[,\s]+", text) if x]
+
+
 def run_extensions_installers(settings_file):
+    """
+    Runs install.py of every enabled extension. Installers run concurrently, except that an extension's installer waits for
+    installers of extensions it requires in its metadata.ini; pip itself is only run by one installer at a time.
+    Returns False if any of the installers failed.
+    """
+
     if not os.path.isdir(extensions_dir):
-        return
+        return True
+
+    dirnames = [x for x in list_extensions(settings_file) if os.path.isdir(os.path.join(extensions_dir, x))]
+    by_canonical_name = {x.lower().strip(): x for x in dirnames}
+    finished = set()
+    failed = set()
+
+    def install(dirname_extension):
+        logging.debug(f"Installing {dirname_extension}")
+        if not run_extension_installer(os.path.join(extensions_dir, dirname_extension)):
+            failed.add(dirname_extension)
+        finished.add(dirname_extension)
 
-    with startup_timer.subcategory("run extensions installers"):
-        for dirname_extension in list_extensions(settings_file):
-            logging.debug(f"Installing {dirname_extension}")
+    graph = TaskGraph("run extensions installers", timer=startup_timer, workers=args.startup_workers)
+    for dirname_extension in dirnames:
+        requires = [by_canonical_name[x] for x in extension_requirements(os.path.join(extensions_dir, dirname_extension)) if x in by_canonical_name]
+        graph.add(dirname_extension, partial(install, dirname_extension), [x for x in requires if x != dirname_extension])
 
-            path = os.path.join(extensions_dir, dirname_extension)
+    try:
+        graph.run()
+    except RuntimeError:
+        errors.report("Could not order extension installers by their requirements; running the remaining ones one after another", exc_info=True)
 
-            if os.path.isdir(path):
-                run_extension_installer(path)
+        for dirname_extension in dirnames:
+            if dirname_extension not in finished:
+                install(dirname_extension)
                 startup_timer.record(dirname_extension)
 
+    return not failed
+
 
 re_requirement = re.compile(r"\s*([-_a-zA-Z0-9]+)\s*(?:==\s*([-+_.a-zA-Z0-9]+))?\s*")
 
@@ -313,6 +397,79 @@ def requirements_met(requirements_file):
     return True
 
 
+def file_hash(filename):
+    try:
+        with open(filename, "rb") as file:
+            return hashlib.sha256(file.read()).hexdigest()
+    except OSError:
+        return None
+
+
+def repository_head(dir):
+    """returns what is checked out in a git repository, read from the .git directory without running git"""
+
+    try:
+        with open(os.path.join(dir, ".git", "HEAD"), "r", encoding="utf8") as file:
+            head = file.read().strip()
+    except OSError:
+        return None
+
+    if head.startswith("ref: "):
+        try:
+            with open(os.path.join(dir, ".git", head[5:]), "r", encoding="utf8") as file:
+                head = f"{head} {file.read().strip()}"
+        except OSError:
+            pass
+
+    return head
+
+
+def environment_fingerprint(settings, requirements_files, repositories, extension_dirs):
+    """
+    Returns a hash of everything that decides the outcome of checks in prepare_environment: the interpreter, installed packages
+    (through modification times of site-packages directories), requirements files, commits checked out in repositories,
+    extension installers and launch settings. If it hasn't changed since the checks last passed, they will pass again.
+    """
+
+    parts = [sys.executable, sys.version, file_hash(__file__), json.dumps(settings, sort_keys=True)]
+
+    site_packages = [*getattr(site, "getsitepackages", list)(), site.getusersitepackages()]
+    parts += [f"{path}:{os.path.getmtime(path) if os.path.isdir(path) else None}" for path in site_packages]
+    parts += [f"{filename}:{file_hash(filename)}" for filename in requirements_files]
+    parts += [f"{dir}:{repository_head(dir)}" for dir in repositories]
+
+    for dir in extension_dirs:
+        parts += [f"{dir}:{file_hash(os.path.join(dir, filename))}" for filename in ("install.py", "requirements.txt", "metadata.ini")]
+
+    return hashlib.sha256("\n".join(parts).encode("utf8")).hexdigest()
+
+
+def read_environment_cache():
+    try:
+        with open(environment_cache_file, "r", encoding="utf8") as file:
+            return json.load(file)
+    except Exception:
+        return {}
+
+
+def environment_verified(fingerprint):
+    return read_environment_cache().get(python) == fingerprint
+
+
+def store_environment_verified(fingerprint):
+    data = read_environment_cache()
+    data[python] = fingerprint
+
+    try:
+        filename_tmp = environment_cache_file + "-"
+        with open(filename_tmp, "w", encoding="utf8") as file:
+            json.dump(data, file, indent=4)
+
+        os.replace(filename_tmp, environment_cache_file)
+    except OSError:
+        errors.report("Could not save environment verification cache", exc_info=True)
+
+
 def prepare_environment():
     torch_index_url = os.environ.get('TORCH_INDEX_URL', "https://download.pytorch.org/whl/cu118")
     torch_command = os.environ.get('TORCH_COMMAND', f"pip install torch==2.0.1 torchvision==0.15.2 --extra-index-url {torch_index_url}")
@@ -374,58 +531,87 @@ def prepare_environment():
     print(f"Version: {tag}")
     print(f"Commit hash: {commit}")
 
-    if args.reinstall_torch or not is_installed("torch") or not is_installed("torchvision"):
-        run(f'"{python}" -m {torch_command}', "Installing torch and torchvision", "Couldn't install torch", live=True)
-        startup_timer.record("install torch")
-
     if args.use_ipex:
         args.skip_torch_cuda_test = True
-    if not args.skip_torch_cuda_test and not check_run_python("import torch; assert torch.cuda.is_available()"):
-        raise RuntimeError(
-            'Torch is not able to use GPU; '
-            'add --skip-torch-cuda-test to COMMANDLINE_ARGS variable to disable this check'
-        )
-    startup_timer.record("torch GPU test")
 
-    if not is_installed("clip"):
-        run_pip(f"install {clip_package}", "clip")
-        startup_timer.record("install clip")
+    if not os.path.isfile(requirements_file):
+        requirements_file = os.path.join(script_path, requirements_file)
 
-    if not is_installed("open_clip"):
-        run_pip(f"install {openclip_package}", "open_clip")
-        startup_timer.record("install open_clip")
+    repositories = [
+        (stable_diffusion_repo, repo_dir('stable-diffusion-stability-ai'), "Stable Diffusion", stable_diffusion_commit_hash),
+        (stable_diffusion_xl_repo, repo_dir('generative-models'), "Stable Diffusion XL", stable_diffusion_xl_commit_hash),
+        (k_diffusion_repo, repo_dir('k-diffusion'), "K-diffusion", k_diffusion_commit_hash),
+        (codeformer_repo, repo_dir('CodeFormer'), "CodeFormer", codeformer_commit_hash),
+        (blip_repo, repo_dir('BLIP'), "BLIP", blip_commit_hash),
+    ]
+
+    settings = {
+        "torch_command": torch_command,
+        "clip_package": clip_package,
+        "openclip_package": openclip_package,
+        "xformers_package": xformers_package,
+        "repositories": [(url, commithash) for url, _, _, commithash in repositories],
+        "args": {x: getattr(args, x) for x in ("xformers", "ngrok", "use_ipex", "skip_torch_cuda_test", "skip_install")},
+    }
 
-    if (not is_installed("xformers") or args.reinstall_xformers) and args.xformers:
-        run_pip(f"install -U -I --no-deps {xformers_package}", "xformers")
-        startup_timer.record("install xformers")
+    def fingerprint():
+        extension_dirs = [] if args.skip_install or not os.path.isdir(extensions_dir) else [os.path.join(extensions_dir, x) for x in list_extensions(args.ui_settings_file)]
+        return environment_fingerprint(settings, [requirements_file, os.path.join(repo_dir('CodeFormer'), 'requirements.txt')], [dir for _, dir, _, _ in repositories], extension_dirs)
 
-    if not is_installed("ngrok") and args.ngrok:
-        run_pip("install ngrok", "ngrok")
-        startup_timer.record("install ngrok")
+    recheck = args.recheck_environment or args.reinstall_torch or args.reinstall_xformers
+    verified = not recheck and environment_verified(fingerprint())
+    startup_timer.record("verify environment cache")
 
-    os.makedirs(os.path.join(script_path, dir_repos), exist_ok=True)
+    if verified:
+        print("Environment has not changed since it was last verified, skipping checks")
+    else:
+        if args.reinstall_torch or not is_installed("torch") or not is_installed("torchvision"):
+            run(f'"{python}" -m {torch_command}', "Installing torch and torchvision", "Couldn't install torch", live=True)
+            startup_timer.record("install torch")
 
-    git_clone(stable_diffusion_repo, repo_dir('stable-diffusion-stability-ai'), "Stable Diffusion", stable_diffusion_commit_hash)
-    git_clone(stable_diffusion_xl_repo, repo_dir('generative-models'), "Stable Diffusion XL", stable_diffusion_xl_commit_hash)
-    git_clone(k_diffusion_repo, repo_dir('k-diffusion'), "K-diffusion", k_diffusion_commit_hash)
-    git_clone(codeformer_repo, repo_dir('CodeFormer'), "CodeFormer", codeformer_commit_hash)
-    git_clone(blip_repo, repo_dir('BLIP'), "BLIP", blip_commit_hash)
+        if not args.skip_torch_cuda_test and not check_run_python("import torch; assert torch.cuda.is_available()"):
+            raise RuntimeError(
+                'Torch is not able to use GPU; '
+                'add --skip-torch-cuda-test to COMMANDLINE_ARGS variable to disable this check'
+            )
+        startup_timer.record("torch GPU test")
 
-    startup_timer.record("clone repositores")
+        if not is_installed("clip"):
+            run_pip(f"install {clip_package}", "clip")
+            startup_timer.record("install clip")
 
-    if not is_installed("lpips"):
-        run_pip(f"install -r \"{os.path.join(repo_dir('CodeFormer'), 'requirements.txt')}\"", "requirements for CodeFormer")
-        startup_timer.record("install CodeFormer requirements")
+        if not is_installed("open_clip"):
+            run_pip(f"install {openclip_package}", "open_clip")
+            startup_timer.record("install open_clip")
 
-    if not os.path.isfile(requirements_file):
-        requirements_file = os.path.join(script_path, requirements_file)
+        if (not is_installed("xformers") or args.reinstall_xformers) and args.xformers:
+            run_pip(f"install -U -I --no-deps {xformers_package}", "xformers")
+            startup_timer.record("install xformers")
+
+        if not is_installed("ngrok") and args.ngrok:
+            run_pip("install ngrok", "ngrok")
+            startup_timer.record("install ngrok")
+
+        os.makedirs(os.path.join(script_path, dir_repos), exist_ok=True)
+
+        for url, dir, name, commithash in repositories:
+            git_clone(url, dir, name, commithash)
+
+        startup_timer.record("clone repositores")
 
-    if not requirements_met(requirements_file):
-        run_pip(f"install -r \"{requirements_file}\"", "requirements")
-        startup_timer.record("install requirements")
+        if not is_installed("lpips"):
+            run_pip(f"install -r \"{os.path.join(repo_dir('CodeFormer'), 'requirements.txt')}\"", "requirements for CodeFormer")
+            startup_timer.record("install CodeFormer requirements")
 
-    if not args.skip_install:
-        run_extensions_installers(settings_file=args.ui_settings_file)
+        if not requirements_met(requirements_file):
+            run_pip(f"install -r \"{requirements_file}\"", "requirements")
+            startup_timer.record("install requirements")
+
+        installed = args.skip_install or run_extensions_installers(settings_file=args.ui_settings_file)
+
+        # a failed extension installer is not cached as verified, so that it is tried again on next launch
+        if installed:
+            store_environment_verified(fingerprint())
 
     if args.update_check:
         version_check(commit)
@@ -456,6 +642,12 @@ def configure_for_tests():
 
 
 def start():
+    if args.workers > 0:
+        print(f"Launching API server with {args.workers} worker processes with arguments: {' '.join(sys.argv[1:])}")
+        from components import worker_pool
+        worker_pool.run(args, sys.argv[1:])
+        return
+
     print(f"Launching {'API server' if '--nowebui' in sys.argv else 'Web UI'} with arguments: {' '.join(sys.argv[1:])}")
     import webui
     if '--nowebui' in sys.argv:
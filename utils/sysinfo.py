@@ -9,7 +9,7 @@ import psutil
 import re
 
 import launch
-from utils import errors, timer
+from utils import errors, timer, import_profiler
 from components import paths_internal, shared, extensions
 
 checksum_token = "DontStealMyGamePlz__WINNERS_DONT_USE_DRUGS__DONT_COPY_THAT_FLOPPY"
@@ -98,6 +98,7 @@ def get_dict():
         "Environment": get_environment(),
         "Config": get_config(),
         "Startup": timer.startup_record,
+        "Slowest imports": import_profiler.slowest(),
         "Packages": sorted([f"{pkg.key}=={pkg.version}" for pkg in pkg_resources.working_set]),
     }
 
@@ -140,6 +141,8 @@ def get_torch_sysinfo():
 def get_extensions(*, enabled):
 
     try:
+        extensions.read_info_from_repos([x for x in extensions.extensions if not x.is_builtin and x.enabled == enabled])
+
         def to_json(x: extensions.Extension):
             return {
                 "name": x.name,
@@ -0,0 +1,113 @@
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+
+class Task:
+    def __init__(self, name, func, deps=()):
+        self.name = name
+        self.func = func
+        self.deps = tuple(deps)
+        self.start = None
+        self.end = None
+
+    @property
+    def duration(self):
+        return self.end - self.start if self.end is not None else 0.0
+
+
+class TaskGraph:
+    """
+    Runs functions on a thread pool, starting each one as soon as all tasks it depends on have finished.
+
+    Time taken by every task is recorded into timer as "<name>/<task>", and time taken by the whole graph as name. The longest
+    chain of dependent tasks, which decides how long the graph takes to run, is stored in timer.critical_paths.
+    If a task fails, tasks that haven't started yet are not run and the exception is raised from run().
+    """
+
+    def __init__(self, name, timer=None, workers=None):
+        self.name = name
+        self.timer = timer
+        self.workers = workers or min(8, os.cpu_count() or 1)
+        self.tasks = {}
+
+    def add(self, name, func, deps=()):
+        assert name not in self.tasks, f"task {name} is added twice"
+        self.tasks[name] = Task(name, func, deps)
+
+    def run_task(self, task):
+        task.start = time.time()
+        try:
+            task.func()
+        finally:
+            task.end = time.time()
+
+        if self.timer is not None and self.timer.print_log:
+            print(f"{'  ' * self.timer.subcategory_level}{task.name}: done in {task.duration:.3f}s")
+
+    def run(self):
+        for task in self.tasks.values():
+            missing = [dep for dep in task.deps if dep not in self.tasks]
+            assert not missing, f"task {task.name} depends on unknown tasks: {', '.join(missing)}"
+
+        if self.timer is None:
+            self.run_tasks()
+            return
+
+        timer = self.timer
+        start = time.time()
+        base_category = timer.base_category
+
+        if timer.print_log:
+            print(f"{'  ' * timer.subcategory_level}{self.name}:")
+
+        # things recorded by tasks themselves go under the graph's category
+        timer.base_category = f"{base_category}{self.name}/"
+        timer.subcategory_level += 1
+        try:
+            self.run_tasks()
+        finally:
+            timer.base_category = base_category
+            timer.subcategory_level -= 1
+
+        for task in self.tasks.values():
+            timer.add_time_to_record(f"{base_category}{self.name}/{task.name}", task.duration)
+
+        timer.add_time_to_record(base_category + self.name, time.time() - start)
+        timer.total += timer.elapsed()
+        timer.critical_paths[self.name] = [(task.name, task.duration) for task in self.critical_path()]
+
+    def run_tasks(self):
+        pending = dict(self.tasks)
+        finished = set()
+        running = {}
+
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix=self.name) as executor:
+            while pending or running:
+                for name, task in list(pending.items()):
+                    if all(dep in finished for dep in task.deps):
+                        del pending[name]
+                        running[executor.submit(self.run_task, task)] = task
+
+                if not running:
+                    raise RuntimeError(f"circular dependencies between tasks: {', '.join(pending)}")
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    task = running.pop(future)
+                    future.result()
+                    finished.add(task.name)
+
+    def critical_path(self):
+        """returns the chain of tasks that ended last, following for each task the dependency that finished last"""
+
+        if not self.tasks:
+            return []
+
+        task = max(self.tasks.values(), key=lambda x: x.end or 0)
+        path = [task]
+        while task.deps:
+            task = max((self.tasks[dep] for dep in task.deps), key=lambda x: x.end or 0)
+            path.append(task)
+
+        return path[::-1]
@@ -33,6 +33,8 @@ class Timer:
         self.base_category = ''
         self.print_log = print_log
         self.subcategory_level = 0
+        self.critical_paths = {}
+        """for steps run as a TaskGraph, the chain of (task, seconds) that took the longest"""
 
     def elapsed(self):
         end = time.time()
@@ -71,12 +73,16 @@ class Timer:
 
         res += " ("
         res += ", ".join([f"{category}: {time_taken:.1f}s" for category, time_taken in additions])
+
+        for name, path in self.critical_paths.items():
+            res += f"; {name} critical path: " + " > ".join([f"{task} {time_taken:.1f}s" for task, time_taken in path])
+
         res += ")"
 
         return res
 
     def dump(self):
-        return {'total': self.total, 'records': self.records}
+        return {'total': self.total, 'records': self.records, 'critical_paths': self.critical_paths}
 
     def reset(self):
         self.__init__()
@@ -3,14 +3,19 @@ from __future__ import annotations
 import os
 import time
 
-from utils import timer
-from components import initialize_util
-from components import initialize
+from utils import timer, import_profiler
+
+import_profiler.install()
+
+from components import initialize_util  # noqa: E402
+from components import initialize  # noqa: E402
 
 startup_timer = timer.startup_timer
 startup_timer.record("launcher")
 
 initialize.imports()
+import_profiler.record(startup_timer)
+import_profiler.uninstall()
 
 initialize.check_versions()
 